@@ -34,12 +34,14 @@ if "bpy" in locals():
 
     imp.reload(constants)
     imp.reload(functions)
+    imp.reload(batch)
     imp.reload(operators)
     imp.reload(ui)
+    imp.reload(api)
     imp.reload(addon_updater)
     imp.reload(addon_updater_ops)
 else:
-    from . import constants, functions, operators, ui  # noqa: F401 (imported but unused, needed for reload)
+    from . import constants, functions, batch, operators, ui, api  # noqa: F401 (imported but unused, needed for reload)
 
 import bpy
 import os
@@ -121,12 +123,57 @@ class GafferPreferences(bpy.types.AddonPreferences):
         ),
         default=True,
     )
+    refresh_delay: bpy.props.FloatProperty(
+        name="Refresh Delay",
+        description=(
+            "How long to wait for changes to stop before automatically refreshing the light list. "
+            "Higher values let bulk edits (like appending many lights) cause only a single refresh"
+        ),
+        default=0.2,
+        min=0,
+        soft_max=2,
+        subtype="TIME_ABSOLUTE",
+        unit="TIME_ABSOLUTE",
+    )
+    solo_method: bpy.props.EnumProperty(
+        name="Solo Method",
+        items=(
+            (
+                "LIGHT_LINKING",
+                "Light Linking",
+                "Turn off the other lights with light linking, leaving their hide flags untouched. "
+                "Falls back to hiding them when the render engine or Blender version doesn't support light linking",
+            ),
+            ("HIDE", "Hide", "Hide the other lights in the viewport and render"),
+        ),
+        default="LIGHT_LINKING",
+        description="How to turn off the other lights when soloing a light",
+    )
+    lights_per_page: bpy.props.IntProperty(
+        name="Lights Per Page",
+        description=(
+            "Maximum number of lights to show at once in the Lights panel. "
+            "Lower numbers keep the panel responsive in scenes with many lights. 0 shows all lights"
+        ),
+        default=25,
+        min=0,
+        soft_max=200,
+    )
 
     show_debug: bpy.props.BoolProperty(
         name="Show Debug Tools",
         description="Expand this box to show various debugging tools",
         default=False,
     )
+    enable_profiling: bpy.props.BoolProperty(
+        name="Profiling",
+        description=(
+            "Record how long Gaffer's handlers, panels, overlays and HDRI functions take. "
+            "Slows things down slightly while enabled"
+        ),
+        default=False,
+        update=functions._update_profiling,
+    )
 
     ForcePreviewsRefresh: bpy.props.BoolProperty(default=True, options={"HIDDEN"})
     RequestThumbGen: bpy.props.BoolProperty(default=False, options={"HIDDEN"})
@@ -207,6 +254,11 @@ class GafferPreferences(bpy.types.AddonPreferences):
         col.prop(self, "panel_category")
         col.prop(self, "offline_mode")
         col.prop(self, "auto_refresh_light_list")
+        sub = col.column()
+        sub.active = self.auto_refresh_light_list
+        sub.prop(self, "refresh_delay")
+        col.prop(self, "lights_per_page")
+        col.prop(self, "solo_method")
 
         addon_updater_ops.update_settings_ui(self, context)
 
@@ -227,13 +279,82 @@ class GafferPreferences(bpy.types.AddonPreferences):
             col.operator("gaffer.dbg_upload_hdri_list")
             col.operator("gaffer.dbg_upload_logs")
 
+            col = box.column()
+            row = col.row(align=True)
+            row.prop(self, "enable_profiling")
+            row.operator("gaffer.dbg_export_profile", text="", icon="EXPORT")
+            row.operator("gaffer.dbg_reset_profile", text="", icon="TRASH")
+            report = functions.get_profile_report()
+            if report:
+                grid = col.grid_flow(columns=5, even_columns=False, align=True)
+                for heading in ["Name", "Calls", "Mean ms", "P95 ms", "Max ms"]:
+                    grid.label(text=heading)
+                for name, stats in report.items():
+                    grid.label(text=name)
+                    grid.label(text=str(stats["count"]))
+                    grid.label(text="{:.2f}".format(stats["mean_ms"]))
+                    grid.label(text="{:.2f}".format(stats["recent_p95_ms"]))
+                    grid.label(text="{:.2f}".format(stats["max_ms"]))
+            elif self.enable_profiling:
+                col.label(text="Nothing recorded yet")
+
 
 class BlacklistedObject(bpy.types.PropertyGroup):
-    name: bpy.props.StringProperty(default="")
+    name: bpy.props.StringProperty(default="", update=functions._update_blacklist)
+
+
+class GafferSnapshot(bpy.types.PropertyGroup):
+    # name: The name shown in the snapshot list
+    data: bpy.props.StringProperty(default="", description="Packed light and world settings, see capture_snapshot")
+
+
+class GafferLightGroupMember(bpy.types.PropertyGroup):
+    # name: The name of the light object that was added to the group
+    data_type: bpy.props.StringProperty(default="", description="'LIGHT' or 'MATERIAL'")
+    data_name: bpy.props.StringProperty(default="", description="Light data or material that the group drives")
+    base_strength: bpy.props.FloatProperty(default=1, description="Strength the group's master strength multiplies")
+    base_color: bpy.props.FloatVectorProperty(
+        default=(1, 1, 1), size=3, description="Color the group's master color multiplies"
+    )
+
+
+class GafferLightGroup(bpy.types.PropertyGroup):
+    # name: The name of the group, used in the data path of its drivers so it can't be renamed
+    strength: bpy.props.FloatProperty(
+        name="Strength",
+        default=1,
+        min=0,
+        soft_max=10,
+        description="Multiplies the strength of all lights in this group",
+    )
+    color: bpy.props.FloatVectorProperty(
+        name="Color",
+        subtype="COLOR",
+        size=3,
+        default=(1, 1, 1),
+        min=0,
+        soft_max=1,
+        description="Multiplies the color of all lights in this group",
+    )
+    expanded: bpy.props.BoolProperty(default=False, description="Show the lights in this group")
+    members: bpy.props.CollectionProperty(type=GafferLightGroupMember)
+
+
+class GafferLight(bpy.types.PropertyGroup):
+    # name: The name of the light object
+    material: bpy.props.StringProperty(default="", description="Emission material (mesh lights only)")
+    node: bpy.props.StringProperty(default="", description="Node that holds the strength socket")
+    socket_type: bpy.props.StringProperty(default="", description="'i' for an input socket, 'o' for an output socket")
+    socket_index: bpy.props.IntProperty(default=0, description="Index of the strength socket on the strength node")
+    color_node: bpy.props.StringProperty(default="", description="Emission node that controls the light color")
 
 
 class GafferProperties(bpy.types.PropertyGroup):
-    Lights: bpy.props.StringProperty(name="Lights", default="", description="The objects to include in the isolation")
+    Lights: bpy.props.StringProperty(
+        name="Lights",
+        default="",
+        description="Legacy light list, only read when loading files saved with older versions of Gaffer",
+    )
     ColTempExpand: bpy.props.BoolProperty(
         name="Color Temperature Presets",
         default=False,
@@ -263,6 +384,45 @@ class GafferProperties(bpy.types.PropertyGroup):
         default=False,
         description="Only show lights that are not hidden",
     )
+    LightFilterName: bpy.props.StringProperty(
+        name="Filter by Name",
+        default="",
+        description="Only show lights whose name contains this text",
+        options={"TEXTEDIT_UPDATE"},
+        update=functions._update_light_filter,
+    )
+    LightFilterType: bpy.props.EnumProperty(
+        name="Filter by Type",
+        items=(
+            ("ALL", "All", "Show all types of lights"),
+            ("POINT", "Point", "Only show point lights"),
+            ("SUN", "Sun", "Only show sun lights"),
+            ("SPOT", "Spot", "Only show spot lights"),
+            ("AREA", "Area", "Only show area lights"),
+            ("MESH", "Mesh", "Only show emissive meshes"),
+        ),
+        default="ALL",
+        description="Only show lights of this type",
+        update=functions._update_light_filter,
+    )
+    BulkScope: bpy.props.EnumProperty(
+        name="Bulk Edit",
+        items=constants.bulk_scopes,
+        default="SELECTED",
+        description="Which lights the bulk edit tools act on",
+    )
+    LightSortOrder: bpy.props.EnumProperty(
+        name="Sort Lights",
+        items=(
+            ("NAME", "Name", "Sort lights alphabetically"),
+            ("NAME_REVERSE", "Name (Reverse)", "Sort lights in reverse alphabetical order"),
+            ("TYPE", "Type", "Group lights by their type, then sort them alphabetically"),
+        ),
+        default="NAME",
+        description="The order in which lights are listed",
+        update=functions._update_light_filter,
+    )
+    LightPage: bpy.props.IntProperty(name="Page", default=0, min=0, description="Page of the light list to show")
     WorldVis: bpy.props.BoolProperty(
         name="Hide World lighting",
         default=True,
@@ -416,7 +576,20 @@ class GafferProperties(bpy.types.PropertyGroup):
     ShowHDRIHaven: bpy.props.BoolProperty(default=False, options={"HIDDEN"})
     ThumbnailsBigHDRIFound: bpy.props.BoolProperty(default=False, options={"HIDDEN"})
     FileNotFoundError: bpy.props.BoolProperty(default=False, options={"HIDDEN"})
+    SoloRecord: bpy.props.StringProperty(default="", options={"HIDDEN"})
+    LightFingerprint: bpy.props.StringProperty(default="", options={"HIDDEN"})  # see functions.get_light_fingerprint
+    SnapshotIndex: bpy.props.IntProperty(default=0, options={"HIDDEN"})
+    ActiveSnapshot: bpy.props.StringProperty(default="", options={"HIDDEN"})  # Last captured or restored snapshot
+    PreviousSnapshot: bpy.props.StringProperty(default="", options={"HIDDEN"})  # The one before, for A/B switching
+    # Batch edit state, see GAFFER_OT_batch_edit_begin. Cleared when a file is loaded
+    BatchEditActive: bpy.props.BoolProperty(default=False, options={"HIDDEN"})
+    BatchEditSnapshot: bpy.props.StringProperty(default="", options={"HIDDEN"})  # The lights before it
+    BatchEditCount: bpy.props.IntProperty(default=0, options={"HIDDEN"})  # Number of edits made in it
+    BatchEditSolo: bpy.props.StringProperty(default="", options={"HIDDEN"})  # SoloActive before it
     Blacklist: bpy.props.CollectionProperty(type=BlacklistedObject)  # must be registered after classes
+    LightRegistry: bpy.props.CollectionProperty(type=GafferLight)  # must be registered after classes
+    Snapshots: bpy.props.CollectionProperty(type=GafferSnapshot)  # must be registered after classes
+    LightGroups: bpy.props.CollectionProperty(type=GafferLightGroup)  # must be registered after classes
 
 
 class GafferHDRIProperties(bpy.types.PropertyGroup):
@@ -684,6 +857,10 @@ class GafferHDRIProperties(bpy.types.PropertyGroup):
 classes = [
     GafferPreferences,
     BlacklistedObject,
+    GafferSnapshot,
+    GafferLightGroupMember,
+    GafferLightGroup,
+    GafferLight,
     GafferProperties,
     GafferHDRIProperties,
     operators.GAFFER_OT_rename,
@@ -696,11 +873,26 @@ classes = [
     operators.GAFFER_OT_hide_show_light,
     operators.GAFFER_OT_select_light,
     operators.GAFFER_OT_solo,
+    operators.GAFFER_OT_set_strength_batch,
+    operators.GAFFER_OT_set_temp_batch,
+    operators.GAFFER_OT_hide_show_light_batch,
+    operators.GAFFER_OT_select_light_batch,
+    operators.GAFFER_OT_solo_batch,
+    operators.GAFFER_OT_batch_edit_begin,
+    operators.GAFFER_OT_batch_edit_commit,
+    operators.GAFFER_OT_batch_edit_discard,
+    operators.GAFFER_OT_lights_page,
     operators.GAFFER_OT_light_use_nodes,
     operators.GAFFER_OT_node_set_strength,
     operators.GAFFER_OT_refresh_light_list,
     operators.GAFFER_OT_set_light_data_user_names,
     operators.GAFFER_OT_apply_exposure,
+    operators.GAFFER_OT_bulk_strength,
+    operators.GAFFER_OT_bulk_temperature,
+    operators.GAFFER_OT_bulk_radius,
+    operators.GAFFER_OT_bulk_falloff,
+    operators.GAFFER_OT_light_group_add,
+    operators.GAFFER_OT_light_group_remove,
     operators.GAFFER_OT_link_sky_to_sun,
     operators.GAFFER_OT_aim_light,
     operators.GAFFER_OT_aim_light_with_view,
@@ -709,6 +901,12 @@ classes = [
     operators.GAFFER_OT_refresh_bgl,
     operators.GAFFER_OT_add_blacklisted,
     operators.GAFFER_OT_remove_blacklisted,
+    operators.GAFFER_OT_snapshot_capture,
+    operators.GAFFER_OT_snapshot_restore,
+    operators.GAFFER_OT_snapshot_swap,
+    operators.GAFFER_OT_snapshot_remove,
+    operators.GAFFER_OT_rig_save,
+    operators.GAFFER_OT_rig_apply,
     operators.GAFFER_OT_detect_hdris,
     operators.GAFFER_OT_hdri_path_edit,
     operators.GAFFER_OT_hdri_path_add,
@@ -722,6 +920,7 @@ classes = [
     operators.GAFFER_OT_hdri_variation_paddles,
     operators.GAFFER_OT_hdri_add_tag,
     operators.GAFFER_OT_hdri_random,
+    operators.GAFFER_OT_lookdev_contact_sheet,
     operators.GAFFER_OT_hdri_reset,
     operators.GAFFER_OT_hdri_save,
     operators.GAFFER_OT_fix_mis,
@@ -732,6 +931,8 @@ classes = [
     operators.GAFFER_OT_debug_delete_thumbs,
     operators.GAFFER_OT_debug_upload_hdri_list,
     operators.GAFFER_OT_debug_upload_logs,
+    operators.GAFFER_OT_debug_export_profile,
+    operators.GAFFER_OT_debug_reset_profile,
     ui.GAFFER_PT_hdris,
     ui.GAFFER_MT_folder_filter,
     ui.OBJECT_UL_object_list,
@@ -751,20 +952,46 @@ def register():
     for cls in classes:
         register_class(cls)
     ui.update_category(bpy.context.preferences.addons[__name__].preferences, bpy.context)
+    functions.set_profiling(bpy.context.preferences.addons[__name__].preferences.enable_profiling)
 
     bpy.types.Scene.gaf_props = bpy.props.PointerProperty(type=GafferProperties)
     bpy.types.World.gaf_hdri_props = bpy.props.PointerProperty(type=GafferHDRIProperties)
+    bpy.types.Object.GafferAimTarget = bpy.props.PointerProperty(
+        type=bpy.types.Object,
+        name="Aim Target",
+        description="The object this light is pointed at when aiming selected lights at their own targets",
+    )
+    bpy.app.handlers.load_pre.append(operators.load_pre_handler)
     bpy.app.handlers.load_post.append(operators.load_handler)
     bpy.app.handlers.depsgraph_update_post.append(functions.depsgraph_update_post_handler)
+    bpy.app.handlers.undo_post.append(functions.undo_redo_post_handler)
+    bpy.app.handlers.redo_post.append(functions.undo_redo_post_handler)
+    bpy.app.handlers.render_init.append(functions.render_init_handler)
+    bpy.app.handlers.render_complete.append(functions.render_done_handler)
+    bpy.app.handlers.render_cancel.append(functions.render_done_handler)
 
 
 def unregister():
     addon_updater_ops.unregister()
 
+    bpy.app.handlers.load_pre.remove(operators.load_pre_handler)
     bpy.app.handlers.load_post.remove(operators.load_handler)
     bpy.app.handlers.depsgraph_update_post.remove(functions.depsgraph_update_post_handler)
+    bpy.app.handlers.undo_post.remove(functions.undo_redo_post_handler)
+    bpy.app.handlers.redo_post.remove(functions.undo_redo_post_handler)
+    bpy.app.handlers.render_init.remove(functions.render_init_handler)
+    bpy.app.handlers.render_complete.remove(functions.render_done_handler)
+    bpy.app.handlers.render_cancel.remove(functions.render_done_handler)
 
     functions.previews_unregister()
+    operators.stop_contact_sheets()
+    for scene in bpy.data.scenes:
+        if scene.gaf_props.SoloRecord:  # Lights soloed out with light linking would stay dark without Gaffer
+            functions.set_solo(scene)
+    functions.remove_solo_receivers()
+    for timer in [functions.flush_light_list_refreshes, functions.resume_depsgraph_handler]:
+        if bpy.app.timers.is_registered(timer):
+            bpy.app.timers.unregister(timer)
 
     if operators.GAFFER_OT_show_light_radius._handle is not None:
         bpy.types.SpaceView3D.draw_handler_remove(operators.GAFFER_OT_show_light_radius._handle, "WINDOW")
@@ -775,6 +1002,7 @@ def unregister():
 
     del bpy.types.Scene.gaf_props
     del bpy.types.World.gaf_hdri_props
+    del bpy.types.Object.GafferAimTarget
 
     bpy.types.NODE_PT_active_node_generic.remove(ui.gaffer_node_menu_func)
 
@@ -0,0 +1,314 @@
+# BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# END GPL LICENSE BLOCK #####
+
+"""
+Gaffer's Python API, for pipeline scripts that drive lighting without the UI.
+
+Unlike the bpy.ops.gaffer operators, these functions take the scene to work on as an argument, don't need a 3D View
+or Properties Editor context, don't push undo steps and only refresh the light list when it can't be trusted.
+They work in background mode (blender --background --python ...) once the add-on is enabled.
+
+example usage:
+
+    from gaffer import api  # or whatever folder Gaffer is installed in
+
+    for scene in bpy.data.scenes:
+        api.set_strength(scene, factor=2, lights=["Key", "Fill"])
+        api.set_temperature(scene, 3200, lights=["Key"])
+    api.set_hdri(scene, "kloppenheim_06", variation="2k")
+    api.setup_world(scene, rotation=90, brightness=1.5)
+
+Lights are named by their object names, lights=None means every light in Gaffer's list of the scene.
+Unknown light or HDRI names raise a KeyError, invalid settings a ValueError.
+"""
+
+import bpy
+import os
+
+from . import functions as fn
+
+
+# Light registry
+
+
+def get_lights(scene, refresh=False):
+    """
+    Return a list of dicts describing the lights of this scene: name, object type, material, strength node, socket,
+    strength and whether it's hidden. With refresh the scene is scanned again even if the light list looks up to date
+    """
+    if refresh:
+        fn.untrust_light_list(scene)
+        fn.forget_light_fingerprint(scene)
+    fn.ensure_light_list(scene)
+    lights = []
+    for rec in fn.get_lights(scene):
+        obj = bpy.data.objects.get(rec.name)
+        if obj is None:
+            continue
+        lights.append(
+            {
+                "name": rec.name,
+                "type": obj.data.type if obj.type == "LIGHT" else obj.type,
+                "material": rec.material,
+                "node": rec.node,
+                "socket": rec.socket_type + str(rec.socket_index) if rec.socket_type else "",
+                "strength": fn.get_light_strength(rec),
+                "hidden": obj.hide_render,
+            }
+        )
+    return lights
+
+
+def refresh_lights(scenes=None):
+    """Rescan the lights of these scenes (all of them by default). Returns the scenes"""
+    return fn.refresh_all_light_lists(scenes)
+
+
+def get_records(scene, lights=None):
+    """Return the registry records of the named lights, or of all lights when lights is None"""
+    fn.ensure_light_list(scene)
+    if lights is None:
+        return list(fn.get_lights(scene))
+    if isinstance(lights, str):
+        lights = [lights]
+    records = []
+    for name in lights:
+        rec = fn.get_light_record(scene, name)
+        if rec is None:
+            raise KeyError("'{}' is not a light in scene '{}'".format(name, scene.name))
+        records.append(rec)
+    return records
+
+
+def get_inventory(scene):
+    """
+    Return a dict describing the lighting of this scene: its lights (see get_lights), and the world with the HDRI and
+    variation it uses and whether that file is missing
+    """
+    world = scene.world
+    hdri, variation = fn.get_world_hdri(world)
+    not_found = bool(variation) and not os.path.exists(bpy.path.abspath(variation))
+    return {
+        "scene": scene.name,
+        "engine": scene.render.engine,
+        "lights": get_lights(scene),
+        "world": {
+            "name": world.name if world else "",
+            "hdri_handler": world.gaf_hdri_props.hdri_handler_enabled if world else False,
+            "hdri": hdri,
+            "variation": variation,
+            "hdri_not_found": not_found or (bool(variation) and scene.gaf_props.FileNotFoundError),
+        },
+    }
+
+
+# Strength and color
+
+
+def set_strength(scene, factor=1.0, offset=0.0, lights=None):
+    """Multiply and offset the strength of these lights. Returns the names of the lights that were skipped"""
+    return fn.bulk_set_strength(get_records(scene, lights), factor, offset)
+
+
+def adjust_exposure(scene, stops, lights=None):
+    """Brighten (or darken, with negative stops) these lights by a number of stops"""
+    return set_strength(scene, factor=pow(2, stops), lights=lights)
+
+
+def apply_exposure(scenes):
+    """
+    Bake the color management exposure of these scenes into their lights and worlds. Scenes that share lights or
+    worlds with another of the scenes that has a different exposure are skipped.
+    Returns a list of (light or scene name, problem) for the lights and scenes that were skipped
+    """
+    return fn.apply_exposure(scenes)
+
+
+def set_color(scene, color, lights=None):
+    """Set the RGB color of these lights. Returns the names of the lights whose color couldn't be set"""
+    if len(color) != 3:
+        raise ValueError("color needs 3 values (RGB), got {}".format(len(color)))
+    return fn.bulk_set_color(get_records(scene, lights), tuple(color))
+
+
+def set_temperature(scene, temperature, lights=None):
+    """Set the color temperature (in Kelvin) of these lights. Returns the names of the lights that were skipped"""
+    if temperature <= 0:
+        raise ValueError("temperature must be above 0 Kelvin")
+    return fn.bulk_set_temperature(get_records(scene, lights), temperature)
+
+
+def scale_radius(scene, factor, lights=None):
+    """Scale the radius, area size or sun angle of these lights"""
+    fn.bulk_scale_radius(get_records(scene, lights), factor)
+
+
+# Solo
+
+
+def solo(scene, light, world=False, use_light_linking=None):
+    """
+    Hide all lights except this one (and the lights that share its data) until unsolo is called.
+    use_light_linking defaults to the Solo Method in the add-on preferences
+    """
+    rec = get_records(scene, [light])[0]
+    if scene.gaf_props.SoloActive:
+        unsolo(scene)
+    if use_light_linking is None:
+        use_light_linking = bpy.context.preferences.addons[__package__].preferences.solo_method == "LIGHT_LINKING"
+    obj = bpy.data.objects[light]
+    data = obj.data if obj.type == "LIGHT" else bpy.data.materials.get(rec.material)
+    linked_lights = []
+    if data is not None:
+        linked_lights = [o.name for o in fn.get_data_users(data) if o.type in {"LIGHT", "MESH"}]
+    fn.set_solo(scene, light, True, world, linked_lights, use_light_linking)
+
+
+def unsolo(scene):
+    """Restore the light visibility from before solo was called"""
+    if scene.gaf_props.SoloActive:
+        fn.set_solo(scene)
+
+
+# HDRI and world
+
+
+scene_context = fn.scene_context  # Makes a scene the context scene, which the HDRI handler works on
+
+
+def list_hdris():
+    """Return a dict of all detected HDRI names and their list of variation file paths"""
+    return dict(fn.get_hdri_list())
+
+
+def set_hdri(scene, hdri, variation=None):
+    """
+    Turn on the HDRI handler for the scene's world if needed and switch it to this HDRI. variation can be a file path
+    or a resolution like "2k", by default the 1k variation (or the smallest) is used
+    """
+    if scene.world is None:
+        raise ValueError("Scene '{}' has no world".format(scene.name))
+    hdris = fn.get_hdri_list()
+    if hdri not in hdris:
+        raise KeyError("Unknown HDRI '{}'".format(hdri))
+    variations = hdris[hdri]
+    if variation is not None and variation not in variations:
+        matches = [v for v in variations if variation.lower() in os.path.basename(v).lower()]
+        if not matches:
+            raise KeyError("HDRI '{}' has no variation '{}'".format(hdri, variation))
+        variation = matches[0]
+
+    gaf_hdri_props = scene.world.gaf_hdri_props
+    with scene_context(scene):
+        if hdri not in fn.get_hdri_list(use_search=True):
+            raise ValueError("HDRI '{}' is hidden by the world's search filters".format(hdri))
+        if not gaf_hdri_props.hdri_handler_enabled:
+            gaf_hdri_props.hdri_handler_enabled = True
+            if not gaf_hdri_props.hdri_handler_enabled:
+                raise ValueError("The HDRI handler can't be enabled, check the HDRI folders in the preferences")
+        # The enum items are cached and only rebuilt when this is set, see hdri_enum_previews
+        bpy.context.preferences.addons[__package__].preferences.ForcePreviewsRefresh = True
+        if gaf_hdri_props.hdri != hdri:
+            gaf_hdri_props.hdri = hdri  # Picks the default variation
+        if variation is not None and gaf_hdri_props.hdri_variation != variation:
+            gaf_hdri_props.hdri_variation = variation
+
+
+def setup_world(scene, enabled=True, **settings):
+    """
+    Turn the HDRI handler of the scene's world on or off and change its settings, named without their "hdri_" prefix,
+    e.g. setup_world(scene, rotation=90, brightness=1.5, use_separate_brightness=True, background_brightness=0)
+    """
+    if scene.world is None:
+        raise ValueError("Scene '{}' has no world".format(scene.name))
+    gaf_hdri_props = scene.world.gaf_hdri_props
+    props = {}
+    for name, value in settings.items():
+        prop = "hdri_" + name
+        if not hasattr(gaf_hdri_props, prop) or prop in {"hdri_handler_enabled", "hdri", "hdri_variation"}:
+            raise ValueError("Unknown world setting '{}'".format(name))
+        props[prop] = value
+
+    with scene_context(scene):
+        if gaf_hdri_props.hdri_handler_enabled != enabled:
+            gaf_hdri_props.hdri_handler_enabled = enabled
+        if enabled and not gaf_hdri_props.hdri_handler_enabled:
+            raise ValueError("The HDRI handler can't be enabled, check the HDRI folders in the preferences")
+        for prop, value in props.items():
+            if getattr(gaf_hdri_props, prop) != value:
+                setattr(gaf_hdri_props, prop, value)
+
+
+# Snapshots
+
+
+def capture_snapshot(scene):
+    """Return the light rig of this scene (light visibility, strength, color and size, and world) as a JSON string"""
+    fn.ensure_light_list(scene)
+    return fn.capture_snapshot(scene)
+
+
+def restore_snapshot(scene, data):
+    """Restore a light rig from capture_snapshot. Returns the names of the lights that no longer exist"""
+    with scene_context(scene):
+        return fn.restore_snapshot(scene, data)
+
+
+# Rig presets
+
+
+def capture_rig(scene, name, lights=None, target=None, include_world=True):
+    """
+    Make a rig preset from these lights (all lights by default) with their transforms relative to the target object,
+    or the world origin. Returns a dict that can be passed to apply_rig or saved with save_rig
+    """
+    objects = [bpy.data.objects[rec.name] for rec in get_records(scene, lights)]
+    if isinstance(target, str):
+        if target not in scene.objects:
+            raise KeyError("'{}' is not an object in scene '{}'".format(target, scene.name))
+        target = scene.objects[target]
+    return fn.capture_rig(scene, name, objects, target, include_world)
+
+
+def save_rig(rig, filepath=""):
+    """Write a rig preset to the rig library, or to filepath. Returns the file path"""
+    return fn.save_rig(rig, filepath)
+
+
+def list_rigs():
+    """Return the names of the rig presets in the rig library"""
+    return fn.list_rigs()
+
+
+def apply_rig(scene, rig, target="SAVED"):
+    """
+    Add the lights of a rig preset to the scene, or update them if they're already there. rig is a dict from
+    capture_rig, the name of a preset in the rig library or the path of a rig .json file. target is SAVED (the object
+    the rig was saved relative to), WORLD, CURSOR or an object name. Returns what couldn't be fully set up
+    """
+    if isinstance(rig, str):
+        try:
+            rig = fn.load_rig(rig)
+        except FileNotFoundError:
+            raise KeyError("Unknown rig preset '{}'".format(rig))
+    matrix = fn.get_rig_matrix(scene, rig, target)
+    if matrix is None:
+        name = rig["target"] if target == "SAVED" else target
+        raise KeyError("'{}' is not an object in scene '{}'".format(name, scene.name))
+    with scene_context(scene):
+        return fn.apply_rig(scene, rig, matrix)
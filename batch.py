@@ -0,0 +1,547 @@
+# BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# END GPL LICENSE BLOCK #####
+
+# Runs Gaffer jobs on many .blend files, spread over a pool of background Blender processes.
+# Each worker starts once and then opens the files it's given one after the other, so Blender's start up time is only
+# paid once per worker. Jobs and results are sent as JSON lines through the workers' stdin and stdout.
+
+# Commands:
+# apply-rig RIG FILE [FILE ...]   add a rig preset (a name in the rig library or a .json path) to each file and save it
+#     --target T                  SAVED (default), WORLD, CURSOR or the name of an object to place the rig relative to
+#     --scene NAME                scene to apply the rig to, the active scene of each file by default
+#     --no-save                   don't save the files, to try out a rig
+# inventory FILE [FILE ...]       list the lights, their strengths, the HDRI and variation of the world and any missing
+#                                 images of each file, without changing them. Use --report for the full JSON report
+#     --scene NAME                only list this scene, all scenes by default
+#     --csv PATH                  also write a CSV summary with one row per scene
+# contact-sheet FILE              render the scene's camera under each HDRI matching the world's search and filters, or
+#                                 under each of the scene's snapshots, and tile the renders into one labelled image
+#     --source S                  HDRIS (default) or SNAPSHOTS
+#     --scene NAME                scene to render, the file's active scene by default
+#     --width W                   width of each render in pixels, 320 by default
+#     --samples N                 render samples, 16 by default
+#     --columns C                 number of columns of the sheet, about square by default
+#     --output PATH               image to write, "<file>_contact_sheet.png" next to the file by default
+
+# Args for all commands (optional):
+# --workers N      number of Blender processes, one per CPU core by default
+# --report PATH    JSON file to write the per file results to, they're always printed too
+
+# FILE arguments may be glob patterns, e.g. "shots/**/*.blend", for shells that don't expand them.
+# The exit code is 1 if any file failed.
+
+# example usage:
+# blender --background --factory-startup --python batch.py -- apply-rig key_fill_rim shots/*.blend --report apply.json
+# blender --background --factory-startup --python batch.py -- inventory "show/**/*.blend" --csv lights.csv --workers 16
+# blender --background --factory-startup --python batch.py -- contact-sheet shot010.blend --samples 8 --width 256
+
+import bpy
+import addon_utils
+import argparse
+import csv
+import glob
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import traceback
+from array import array
+from collections import deque
+from math import ceil, sqrt
+from queue import Queue, Empty
+from subprocess import Popen, PIPE, STDOUT
+from time import perf_counter
+
+ADDON_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE = os.path.basename(ADDON_DIR)
+WORKER_FLAG = "--gaffer-worker"
+MESSAGE_PREFIX = "GAFFER_BATCH "  # Marks the lines of a worker's stdout that are results, Blender prints the rest
+# Render stamp fields turned off for contact sheet renders, which are only labelled with the stamp note
+STAMP_FIELDS = [
+    "use_stamp_date",
+    "use_stamp_time",
+    "use_stamp_render_time",
+    "use_stamp_frame",
+    "use_stamp_frame_range",
+    "use_stamp_memory",
+    "use_stamp_hostname",
+    "use_stamp_camera",
+    "use_stamp_lens",
+    "use_stamp_scene",
+    "use_stamp_marker",
+    "use_stamp_filename",
+    "use_stamp_sequencer_strip",
+    "use_stamp_labels",
+]
+
+
+def enable_gaffer():
+    # Only for the command line and the workers, inside a running Blender the add-on's own modules are passed around
+    if os.path.dirname(ADDON_DIR) not in sys.path:
+        sys.path.append(os.path.dirname(ADDON_DIR))
+    if MODULE not in sys.modules or not hasattr(sys.modules[MODULE], "functions"):
+        if addon_utils.enable(MODULE, default_set=True) is None:
+            sys.exit("Could not enable Gaffer from " + ADDON_DIR)
+    return sys.modules[MODULE]
+
+
+def expand_files(patterns):
+    files = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            files += sorted(glob.glob(pattern, recursive=True))
+        else:
+            files.append(pattern)
+    return [os.path.abspath(f) for f in files]
+
+
+# Worker side
+
+
+def open_file(filepath, reload=True):
+    """Open this file, unless it's already open. With reload it's opened again if it was changed by a previous job"""
+    if not os.path.exists(filepath):
+        raise FileNotFoundError("No such file: " + filepath)
+    if bpy.data.filepath != filepath or (reload and bpy.data.is_dirty):
+        bpy.ops.wm.open_mainfile(filepath=filepath, load_ui=False)
+
+
+def get_scene(name):
+    if not name:
+        return bpy.context.scene
+    if name not in bpy.data.scenes:
+        raise KeyError("No scene named '{}'".format(name))
+    return bpy.data.scenes[name]
+
+
+def task_apply_rig(gaffer, job):
+    open_file(job["file"])
+    scene = get_scene(job["scene"])
+    missing = gaffer.api.apply_rig(scene, job["rig"], job["target"])
+    if job["save"]:
+        bpy.ops.wm.save_mainfile()
+    return {"lights": len(job["rig"]["lights"]), "missing": missing}
+
+
+def task_inventory(gaffer, job):
+    open_file(job["file"])
+    scenes = [get_scene(job["scene"])] if job["scene"] else list(bpy.data.scenes)
+    return {
+        "scenes": [gaffer.api.get_inventory(scene) for scene in scenes],
+        "missing_images": gaffer.functions.get_missing_images(),
+    }
+
+
+def set_lookdev_render_settings(scene, width, samples, label):
+    render = scene.render
+    scale = width / render.resolution_x
+    render.resolution_x = width
+    render.resolution_y = max(1, round(render.resolution_y * scale))
+    render.resolution_percentage = 100
+    if render.engine == "CYCLES":
+        scene.cycles.samples = samples
+    elif hasattr(scene, "eevee"):
+        scene.eevee.taa_render_samples = samples
+    render.image_settings.file_format = "PNG"
+    render.image_settings.color_mode = "RGB"
+    render.use_stamp = True
+    for field in STAMP_FIELDS:
+        if hasattr(render, field):
+            setattr(render, field, False)
+    render.use_stamp_note = True
+    render.stamp_note_text = label
+    render.stamp_font_size = max(10, width // 24)
+
+
+def task_render_lookdev(gaffer, job):
+    # The file isn't opened again between jobs, so the HDRIs each worker loaded stay in memory for its next jobs
+    open_file(job["file"], reload=False)
+    scene = get_scene(job["scene"])
+    if scene.camera is None:
+        raise ValueError("Scene '{}' has no camera".format(scene.name))
+    if job["snapshot"]:
+        snapshot = scene.gaf_props.Snapshots.get(job["snapshot"])
+        if snapshot is None:
+            raise KeyError("No snapshot named '{}'".format(job["snapshot"]))
+        gaffer.api.restore_snapshot(scene, snapshot.data)
+    if job["hdri"]:
+        gaffer.api.set_hdri(scene, job["hdri"])
+    set_lookdev_render_settings(scene, job["width"], job["samples"], job["label"])
+    scene.render.filepath = job["output"]
+    bpy.ops.render.render(write_still=True, scene=scene.name)
+    return {"output": job["output"], "label": job["label"]}
+
+
+TASKS = {
+    "apply_rig": task_apply_rig,
+    "inventory": task_inventory,
+    "render_lookdev": task_render_lookdev,
+}
+
+
+def send(message):
+    sys.stdout.write(MESSAGE_PREFIX + json.dumps(message) + "\n")
+    sys.stdout.flush()
+
+
+def worker_main():
+    gaffer = enable_gaffer()
+    send({"ready": True})
+    for line in sys.stdin:
+        if not line.strip():
+            break
+        job = json.loads(line)
+        result = {"ok": True, "error": ""}
+        start = perf_counter()
+        try:
+            result.update(TASKS[job["task"]](gaffer, job))
+        except Exception as e:
+            result["ok"] = False
+            result["error"] = "".join(traceback.format_exception_only(type(e), e)).strip()
+        result["seconds"] = round(perf_counter() - start, 4)
+        send(result)
+
+
+# Pool side
+
+
+class Worker:
+    """One background Blender process running worker_main"""
+
+    def __init__(self, binary_path):
+        cmd = [binary_path, "--background", "--factory-startup", "--python", os.path.abspath(__file__)]
+        cmd += ["--", WORKER_FLAG]
+        self.process = Popen(
+            cmd, stdin=PIPE, stdout=PIPE, stderr=STDOUT, text=True, encoding="utf-8", errors="replace", bufsize=1
+        )
+        self.output = deque(maxlen=20)  # Last lines Blender printed, to explain crashes
+        self.ready = self.receive() is not None
+
+    def receive(self):
+        """Return the next message from the worker, or None if it exited"""
+        for line in self.process.stdout:
+            if line.startswith(MESSAGE_PREFIX):
+                return json.loads(line[len(MESSAGE_PREFIX) :])
+            self.output.append(line.rstrip())
+        return None
+
+    def run(self, job):
+        """Send a job to the worker and return its result, or None if the worker exited"""
+        self.output.clear()
+        try:
+            self.process.stdin.write(json.dumps(job) + "\n")
+            self.process.stdin.flush()
+        except OSError:
+            return None
+        return self.receive()
+
+    def close(self):
+        if self.process.poll() is None:
+            try:
+                self.process.stdin.write("\n")
+                self.process.stdin.close()
+            except OSError:
+                pass
+        self.process.wait()
+
+
+class WorkerPool:
+    """
+    A pool of background Blender processes. Each one runs jobs one after the other until the queue is empty,
+    a worker that crashes is replaced and its job is reported as failed
+    """
+
+    def __init__(self, num_workers=None):
+        self.num_workers = max(1, num_workers or os.cpu_count() or 1)
+        self.binary_path = bpy.app.binary_path  # Read here since run may be called from another thread
+        self.cancelled = False
+        self.workers = set()
+
+    def cancel(self):
+        """Stop giving out jobs, the ones that are running still finish. Jobs that didn't run get no result"""
+        self.cancelled = True
+
+    def stop(self):
+        """Cancel and kill the workers, so that run returns right away. Running jobs are reported as failed"""
+        self.cancelled = True
+        for worker in list(self.workers):
+            worker.process.kill()
+
+    def run(self, jobs, on_result=None):
+        """Run these jobs (dicts with a "task" and its arguments), return their results in the same order"""
+        queue = Queue()
+        for i, job in enumerate(jobs):
+            queue.put((i, job))
+        results = [None] * len(jobs)
+        lock = threading.Lock()
+
+        def work():
+            worker = None
+            while not self.cancelled:
+                try:
+                    i, job = queue.get_nowait()
+                except Empty:
+                    break
+                if worker is None:
+                    worker = Worker(self.binary_path)
+                    self.workers.add(worker)
+                    if self.cancelled:  # Stopped while the worker was starting
+                        break
+                start = perf_counter()
+                result = worker.run(job) if worker.ready else None
+                if result is None:
+                    output = "\n".join(worker.output)
+                    result = {"ok": False, "error": "Blender worker exited:\n" + output, "seconds": 0}
+                    worker.close()
+                    self.workers.discard(worker)
+                    worker = None
+                result["wall_seconds"] = round(perf_counter() - start, 4)
+                result["file"] = job.get("file", "")
+                results[i] = result
+                if on_result:
+                    with lock:
+                        on_result(result)
+            if worker:
+                worker.close()
+                self.workers.discard(worker)
+
+        threads = [threading.Thread(target=work) for _ in range(min(self.num_workers, len(jobs)))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+
+def print_result(result):
+    status = "OK  " if result["ok"] else "FAIL"
+    print("{} {:8.2f}s  {}".format(status, result["wall_seconds"], result["file"]))
+    if result["error"]:
+        print("    " + result["error"].replace("\n", "\n    "))
+    for item in result.get("missing", []):
+        print("    Couldn't set up " + item)
+    for info in result.get("scenes", []):
+        hdri = info["world"]["hdri"] or os.path.basename(info["world"]["variation"]) or "none"
+        print("    {}: {} lights, HDRI {}".format(info["scene"], len(info["lights"]), hdri))
+    if result.get("missing_images"):
+        print("    {} missing images".format(len(result["missing_images"])))
+
+
+def run_jobs(args, jobs):
+    pool = WorkerPool(args.workers)
+    print("Running {} jobs on {} workers...".format(len(jobs), min(pool.num_workers, len(jobs))))
+    start = perf_counter()
+    results = pool.run(jobs, on_result=print_result)
+    elapsed = perf_counter() - start
+
+    failed = [r for r in results if not r["ok"]]
+    print("{} files in {:.1f}s, {} failed".format(len(results), elapsed, len(failed)))
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"seconds": round(elapsed, 4), "failed": len(failed), "results": results}, f, indent=4)
+    return results
+
+
+def command_apply_rig(args, gaffer):
+    fn = gaffer.functions
+    rig = fn.load_rig(args.rig)  # Loaded once here, the workers get it with each job
+    jobs = []
+    for filepath in expand_files(args.files):
+        jobs.append(
+            {
+                "task": "apply_rig",
+                "file": filepath,
+                "rig": rig,
+                "target": args.target,
+                "scene": args.scene,
+                "save": not args.no_save,
+            }
+        )
+    return run_jobs(args, jobs)
+
+
+def write_inventory_csv(filepath, results):
+    columns = ["file", "scene", "engine", "lights", "hidden_lights", "total_strength", "world", "hdri", "variation"]
+    columns += ["hdri_not_found", "missing_images", "error"]
+    with open(filepath, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        for result in results:
+            if not result["ok"]:
+                writer.writerow({"file": result["file"], "error": result["error"]})
+                continue
+            for info in result["scenes"]:
+                lights = info["lights"]
+                world = info["world"]
+                writer.writerow(
+                    {
+                        "file": result["file"],
+                        "scene": info["scene"],
+                        "engine": info["engine"],
+                        "lights": len(lights),
+                        "hidden_lights": sum(light["hidden"] for light in lights),
+                        "total_strength": round(sum(light["strength"] or 0 for light in lights), 4),
+                        "world": world["name"],
+                        "hdri": world["hdri"],
+                        "variation": world["variation"],
+                        "hdri_not_found": world["hdri_not_found"],
+                        "missing_images": len(result["missing_images"]),
+                        "error": "",
+                    }
+                )
+
+
+def command_inventory(args, gaffer):
+    jobs = [{"task": "inventory", "file": filepath, "scene": args.scene} for filepath in expand_files(args.files)]
+    results = run_jobs(args, jobs)
+    if args.csv:
+        write_inventory_csv(args.csv, results)
+    return results
+
+
+def lookdev_jobs(fn, filepath, scene, source, output_dir, width=320, samples=16):
+    """
+    Make the jobs to render the scene of this file under each HDRI matching its world's search and filters (source
+    HDRIS), or under each of its snapshots (SNAPSHOTS). The file must be open, as the HDRIs and snapshots are read
+    from the scene. fn is the functions module of the enabled add-on. Renders are written to output_dir
+    """
+    if source == "SNAPSHOTS":
+        items = [(snapshot.name, "", snapshot.name) for snapshot in scene.gaf_props.Snapshots]
+    else:
+        with fn.scene_context(scene):
+            items = [("", hdri, hdri) for hdri in fn.get_hdri_list(use_search=True)]
+    jobs = []
+    for i, (snapshot, hdri, label) in enumerate(items):
+        jobs.append(
+            {
+                "task": "render_lookdev",
+                "file": filepath,
+                "scene": scene.name,
+                "snapshot": snapshot,
+                "hdri": hdri,
+                "label": label,
+                "width": width,
+                "samples": samples,
+                "output": os.path.join(output_dir, "{:04d}.png".format(i)),
+            }
+        )
+    return jobs
+
+
+def assemble_contact_sheet(paths, output, columns=0):
+    """
+    Tile these images into one, left to right and top to bottom, and save it as a PNG. Images that don't have the
+    same size as the first one are left out. Returns the new image, which stays in bpy.data.images
+    """
+    images = [bpy.data.images.load(path) for path in paths if os.path.exists(path)]
+    if not images:
+        return None
+    width, height = images[0].size
+    images = [img for img in images if tuple(img.size) == (width, height)]
+    columns = columns or ceil(sqrt(len(images)))
+    rows = ceil(len(images) / columns)
+
+    row_length = width * 4
+    sheet = array("f", bytes(4 * row_length * columns * height * rows))
+    tile = array("f", bytes(4 * row_length * height))
+    for i, img in enumerate(images):
+        img.pixels.foreach_get(tile)
+        x = (i % columns) * row_length
+        y = (rows - 1 - i // columns) * height  # Pixels start at the bottom
+        for line in range(height):
+            start = (y + line) * row_length * columns + x
+            sheet[start : start + row_length] = tile[line * row_length : (line + 1) * row_length]
+        bpy.data.images.remove(img)
+
+    name = os.path.basename(output)
+    result = bpy.data.images.new(name, width * columns, height * rows)
+    result.pixels.foreach_set(sheet)
+    result.filepath_raw = output
+    result.file_format = "PNG"
+    result.save()
+    return result
+
+
+def command_contact_sheet(args, gaffer):
+    filepath = expand_files([args.file])[0]
+    bpy.ops.wm.open_mainfile(filepath=filepath, load_ui=False)  # To read the HDRI filters and snapshots
+    scene = get_scene(args.scene)
+    output = args.output or os.path.splitext(filepath)[0] + "_contact_sheet.png"
+    render_dir = tempfile.mkdtemp(prefix="gaffer_lookdev_")
+    try:
+        jobs = lookdev_jobs(gaffer.functions, filepath, scene, args.source, render_dir, args.width, args.samples)
+        if not jobs:
+            sys.exit("Nothing to render, no {} found".format(args.source.lower()))
+        results = run_jobs(args, jobs)
+        if assemble_contact_sheet([r["output"] for r in results if r["ok"]], output, args.columns):
+            print("Saved contact sheet to " + output)
+    finally:
+        shutil.rmtree(render_dir, ignore_errors=True)
+    return results
+
+
+def parse_args():
+    argv = sys.argv[sys.argv.index("--") + 1 :] if "--" in sys.argv else []  # Get all args after '--'
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--workers", type=int, default=0)
+    common.add_argument("--report", default="")
+    parser = argparse.ArgumentParser(prog="batch.py")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    apply_rig = commands.add_parser("apply-rig", parents=[common])
+    apply_rig.add_argument("rig")
+    apply_rig.add_argument("files", nargs="+")
+    apply_rig.add_argument("--target", default="SAVED")
+    apply_rig.add_argument("--scene", default="")
+    apply_rig.add_argument("--no-save", action="store_true")
+    apply_rig.set_defaults(run=command_apply_rig)
+
+    inventory = commands.add_parser("inventory", parents=[common])
+    inventory.add_argument("files", nargs="+")
+    inventory.add_argument("--scene", default="")
+    inventory.add_argument("--csv", default="")
+    inventory.set_defaults(run=command_inventory)
+
+    contact_sheet = commands.add_parser("contact-sheet", parents=[common])
+    contact_sheet.add_argument("file")
+    contact_sheet.add_argument("--source", choices=["HDRIS", "SNAPSHOTS"], default="HDRIS")
+    contact_sheet.add_argument("--scene", default="")
+    contact_sheet.add_argument("--width", type=int, default=320)
+    contact_sheet.add_argument("--samples", type=int, default=16)
+    contact_sheet.add_argument("--columns", type=int, default=0)
+    contact_sheet.add_argument("--output", default="")
+    contact_sheet.set_defaults(run=command_contact_sheet)
+
+    return parser.parse_args(argv)
+
+
+def main():
+    if WORKER_FLAG in sys.argv:
+        worker_main()
+        return
+    args = parse_args()
+    gaffer = enable_gaffer()
+    results = args.run(args, gaffer)
+    if any(not r["ok"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+# BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# END GPL LICENSE BLOCK #####
+
+# Times Gaffer's light management on synthetic scenes and writes the results as JSON,
+# so that the cost can be compared between versions.
+# Before timing each scene it checks that the light list drops a light that was added and deleted again.
+
+# Args (all optional):
+# --lights N [N ...]     number of point/spot/area lights for each scene size
+# --meshes M [M ...]     number of emissive meshes for each scene size (same count as --lights)
+# --shared-ratio R       fraction of the emissive meshes that share a single material, the rest get their own
+# --depth D              depth of the nested collection tree the objects are spread over
+# --runs R               number of times each measurement is repeated
+# --output PATH          JSON file to write, results are always printed too
+
+# example usage:
+# blender --background --factory-startup --python benchmark.py -- --lights 100 1000 --meshes 10 100 --output bench.json
+
+import bpy
+import addon_utils
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+from statistics import mean, median
+from time import perf_counter
+
+ADDON_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE = os.path.basename(ADDON_DIR)
+
+
+def parse_args():
+    argv = sys.argv[sys.argv.index("--") + 1 :] if "--" in sys.argv else []  # Get all args after '--'
+    parser = argparse.ArgumentParser(prog="benchmark.py")
+    parser.add_argument("--lights", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--meshes", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--shared-ratio", type=float, default=0.5)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", default="")
+    args = parser.parse_args(argv)
+    if len(args.lights) != len(args.meshes):
+        parser.error("--lights and --meshes need the same number of values")
+    if min(args.lights) < 1:
+        parser.error("--lights needs at least one light for the solo and depsgraph handler measurements")
+    return args
+
+
+def enable_gaffer():
+    if os.path.dirname(ADDON_DIR) not in sys.path:
+        sys.path.append(os.path.dirname(ADDON_DIR))
+    if addon_utils.enable(MODULE, default_set=True) is None:
+        sys.exit("Could not enable Gaffer from " + ADDON_DIR)
+    bpy.context.preferences.addons[MODULE].preferences.auto_refresh_light_list = True
+    return sys.modules[MODULE]
+
+
+class LayoutRecorder:
+    """Stands in for bpy.types.UILayout so that panel draw code can run without a UI"""
+
+    def __getattr__(self, name):
+        return self._item
+
+    def _item(self, *args, **kwargs):
+        return self
+
+
+def summarize(times):
+    times_ms = [t * 1000 for t in times]
+    return {
+        "runs": len(times_ms),
+        "min_ms": round(min(times_ms), 4),
+        "median_ms": round(median(times_ms), 4),
+        "mean_ms": round(mean(times_ms), 4),
+        "max_ms": round(max(times_ms), 4),
+    }
+
+
+def measure(func, runs, setup=None):
+    times = []
+    for _ in range(runs):
+        if setup:
+            setup()
+        start = perf_counter()
+        func()
+        times.append(perf_counter() - start)
+    return summarize(times)
+
+
+class HandlerTimer:
+    """Wraps Gaffer's depsgraph handler to time only the handler, not the depsgraph evaluation"""
+
+    def __init__(self, fn):
+        self.handler = fn.depsgraph_update_post_handler
+        self.elapsed = 0
+
+    def __call__(self, scene, depsgraph):
+        start = perf_counter()
+        self.handler(scene, depsgraph)
+        self.elapsed += perf_counter() - start
+
+    def __enter__(self):
+        handlers = bpy.app.handlers.depsgraph_update_post
+        handlers[handlers.index(self.handler)] = self
+        return self
+
+    def __exit__(self, *args):
+        handlers = bpy.app.handlers.depsgraph_update_post
+        handlers[handlers.index(self)] = self.handler
+
+    def measure(self, change, runs):
+        times = []
+        for i in range(runs):
+            self.elapsed = 0
+            change(i)
+            bpy.context.view_layer.update()
+            times.append(self.elapsed)
+        return summarize(times)
+
+
+def clear_scene(scene):
+    ids = list(bpy.data.objects) + list(bpy.data.lights) + list(bpy.data.meshes) + list(bpy.data.materials)
+    ids += list(bpy.data.collections)
+    bpy.data.batch_remove(ids)
+    scene.gaf_props.SoloActive = ""
+
+
+def make_collections(parent, depth):
+    collections = [parent]
+    if depth > 0:
+        for i in range(2):
+            child = bpy.data.collections.new(parent.name + "_" + str(i))
+            parent.children.link(child)
+            collections += make_collections(child, depth - 1)
+    return collections
+
+
+def make_emission_material(name):
+    mat = bpy.data.materials.new(name)
+    mat.use_nodes = True
+    nodes = mat.node_tree.nodes
+    nodes.clear()
+    output = nodes.new("ShaderNodeOutputMaterial")
+    emission = nodes.new("ShaderNodeEmission")
+    emission.location.x = -200
+    emission.inputs[1].default_value = 10
+    mat.node_tree.links.new(emission.outputs[0], output.inputs[0])
+    return mat
+
+
+def build_scene(scene, num_lights, num_meshes, shared_ratio, depth):
+    clear_scene(scene)
+    root = bpy.data.collections.new("Bench")
+    scene.collection.children.link(root)
+    collections = make_collections(root, depth)
+
+    light_types = ["POINT", "SPOT", "AREA"]
+    for i in range(num_lights):
+        data = bpy.data.lights.new("BenchLight.{:05d}".format(i), light_types[i % len(light_types)])
+        data.energy = 100
+        if scene.render.engine == "CYCLES" and hasattr(data, "use_nodes"):
+            data.use_nodes = True
+        obj = bpy.data.objects.new(data.name, data)
+        obj.location = (i % 32, i // 32, 3)
+        collections[i % len(collections)].objects.link(obj)
+
+    mesh = bpy.data.meshes.new("BenchPlane")
+    mesh.from_pydata([(-0.5, -0.5, 0), (0.5, -0.5, 0), (0.5, 0.5, 0), (-0.5, 0.5, 0)], [], [(0, 1, 2, 3)])
+    mesh.materials.append(None)
+    shared = make_emission_material("BenchShared")
+    num_shared = int(num_meshes * shared_ratio)
+    for i in range(num_meshes):
+        obj = bpy.data.objects.new("BenchEmitter.{:05d}".format(i), mesh)
+        obj.location = (i % 32, i // 32, 0)
+        obj.material_slots[0].link = "OBJECT"
+        obj.material_slots[0].material = shared if i < num_shared else make_emission_material(obj.name)
+        collections[i % len(collections)].objects.link(obj)
+
+    bpy.context.view_layer.update()
+    return {
+        "lights": num_lights,
+        "meshes": num_meshes,
+        "shared_material_meshes": num_shared,
+        "unique_materials": num_meshes - num_shared,
+        "collections": len(collections),
+    }
+
+
+def check_add_delete_refresh(fn, scene):
+    """Add a light, delete it again and refresh, the light list must not keep a record of the deleted light"""
+    fn.refresh_light_list(scene)
+    data = bpy.data.lights.new("BenchCheck", "POINT")
+    obj = bpy.data.objects.new(data.name, data)
+    scene.collection.objects.link(obj)
+    name = obj.name
+    bpy.context.view_layer.update()  # The depsgraph handler patches the new light into the list
+    bpy.data.objects.remove(obj)
+    bpy.data.lights.remove(data)
+    bpy.context.view_layer.update()
+    fn.refresh_light_list(scene)  # What the queued refresh after a deletion does
+    if fn.get_light_record(scene, name) is not None:
+        sys.exit("Check failed: the light list still has a record of the deleted light '{}'".format(name))
+
+
+def run_benchmarks(gaffer, scene, runs):
+    fn = gaffer.functions
+    ui = gaffer.ui
+    context = bpy.context
+    timings = {}
+
+    def refresh_cold():
+        fn.invalidate_emission_cache()
+        fn.invalidate_data_users()
+        fn.untrust_light_list()
+        scene.gaf_props.LightFingerprint = ""  # Otherwise only the fingerprint check is measured
+
+    timings["refresh_light_list_cold"] = measure(lambda: fn.refresh_light_list(scene), runs, setup=refresh_cold)
+    timings["refresh_light_list"] = measure(lambda: fn.refresh_light_list(scene), runs)
+
+    lights = fn.get_lights(scene)
+    timings["draw_cycles_eevee_ui"] = measure(lambda: ui.draw_cycles_eevee_UI(context, LayoutRecorder(), lights), runs)
+    timings["draw_unsupported_renderer_ui"] = measure(
+        lambda: ui.draw_unsupported_renderer_UI(context, LayoutRecorder(), lights), runs
+    )
+
+    solo_light = lights[len(lights) // 2].name
+
+    def solo_enter():
+        bpy.ops.gaffer.solo(light=solo_light, showhide=True, dataname="__SINGLE_USER__")
+
+    def solo_exit():
+        if scene.gaf_props.SoloActive:
+            bpy.ops.gaffer.solo(showhide=False)
+
+    timings["solo_enter"] = measure(solo_enter, runs, setup=solo_exit)
+    timings["solo_exit"] = measure(solo_exit, runs, setup=solo_enter)
+
+    def set_exposure():
+        scene.view_settings.exposure = 0.1
+
+    timings["apply_exposure"] = measure(lambda: bpy.ops.gaffer.apply_exposure(), runs, setup=set_exposure)
+
+    light_obj = bpy.data.objects[lights[0].name]
+    shared = bpy.data.materials["BenchShared"]
+    with HandlerTimer(fn) as handler:
+
+        def move_light(i):
+            light_obj.location.z += 0.1
+
+        def change_energy(i):
+            light_obj.data.energy += 1
+
+        def change_shared_material(i):
+            shared.node_tree.nodes["Emission"].inputs[1].default_value += 1
+
+        def add_light(i):
+            data = bpy.data.lights.new("BenchAdded.{:05d}".format(i), "POINT")
+            scene.collection.objects.link(bpy.data.objects.new(data.name, data))
+
+        timings["handler_move_light"] = handler.measure(move_light, runs)
+        timings["handler_light_energy"] = handler.measure(change_energy, runs)
+        timings["handler_shared_material"] = handler.measure(change_shared_material, runs)
+        timings["handler_add_light"] = handler.measure(add_light, runs)
+
+    return timings
+
+
+def main():
+    args = parse_args()
+    gaffer = enable_gaffer()
+    scene = bpy.context.scene
+    scene.render.engine = "CYCLES"
+
+    results = {
+        "gaffer_version": ".".join(str(v) for v in gaffer.bl_info["version"]),
+        "blender_version": bpy.app.version_string,
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "runs": args.runs,
+        "scenes": [],
+    }
+    for num_lights, num_meshes in zip(args.lights, args.meshes):
+        print("Benchmarking {} lights, {} emissive meshes...".format(num_lights, num_meshes))
+        info = build_scene(scene, num_lights, num_meshes, args.shared_ratio, args.depth)
+        check_add_delete_refresh(gaffer.functions, scene)
+        info["timings"] = run_benchmarks(gaffer, scene, args.runs)
+        results["scenes"].append(info)
+
+    output = json.dumps(results, indent=4)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+main()
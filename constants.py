@@ -21,6 +21,12 @@ import os
 
 supported_renderers = ["CYCLES", "BLENDER_EEVEE", "BLENDER_EEVEE_NEXT"]
 
+# Light linking receiver collection used to turn off the other lights while soloing
+solo_receivers_name = "Gaffer Solo Receivers"
+
+# Undo group of the operators used during a batch edit, consecutive undo steps in it are merged into one
+batch_edit_undo_group = "Gaffer Batch Edit"
+
 col_temp = {
     "01_Flame (1700)": 1700,
     "02_Tungsten (3200)": 3200,
@@ -31,6 +37,11 @@ col_temp = {
     "07_Sky (12000)": 12000,
 }
 
+# Color temperatures up to blackbody_max K are converted to RGB with a table that has an entry every
+# blackbody_lut_step K, interpolated in between
+blackbody_max = 12000
+blackbody_lut_step = 10
+
 # List of RGB values that correlate to the 380-780 wavelength range. Even though this
 # is the exact list from the Cycles code, for some reason it doesn't always match :(
 wavelength_list = (
@@ -123,6 +134,11 @@ thumbnail_dir = os.path.join(data_dir, "thumbs")
 if not os.path.exists(thumbnail_dir):
     os.makedirs(thumbnail_dir)
 thumb_endings = ["preview", "thumb", "thumbnail"]
+profile_path = os.path.join(data_dir, "profile.json")
+profile_ring_size = 256  # Number of recent call timings kept per profiled function
+profile_buckets_ms = (0.1, 0.3, 1, 3, 10, 30, 100, 300, 1000)  # Upper bounds of the timing histogram buckets
+rig_library_dir = os.path.join(data_dir, "rigs")
+contact_sheet_dir = os.path.join(data_dir, "contact_sheets")
 hdr_file_types = [".tif", ".tiff", ".hdr", ".exr"]
 allowed_file_types = hdr_file_types + [".jpg", ".jpeg", ".png", ".tga"]
 jpg_dir = os.path.join(data_dir, "hdri_jpgs")
@@ -157,6 +173,22 @@ defaults_stored = [
     "use_jpg_background",
     "use_darkened_jpg",
 ]
+# World HDRI settings stored in light rig snapshots, in the order they're restored (the HDRI before its adjustments)
+snapshot_hdri_props = ["hdri_handler_enabled", "hdri", "hdri_variation"] + ["hdri_" + d for d in defaults_stored]
+snapshot_hdri_props += [
+    "hdri_color",
+    "hdri_use_separate_rotation",
+    "hdri_background_rotation",
+    "hdri_use_separate_color",
+    "hdri_background_color",
+]
+# Which lights the bulk edit operators act on
+bulk_scopes = (
+    ("SELECTED", "Selected", "The selected lights"),
+    ("LISTED", "Listed", "All lights in the Gaffer light list with its current filters"),
+)
+# Light data property that holds the size of each light type
+light_size_props = {"POINT": "shadow_soft_size", "SPOT": "shadow_soft_size", "AREA": "size", "SUN": "angle"}
 settings_file = os.path.join(data_dir, "settings.json")
 preview_collections = {}
 icon_dir = os.path.join(os.path.dirname(__file__), "icons")
@@ -233,3 +265,32 @@ depsgraph_id_types = [
     "WORKSPACE",
     "WORLD",
 ]
+# Light data properties stored in rig presets, each light only stores the ones its type has
+rig_light_props = [
+    "energy",
+    "color",
+    "use_shadow",
+    "shadow_soft_size",
+    "spot_size",
+    "spot_blend",
+    "show_cone",
+    "shape",
+    "size",
+    "size_y",
+    "angle",
+    "spread",
+    "use_nodes",
+]
+rig_collection_prefix = "Rig "
+# What a rig preset is placed relative to when it's applied
+rig_targets = (
+    ("SAVED", "Saved Target", "The object with the same name as the one the rig was saved relative to"),
+    ("ACTIVE", "Active Object", "The active object"),
+    ("CURSOR", "3D Cursor", "The 3D cursor"),
+    ("WORLD", "World Origin", "The world origin"),
+)
+# What the lookdev contact sheet renders the scene under
+lookdev_sources = (
+    ("HDRIS", "HDRIs", "Each HDRI that matches the current search and filters"),
+    ("SNAPSHOTS", "Snapshots", "Each snapshot of the scene"),
+)
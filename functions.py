@@ -17,19 +17,29 @@
 # END GPL LICENSE BLOCK #####
 
 import bpy
+import array
+import base64
+import bisect
+import hashlib
 import json
 from gpu_extras.batch import batch_for_shader
 import os
 import math
 import time
 import datetime
-from collections import OrderedDict
-from mathutils import Vector, Euler
+import functools
+import zlib
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from mathutils import Vector, Euler, Matrix
 from bpy.app.handlers import persistent
 
-from . import constants as const
+try:
+    import numpy as np
+except ImportError:  # Blender ships with NumPy, but Gaffer works without it
+    np = None
 
-TAG_REFRESH_LIGHT_LIST = False
+from . import constants as const
 
 
 # Persistent settings functions
@@ -152,13 +162,15 @@ def dpifac():
 
 
 def time_execution(func):
-    """Decorator to log execution time of a function if it takes longer than 100 ms"""
+    """Decorator to log execution time of a function if it takes longer than 100 ms, and profile it"""
 
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        start_time = time.time()
+        start_time = time.perf_counter()
         result = func(*args, **kwargs)
-        end_time = time.time()
-        execution_time = (end_time - start_time) * 1000  # in milliseconds
+        execution_time = (time.perf_counter() - start_time) * 1000  # in milliseconds
+        if PROFILING:
+            record_timing(func.__name__, execution_time)
         if execution_time > 100:
             log(f"Function '{func.__name__}' took {execution_time:.2f} ms")
         return result
@@ -166,41 +178,419 @@ def time_execution(func):
     return wrapper
 
 
+# Profiling functions
+
+PROFILING = False  # Whether profile() records timings, set from the preferences
+_profile_stats = {}  # Profiled name -> call count, timings and histogram, see record_timing
+
+
+def set_profiling(enabled):
+    global PROFILING
+    PROFILING = enabled
+
+
+def _update_profiling(self, context):
+    set_profiling(self.enable_profiling)
+
+
+def record_timing(name, ms):
+    stats = _profile_stats.get(name)
+    if stats is None:
+        stats = {
+            "count": 0,
+            "total_ms": 0.0,
+            "max_ms": 0.0,
+            "histogram": [0] * (len(const.profile_buckets_ms) + 1),
+            "recent": deque(maxlen=const.profile_ring_size),
+        }
+        _profile_stats[name] = stats
+    stats["count"] += 1
+    stats["total_ms"] += ms
+    stats["max_ms"] = max(stats["max_ms"], ms)
+    stats["histogram"][bisect.bisect_left(const.profile_buckets_ms, ms)] += 1
+    stats["recent"].append(ms)
+
+
+def profile(name):
+    """Decorator that records the duration of every call while profiling is enabled, and costs a flag check if not"""
+
+    def decorator(func):
+        def call(*args):
+            if not PROFILING:
+                return func(*args)
+            start_time = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                record_timing(name, (time.perf_counter() - start_time) * 1000)
+
+        if func.__code__.co_argcount == 2:
+            # Blender checks the argument count of panel draw functions and property update callbacks
+            def wrapper(self, context):
+                return call(self, context)
+
+        else:
+            def wrapper(*args):
+                return call(*args)
+
+        return functools.wraps(func)(wrapper)
+
+    return decorator
+
+
+def reset_profile():
+    _profile_stats.clear()
+
+
+def get_profile_report():
+    """Return the profiling stats as JSON-friendly dicts, slowest total time first"""
+    labels = ["<" + str(b) + "ms" for b in const.profile_buckets_ms] + [">=" + str(const.profile_buckets_ms[-1]) + "ms"]
+    report = {}
+    for name, stats in sorted(_profile_stats.items(), key=lambda x: x[1]["total_ms"], reverse=True):
+        recent = sorted(stats["recent"])
+        report[name] = {
+            "count": stats["count"],
+            "total_ms": round(stats["total_ms"], 3),
+            "mean_ms": round(stats["total_ms"] / stats["count"], 3),
+            "max_ms": round(stats["max_ms"], 3),
+            "recent_median_ms": round(recent[len(recent) // 2], 3),
+            "recent_p95_ms": round(recent[min(len(recent) - 1, int(len(recent) * 0.95))], 3),
+            "histogram": dict(zip(labels, stats["histogram"])),
+        }
+    return report
+
+
 # Light list functions
 
+_light_index = {}  # Scene pointer -> {object name: index in that scene's LightRegistry}
+_light_ids = {}  # Scene pointer -> {object identity: name of its registry record}, to detect renamed lights
+_trusted_scenes = set()  # Pointers of scenes whose light registry is known to match the scene
+_object_counts = {}  # Scene pointer -> number of objects in the scene at the last light list update
+_emission_cache = {}  # Node tree pointer -> what drives the strength, color and falloff, see resolve_emission
+_tree_signatures = {}  # Node tree pointer -> checksum of its nodes and links, see get_node_tree_signature
+_data_users = {}  # Light data or material pointer -> names of the objects that use it
+_object_data = {}  # Object name -> pointers of the light data and materials it's indexed under in _data_users
+_data_users_count = None  # Number of objects when _data_users was built, None if it needs to be rebuilt
+_refresh_queue = {}  # Scene name -> reason, for scenes waiting for a deferred refresh, see tag_refresh_light_list
+_refresh_deadline = 0.0  # time.monotonic() after which the queued refreshes may run
+_rendering = False  # Whether a final render is running, set by the render handlers
+_suspended_scenes = set()  # Names of scenes whose depsgraph updates were skipped during playback or rendering
+_suspended_types = set()  # ID types that were updated while the depsgraph handler was suspended
+_light_views = {}  # (scene pointer, view layer pointer) -> (filter settings, view) of panel lights, see get_light_view
+_visibility_filters = {}  # (scene pointer, view layer pointer) -> sets of visible collections and blacklisted objects
+_rig_items = []  # Enum items of the rig presets, see rig_enum_items
+
+
+def get_lights(scene):
+    """Return the light registry of this scene, a collection of GafferLight records"""
+    return scene.gaf_props.LightRegistry
+
+
+def invalidate_light_index(scene=None):
+    if scene is None:
+        _light_index.clear()
+    else:
+        _light_index.pop(scene.as_pointer(), None)
 
-@time_execution
-def refresh_light_list(scene):
-    def get_next_available_value_socket(node):
-        current_node = node
-        found_node = node.name
-        found_socket = -1
-        i = 0
-        max_iterations = 1000  # Prevent infinite loop
-        while found_socket == -1:
-            i += 1
-            if i == max_iterations:
-                print("Gaffer Warning: Max iterations hit in get_next_available_value_socket for " + node.name)
-                break
-            if len(current_node.inputs) == 0:
-                # End of the line.
-                break
 
-            for si, s in enumerate(current_node.inputs):
-                if s.type == "VALUE":
-                    if not s.is_linked:
-                        found_node = current_node.name
-                        found_socket = si
-                        break
-                    else:
-                        current_node = s.links[0].from_node
-        return found_node, found_socket
+def untrust_light_list(scene=None):
+    """Make the next light list update do a full rescan, e.g. after loading a file or undoing"""
+    if scene is None:
+        _trusted_scenes.clear()
+        _object_counts.clear()
+        _light_ids.clear()
+    else:
+        _trusted_scenes.discard(scene.as_pointer())
+        _light_ids.pop(scene.as_pointer(), None)
+    invalidate_light_index(scene)
+    invalidate_light_view(scene)
+
 
-    global TAG_REFRESH_LIGHT_LIST
-    TAG_REFRESH_LIGHT_LIST = False
+def ensure_light_list(scene, deferred=False):
+    """
+    Do a full refresh of the light list only if it can't be trusted to match the scene.
+    With deferred the refresh is queued instead, for draw functions which can't write to ID properties
+    """
+    if scene.as_pointer() in _trusted_scenes:
+        return
+    if not deferred:
+        refresh_light_list(scene)
+    elif scene.name not in _refresh_queue:
+        tag_refresh_light_list(scene, "switching to a scene that changed")
+
+
+def refresh_all_light_lists(scenes=None):
+    """
+    Refresh the light lists of several scenes (all of them by default) in one pass.
+    Node trees shared between the scenes are only resolved once, and scenes whose fingerprint matches are skipped
+    """
+    scenes = list(bpy.data.scenes if scenes is None else scenes)
+    for scene in scenes:
+        refresh_light_list(scene)
+    return scenes
+
+
+def get_light_record_index(scene, name):
+    """Return the index of the registry record for the light object with this name, or None. O(1) lookup"""
+    registry = scene.gaf_props.LightRegistry
+    key = scene.as_pointer()
+    for attempt in range(2):
+        index = _light_index.get(key)
+        if index is None:
+            index = {rec.name: i for i, rec in enumerate(registry)}
+            _light_index[key] = index
+        i = index.get(name)
+        if i is not None and i < len(registry) and registry[i].name == name:
+            return i
+        if i is None and len(index) == len(registry):
+            return None
+        # Index is stale (registry was changed by undo, file load or another scene), rebuild it once
+        _light_index.pop(key, None)
+    return None
+
+
+def get_light_record(scene, name):
+    """Return the registry record for the light object with this name, or None. O(1) lookup"""
+    i = get_light_record_index(scene, name)
+    return None if i is None else scene.gaf_props.LightRegistry[i]
+
+
+def parse_socket(socket):
+    """Split a socket string like 'i0' or 'o1' into its type and index"""
+    socket = str(socket)
+    if socket.startswith("o"):
+        return "o", int(socket[1:])
+    elif socket.startswith("i"):
+        return "i", int(socket[1:])
+    elif socket.isdigit():
+        return "i", int(socket)
+    return "", 0
+
+
+def write_light_record(rec, light):
+    """Fill a registry record from an [object name, material name, node name, socket] entry"""
+    obj_name, material, node, socket = light
+    rec.name = obj_name
+    rec.material = material or ""
+    rec.node = node or ""
+    rec.socket_type, rec.socket_index = parse_socket(socket) if socket else ("", 0)
+    node_tree = get_light_node_tree(rec)
+    rec.color_node = resolve_emission(node_tree)["color"] if node_tree else ""
+
+
+def set_light_list(scene, detected_lights):
+    """Replace the light registry with a list of [object name, material name, node name, socket] entries"""
+    registry = scene.gaf_props.LightRegistry
+    registry.clear()
+    ids = {}
+    for light in detected_lights:
+        write_light_record(registry.add(), light)
+        obj = bpy.data.objects.get(light[0])
+        if obj:
+            ids[get_object_identity(obj)] = light[0]
+    _light_ids[scene.as_pointer()] = ids
+    invalidate_light_index(scene)
+    invalidate_light_view(scene)
+
+
+def get_object_identity(obj):
+    """Return a key for this object that doesn't change when it's renamed"""
+    return getattr(obj, "session_uid", None) or obj.as_pointer()
+
+
+def rename_light_record(scene, obj):
+    """If this object's registry record still has its old name, rename the record and keep the registry sorted"""
+    ids = _light_ids.get(scene.as_pointer())
+    if ids is None:
+        return
+    old_name = ids.get(get_object_identity(obj))
+    if old_name is None or old_name == obj.name:
+        return
+    i = get_light_record_index(scene, old_name)
+    if i is None:
+        return
+    registry = get_lights(scene)
+    registry[i].name = obj.name
+    names = [rec.name for j, rec in enumerate(registry) if j != i]
+    registry.move(i, bisect.bisect(names, obj.name))
+    ids[get_object_identity(obj)] = obj.name
+    invalidate_light_index(scene)
+    invalidate_light_view(scene)
+    forget_light_fingerprint(scene)
+
+
+def migrate_legacy_light_list(scene):
+    """Convert the stringified light list saved by older versions of Gaffer into the light registry"""
+    gaf_props = scene.gaf_props
+    if not gaf_props.Lights:
+        return
 
     detected_lights = []
+    try:
+        legacy_lights = stringToNestedList(gaf_props.Lights, stripquotes=True)
+        for light in legacy_lights:
+            if not light or not light[0] or light[0] not in bpy.data.objects:
+                continue
+
+            def field(i):
+                return light[i] if len(light) > i and light[i] != "None" else ""
+
+            detected_lights.append([light[0], field(1), field(2), field(3)])
+    except (IndexError, ValueError):
+        print("Gaffer Warning: Unable to read the legacy light list, it will be rebuilt")
+    else:
+        set_light_list(scene, detected_lights)
+    gaf_props.Lights = ""
+
+
+def get_light_node_tree(record):
+    """Return the node tree that holds this light's strength node, or None if it doesn't use nodes"""
+    obj = bpy.data.objects.get(record.name)
+    if obj is None:
+        return None
+    if obj.type == "LIGHT":
+        data = obj.data
+    else:
+        data = bpy.data.materials.get(record.material)
+    if data and data.use_nodes and data.node_tree:
+        return data.node_tree
+    return None
+
+
+def get_light_nodes(record):
+    """Return the nodes of the tree that holds this light's strength node, or None if it doesn't use nodes"""
+    node_tree = get_light_node_tree(record)
+    return node_tree.nodes if node_tree else None
+
+
+def get_strength_socket(record):
+    """Return the socket that Gaffer uses as the strength of this light, or None if it can't be found"""
+    nodes = get_light_nodes(record)
+    if nodes is None or record.node not in nodes:
+        return None
+    node = nodes[record.node]
+    sockets = node.outputs if record.socket_type == "o" else node.inputs
+    if record.socket_index >= len(sockets):
+        return None
+    return sockets[record.socket_index]
+
+
+def get_value_strength_socket(record):
+    """Return the strength socket of this node based light if its value can be changed directly, or None"""
+    skt = get_strength_socket(record) if record.node else None
+    if skt is None or not isinstance(getattr(skt, "default_value", None), float):
+        return None
+    if skt.is_linked != (record.socket_type == "o"):  # Linked inputs and unlinked outputs are driven by other nodes
+        return None
+    return skt
+
+
+def get_light_strength(record):
+    """Return the energy of a light object, or the strength socket value of a mesh light. None if it can't be found"""
+    obj = bpy.data.objects.get(record.name)
+    if obj is None:
+        return None
+    if obj.type == "LIGHT":
+        return obj.data.energy
+    skt = get_value_strength_socket(record)
+    return skt.default_value if skt else None
 
+
+def invalidate_emission_cache(node_tree=None):
+    if node_tree is None:
+        _emission_cache.clear()
+        _tree_signatures.clear()
+    else:
+        _emission_cache.pop(node_tree.as_pointer(), None)
+        _tree_signatures.pop(node_tree.as_pointer(), None)
+
+
+def resolve_emission(node_tree):
+    """
+    Find what drives the strength, color and falloff of a light data or material node tree.
+    The result is cached per node tree until that tree shows up as updated in the depsgraph, so emissive
+    meshes that share one material are only resolved once. Returns a dict with:
+        strength: [node name, socket] of the first linked Emission node's strength, or None
+        color: Name of the right-most linked Emission node, which controls the color, or ""
+        falloff: Name of the Light Falloff node that controls the strength, or ""
+        has_emission: Whether there's any Emission node, linked or not
+    """
+    key = node_tree.as_pointer()
+    info = _emission_cache.get(key)
+    if info is not None:
+        return info
+
+    nodes = node_tree.nodes
+    info = {"strength": None, "color": "", "falloff": "", "has_emission": False}
+    emissions = []  # make a list of all linked Emission shaders, use the right-most one for color
+    for node in nodes:
+        if node.type == "EMISSION" and node.name != "Emission Viewer":
+            info["has_emission"] = True
+            if node.outputs[0].is_linked:
+                emissions.append(node)
+                if info["strength"] is None:
+                    node_name, socket_index = get_next_available_value_socket(node)
+                    info["strength"] = [node_name, "i" + str(socket_index)]
+                    if nodes[node_name].type == "LIGHT_FALLOFF":
+                        info["falloff"] = node_name
+    if emissions:
+        info["color"] = max(emissions, key=lambda x: x.location.x).name
+
+    _emission_cache[key] = info
+    return info
+
+
+def get_color_emission(node_tree):
+    """Return the right-most linked Emission node, which is used to control the light color"""
+    name = resolve_emission(node_tree)["color"]
+    return node_tree.nodes.get(name) if name else None
+
+
+def get_light_color(node_tree):
+    """
+    Return the color of a light that uses this node tree: an RGBA value, ["BLACKBODY", node] or
+    ["WAVELENGTH", node] for colors that need converting, or None if it can't be determined
+    """
+    node_color = get_color_emission(node_tree)
+    if node_color is None:
+        return None
+    if not node_color.inputs[0].is_linked:
+        return node_color.inputs[0].default_value
+    from_node = node_color.inputs[0].links[0].from_node
+    if from_node.type == "RGB":
+        return from_node.outputs[0].default_value
+    elif from_node.type in {"BLACKBODY", "WAVELENGTH"}:
+        return [from_node.type, from_node]
+    return None
+
+
+def get_next_available_value_socket(node):
+    current_node = node
+    found_node = node.name
+    found_socket = -1
+    i = 0
+    max_iterations = 1000  # Prevent infinite loop
+    while found_socket == -1:
+        i += 1
+        if i == max_iterations:
+            print("Gaffer Warning: Max iterations hit in get_next_available_value_socket for " + node.name)
+            break
+        if len(current_node.inputs) == 0:
+            # End of the line.
+            break
+
+        for si, s in enumerate(current_node.inputs):
+            if s.type == "VALUE":
+                if not s.is_linked:
+                    found_node = current_node.name
+                    found_socket = si
+                    break
+                else:
+                    current_node = s.links[0].from_node
+    return found_node, found_socket
+
+
+def register_falloff_property():
     if not hasattr(bpy.types.Object, "GafferFalloff"):
         bpy.types.Object.GafferFalloff = bpy.props.EnumProperty(
             name="Light Falloff",
@@ -226,154 +616,446 @@ def refresh_light_list(scene):
             update=_update_falloff,
         )
 
-    light_dict = dictOfLights()
 
-    objects = sorted(scene.objects, key=lambda x: x.name)
+def detect_light(scene, obj, previous_node=None):
+    """
+    Return the [object name, material name, node name, socket] entry for this object, or None if it is not a light.
+    previous_node is the strength node chosen for this object before, "" if it had none, or None if it's new
+    """
 
-    if scene.render.engine in ["CYCLES", "BLENDER_EEVEE", "BLENDER_EEVEE_NEXT"]:
-        for obj in objects:
-            light_mats = []
-            if obj.type == "LIGHT":
-                if obj.data.use_nodes:
-                    invalid_node = False
-                    if obj.name in light_dict:
-                        if light_dict[obj.name] == "None":  # Previously did not use nodes (like default light)
-                            invalid_node = True
-                        elif light_dict[obj.name] not in obj.data.node_tree.nodes:
-                            invalid_node = True
-                    if obj.name not in light_dict or invalid_node:
-                        emission_found = False
-                        for node in obj.data.node_tree.nodes:
-                            if node.name != "Emission Viewer":
-                                if node.type == "EMISSION":
-                                    if node.outputs[0].is_linked:
-                                        (
-                                            node_name,
-                                            socket_index,
-                                        ) = get_next_available_value_socket(node)
-                                        detected_lights.append(
-                                            [
-                                                obj.name,
-                                                None,
-                                                node_name,
-                                                "i" + str(socket_index),
-                                            ]
-                                        )
-                                        emission_found = True
-                                        break
-                        if not emission_found:
-                            # Default to same behaviour as non-node lights
-                            detected_lights.append([obj.name, None, None])
-                    else:
-                        node = obj.data.node_tree.nodes[light_dict[obj.name]]
-                        if node.inputs:
-                            node_name, socket_index = get_next_available_value_socket(node)
-                            detected_lights.append([obj.name, None, node_name, "i" + str(socket_index)])
-                        elif node.outputs:
-                            socket_index = 0
-                            for oupt in node.outputs:
-                                if oupt.type == "VALUE":  # use first Value socket as strength
-                                    detected_lights.append(
-                                        [
-                                            obj.name,
-                                            None,
-                                            node.name,
-                                            "o" + str(socket_index),
-                                        ]
-                                    )
-                                    break
-                                socket_index += 1
+    def strength_from_node(node):
+        if node.inputs:
+            node_name, socket_index = get_next_available_value_socket(node)
+            return [node_name, "i" + str(socket_index)]
+        for socket_index, oupt in enumerate(node.outputs):
+            if oupt.type == "VALUE":  # use first Value socket as strength
+                return [node.name, "o" + str(socket_index)]
+        return None
+
+    if scene.render.engine not in ["CYCLES", "BLENDER_EEVEE", "BLENDER_EEVEE_NEXT"]:  # Unsupported engines
+        return [obj.name, None, None, None] if obj.type == "LIGHT" else None
+
+    light = None
+    nodes = None
+    if obj.type == "LIGHT":
+        if obj.data.use_nodes:
+            nodes = obj.data.node_tree.nodes
+            # previous_node is "" if the light previously did not use nodes (like default light)
+            if not previous_node or previous_node not in nodes:
+                strength = resolve_emission(obj.data.node_tree)["strength"]
+                # Default to same behaviour as non-node lights
+                light = [obj.name, None] + list(strength or [None, None])
+            else:
+                strength = strength_from_node(nodes[previous_node])
+                if strength:
+                    light = [obj.name, None] + strength
+        else:
+            light = [obj.name, None, None, None]
+    elif obj.type == "MESH" and scene.render.engine == "CYCLES":
+        for slot in obj.material_slots:
+            if slot.material and slot.material.use_nodes:
+                nodes = slot.material.node_tree.nodes
+                if not previous_node or previous_node not in nodes:
+                    strength = resolve_emission(slot.material.node_tree)["strength"]
                 else:
-                    detected_lights.append([obj.name, None, None])
-            elif obj.type == "MESH" and len(obj.material_slots) > 0 and scene.render.engine == "CYCLES":
-                slot_break = False
-                for slot in obj.material_slots:
-                    if slot_break:
-                        break  # only use first emission material in slots
-                    if slot.material:
-                        if slot.material not in light_mats:
-                            if slot.material.use_nodes:
-                                invalid_node = False
-                                if obj.name in light_dict:
-                                    if light_dict[obj.name] == "None":  # Previously did not use nodes
-                                        invalid_node = True
-                                    elif light_dict[obj.name] not in slot.material.node_tree.nodes:
-                                        invalid_node = True
-                                if obj.name not in light_dict or invalid_node:
-                                    for node in slot.material.node_tree.nodes:
-                                        if node.name != "Emission Viewer":
-                                            if node.type == "EMISSION":
-                                                if node.outputs[0].is_linked:
-                                                    (
-                                                        node_name,
-                                                        socket_index,
-                                                    ) = get_next_available_value_socket(node)
-                                                    detected_lights.append(
-                                                        [
-                                                            obj.name,
-                                                            slot.material.name,
-                                                            node_name,
-                                                            "i" + str(socket_index),
-                                                        ]
-                                                    )
-                                                    light_mats.append(slot.material)  # Skip this material next time
-                                                    slot_break = True
-                                                    break
-                                else:
-                                    node = slot.material.node_tree.nodes[light_dict[obj.name]]
-                                    if node.inputs:
-                                        (
-                                            node_name,
-                                            socket_index,
-                                        ) = get_next_available_value_socket(node)
-                                        detected_lights.append(
-                                            [
-                                                obj.name,
-                                                slot.material.name,
-                                                node_name,
-                                                "i" + str(socket_index),
-                                            ]
-                                        )
-                                    elif node.outputs:
-                                        socket_index = 0
-                                        for oupt in node.outputs:
-                                            if oupt.type == "VALUE":  # use first Value socket as strength
-                                                detected_lights.append(
-                                                    [
-                                                        obj.name,
-                                                        slot.material.name,
-                                                        node.name,
-                                                        "o" + str(socket_index),
-                                                    ]
-                                                )
-                                                break
-                                            socket_index += 1
-    else:  # Unsupported engines
-        for obj in objects:
-            if obj.type == "LIGHT":
-                detected_lights.append([obj.name, None, None])
+                    strength = strength_from_node(nodes[previous_node])
+                if strength:
+                    light = [obj.name, slot.material.name] + list(strength)
+                    break  # only use first emission material in slots
+
+    if light and light[2]:
+        if nodes[light[2]].type != "LIGHT_FALLOFF" and obj.GafferFalloff != "quadratic":
+            obj.GafferFalloff = "quadratic"
+
+    return light
+
+
+def get_node_tree_signature(node_tree):
+    """Return a checksum of the nodes and links of this node tree, cached until it shows up as updated"""
+    key = node_tree.as_pointer()
+    signature = _tree_signatures.get(key)
+    if signature is None:
+        nodes = [(n.name, n.bl_idname, n.mute) for n in node_tree.nodes]
+        links = [
+            (link.from_node.name, link.from_socket.identifier, link.to_node.name, link.to_socket.identifier)
+            for link in node_tree.links
+        ]
+        signature = zlib.crc32(repr((nodes, links)).encode())
+        _tree_signatures[key] = signature
+    return signature
 
-    for light in detected_lights:
-        obj = bpy.data.objects[light[0]]
-        nodes = None
+
+def get_light_fingerprint(scene):
+    """
+    Return a hash of everything light detection depends on: the render engine, the light and mesh objects,
+    their light data and material assignments, and the nodes and links of their node trees.
+    It's saved with the light registry, so an unchanged scene is never scanned again, even after reopening the file
+    """
+    engine = scene.render.engine
+    digest = hashlib.sha1(engine.encode())
+    for obj in sorted(scene.objects, key=lambda x: x.name):
         if obj.type == "LIGHT":
-            if obj.data.use_nodes:
-                nodes = obj.data.node_tree.nodes
+            state = [obj.name, obj.data.name, obj.data.use_nodes]
+            if obj.data.use_nodes and obj.data.node_tree:
+                state.append(get_node_tree_signature(obj.data.node_tree))
+        elif obj.type == "MESH" and engine == "CYCLES":
+            state = [obj.name]
+            for slot in obj.material_slots:
+                mat = slot.material
+                if mat is None:
+                    state.append(None)
+                    continue
+                state += [mat.name, mat.use_nodes]
+                if mat.use_nodes and mat.node_tree:
+                    state.append(get_node_tree_signature(mat.node_tree))
         else:
-            if bpy.data.materials[light[1]].use_nodes:
-                nodes = bpy.data.materials[light[1]].node_tree.nodes
-        if nodes:
-            if light[2]:
-                if nodes[light[2]].type != "LIGHT_FALLOFF" and bpy.data.objects[light[0]].GafferFalloff != "quadratic":
-                    bpy.data.objects[light[0]].GafferFalloff = "quadratic"
-    scene.gaf_props.Lights = str(detected_lights)
+            continue
+        digest.update(repr(state).encode())
+    return digest.hexdigest()
+
+
+def forget_light_fingerprint(scene):
+    """
+    The registry was changed without a full refresh, so the saved fingerprint no longer describes it. Clearing it
+    makes sure the next refresh scans the scene instead of keeping the patched registry
+    """
+    if scene.gaf_props.LightFingerprint:
+        scene.gaf_props.LightFingerprint = ""
+
+
+@time_execution
+def refresh_light_list(scene):
+    _refresh_queue.pop(scene.name, None)
+
+    register_falloff_property()
+    migrate_legacy_light_list(scene)
+
+    # Nothing light detection depends on has changed since the last refresh, the registry is still correct
+    key = scene.as_pointer()
+    fingerprint = get_light_fingerprint(scene)
+    if fingerprint == scene.gaf_props.LightFingerprint:
+        if key not in _light_ids:  # e.g. after reopening the file
+            objects = [bpy.data.objects.get(rec.name) for rec in get_lights(scene)]
+            _light_ids[key] = {get_object_identity(obj): obj.name for obj in objects if obj}
+    else:
+        light_dict = {rec.name: rec.node for rec in get_lights(scene)}  # Previously chosen strength nodes
+
+        detected_lights = []  # [object name, material name, node name, socket]
+        for obj in sorted(scene.objects, key=lambda x: x.name):
+            light = detect_light(scene, obj, light_dict.get(obj.name))
+            if light:
+                detected_lights.append(light)
+
+        set_light_list(scene, detected_lights)
+        scene.gaf_props.LightFingerprint = fingerprint
+    _trusted_scenes.add(key)
+    _object_counts[key] = len(scene.objects)
 
     if scene.gaf_props.SoloActive == "":
-        getHiddenStatus(scene, stringToNestedList(scene.gaf_props.Lights, True))
+        getHiddenStatus(scene, get_lights(scene))
     if bpy.context.area:
         refresh_bgl()  # update the radius/label as well
 
 
+def patch_light_list(scene, obj):
+    """Detect a single object again and update, add or remove its record in the light registry"""
+    registry = get_lights(scene)
+    i = get_light_record_index(scene, obj.name)
+    light = detect_light(scene, obj, registry[i].node if i is not None else None)
+
+    ids = _light_ids.get(scene.as_pointer())
+    if light is None:
+        if i is not None:
+            registry.remove(i)
+            invalidate_light_index(scene)
+            invalidate_light_view(scene)
+            forget_light_fingerprint(scene)
+            if ids is not None:
+                ids.pop(get_object_identity(obj), None)
+        return
+    if i is None:
+        # Keep the registry sorted by name, like a full refresh would
+        i = bisect.bisect([rec.name for rec in registry], obj.name)
+        registry.add()
+        registry.move(len(registry) - 1, i)
+        invalidate_light_index(scene)
+        invalidate_light_view(scene)
+        forget_light_fingerprint(scene)
+        if ids is not None:
+            ids[get_object_identity(obj)] = obj.name
+    rec = registry[i]
+    previous = (rec.material, rec.node, rec.socket_type, rec.socket_index, rec.color_node)
+    write_light_record(rec, light)
+    if (rec.material, rec.node, rec.socket_type, rec.socket_index, rec.color_node) != previous:
+        invalidate_light_view(scene)
+        forget_light_fingerprint(scene)
+
+
+def update_light_list(scene, depsgraph):
+    """
+    Patch the light registry using only the IDs listed in the depsgraph updates.
+    Returns False when the incremental state can't be trusted and a full refresh is needed instead
+    """
+    key = scene.as_pointer()
+    ids = _light_ids.get(key)
+    if key not in _trusted_scenes or ids is None:
+        return False
+    # Deleted objects aren't included in the depsgraph updates, but unlinking them changes a collection or the scene
+    num_objects = len(scene.objects)
+    check_deleted = (
+        num_objects != _object_counts.get(key)
+        or depsgraph.id_type_updated("COLLECTION")
+        or depsgraph.id_type_updated("SCENE")
+    )
+    _object_counts[key] = num_objects
+
+    objects = {}
+    datablocks = set()
+    for update in depsgraph.updates:
+        id_data = update.id.original
+        if isinstance(id_data, bpy.types.Object):
+            if id_data.type not in {"LIGHT", "MESH"}:
+                continue
+            if update.is_updated_transform and not (update.is_updated_geometry or update.is_updated_shading):
+                continue  # Moving a light doesn't change how it's detected
+            objects[id_data.name] = id_data
+        elif isinstance(id_data, (bpy.types.Light, bpy.types.Material)):
+            datablocks.add(id_data)
+
+    if datablocks:
+        # Node changes are reported on the light data or material, re-detect the lights that use them
+        for data in datablocks:
+            for obj in get_data_users(data):
+                if scene.objects.get(obj.name):
+                    objects[obj.name] = obj
+
+    if objects:
+        register_falloff_property()
+        for obj in objects.values():
+            rename_light_record(scene, obj)
+            patch_light_list(scene, obj)
+    if check_deleted:
+        remove_deleted_light_records(scene, ids)
+    return True
+
+
+def remove_deleted_light_records(scene, ids):
+    """
+    Remove the registry records of lights that are no longer in the scene, by checking each light object known in
+    ids (see _light_ids) instead of the object count, which stays the same when objects are deleted and added at once
+    """
+    registry = get_lights(scene)
+    removed = False
+    for identity, name in list(ids.items()):
+        obj = scene.objects.get(name)
+        if obj is not None and get_object_identity(obj) == identity:
+            continue
+        del ids[identity]
+        i = get_light_record_index(scene, name)
+        if obj is not None and i is not None:
+            ids[get_object_identity(obj)] = name  # A new object took the name, its record was patched already
+            continue
+        if i is not None:
+            registry.remove(i)
+            invalidate_light_index(scene)
+            removed = True
+    if removed:
+        invalidate_light_view(scene)
+        forget_light_fingerprint(scene)
+
+
+def invalidate_data_users():
+    global _data_users_count
+    _data_users_count = None
+
+
+def _object_uses_data(obj, data):
+    if obj.data == data:
+        return True
+    return any(slot.material == data for slot in obj.material_slots)
+
+
+def _index_data_users(obj):
+    for key in _object_data.pop(obj.name, ()):
+        names = _data_users.get(key)
+        if names:
+            names.discard(obj.name)
+    keys = set()
+    if obj.type == "LIGHT" and obj.data:
+        keys.add(obj.data.as_pointer())
+    for slot in obj.material_slots:
+        if slot.material:
+            keys.add(slot.material.as_pointer())
+    for key in keys:
+        _data_users.setdefault(key, set()).add(obj.name)
+    if keys:
+        _object_data[obj.name] = keys
+
+
+def build_data_users():
+    """Index which objects use each light data and material, in a single pass over all objects"""
+    global _data_users_count
+    _data_users.clear()
+    _object_data.clear()
+    for obj in bpy.data.objects:
+        _index_data_users(obj)
+    _data_users_count = len(bpy.data.objects)
+
+
+def update_data_users(depsgraph):
+    """Re-index only the objects listed in the depsgraph updates"""
+    global _data_users_count
+    if _data_users_count is None:
+        return
+    num_objects = len(bpy.data.objects)
+    if num_objects < _data_users_count:
+        invalidate_data_users()  # Objects were deleted, which isn't included in the depsgraph updates
+        return
+    _data_users_count = num_objects
+    for update in depsgraph.updates:
+        id_data = update.id.original
+        if isinstance(id_data, bpy.types.Object):
+            if update.is_updated_transform and not (update.is_updated_geometry or update.is_updated_shading):
+                continue
+            _index_data_users(id_data)
+
+
+def get_data_users(data):
+    """Return the objects that use this light data or material, sorted by name"""
+    if _data_users_count is None:
+        build_data_users()
+    names = _data_users.get(data.as_pointer(), ())
+    objects = [bpy.data.objects.get(name) for name in names]
+    if not all(obj and _object_uses_data(obj, data) for obj in objects):
+        # Renamed or reassigned since it was indexed, rebuild once
+        build_data_users()
+        objects = [bpy.data.objects[name] for name in _data_users.get(data.as_pointer(), ())]
+    return sorted(objects, key=lambda obj: obj.name)
+
+
+def get_dataname_users(dataname):
+    """Return the objects that share data with a light, from the 'LIGHT<name>' or 'MAT<name>' dataname used in the UI"""
+    if dataname.startswith("LIGHT"):
+        data = bpy.data.lights[dataname[5:]]  # actual data name (minus the prepended 'LIGHT')
+    else:
+        data = bpy.data.materials[dataname[3:]]  # actual data name (minus the prepended 'MAT')
+    return get_data_users(data)
+
+
+def invalidate_light_view(scene=None):
+    if scene is None:
+        _light_views.clear()
+    else:
+        scene_key = scene.as_pointer()
+        for key in [key for key in _light_views if key[0] == scene_key]:
+            del _light_views[key]
+
+
+def get_light_view_state(obj):
+    """Return what a light view depends on of this light object besides its registry record"""
+    return obj.name, obj.hide_viewport, obj.data.as_pointer() if obj.data else 0
+
+
+def light_view_changed(scene, obj):
+    """Whether a cached light view of the scene shows this object with a different name, visibility or data"""
+    ptr = obj.as_pointer()
+    scene_key = scene.as_pointer()
+    for key, (filters, view) in _light_views.items():
+        state = view["states"].get(ptr) if key[0] == scene_key else None
+        if state is not None and state != get_light_view_state(obj):
+            return True
+    return False
+
+
+def get_light_view(scene, view_layer=None):
+    """
+    Return the lights to show in the panel: filtered, sorted and with lights that share data merged into one entry.
+    Cached per scene and view layer until the light list, the panel filters or object/collection visibility change,
+    so that drawing only costs as much as the rows on the current page, and switching back to a scene or view layer
+    reuses its view. Returns a dict with:
+        lights: Names of the light objects to show
+        users: Light data or material pointer -> number of shown lights that use it
+        out_of_date: Whether the light list refers to objects, materials or nodes that no longer exist
+        states: Object pointer -> get_light_view_state of each light, see light_view_changed
+    """
+    gaf_props = scene.gaf_props
+    view_layer = view_layer or get_view_layer(scene)
+    view_key = (scene.as_pointer(), view_layer.as_pointer())
+    key = (
+        gaf_props.VisibleLightsOnly,
+        gaf_props.VisibleCollectionsOnly,
+        gaf_props.LightFilterName.lower(),
+        gaf_props.LightFilterType,
+        gaf_props.LightSortOrder,
+    )
+    cached = _light_views.get(view_key)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    view = {"lights": [], "users": {}, "out_of_date": False, "states": {}}
+    filter_name = key[2]
+    vis_filter = get_visibility_filter(scene, view_layer)
+    grouped = get_grouped_data(scene)  # Lights in a light group are shown as one row for the whole group
+    shown = []
+    for light in get_lights(scene):
+        obj = bpy.data.objects.get(light.name)
+        material = None
+        if obj is None:
+            view["out_of_date"] = True
+            continue
+        view["states"][obj.as_pointer()] = get_light_view_state(obj)
+        if obj.type != "LIGHT" and light.material:
+            material = bpy.data.materials.get(light.material)
+            if material is None or (material.use_nodes and light.node not in material.node_tree.nodes):
+                view["out_of_date"] = True
+                continue
+        if gaf_props.VisibleLightsOnly and obj.hide_viewport:
+            continue
+        if gaf_props.VisibleCollectionsOnly and not isInVisibleCollection(obj, vis_filter["collections"]):
+            continue
+        if obj.name in vis_filter["blacklist"]:
+            continue
+        if filter_name and filter_name not in obj.name.lower():
+            continue
+        light_type = obj.data.type if obj.type == "LIGHT" else "MESH"
+        if gaf_props.LightFilterType != "ALL" and light_type != gaf_props.LightFilterType:
+            continue
+
+        # Don't show lights that share the same data
+        data = obj.data if obj.type == "LIGHT" else material
+        data_key = data.as_pointer() if data else obj.as_pointer()
+        if data_key in grouped:
+            continue
+        if data_key in view["users"]:
+            view["users"][data_key] += 1
+        else:
+            view["users"][data_key] = 1
+            shown.append((light_type, obj.name))
+
+    if gaf_props.LightSortOrder == "TYPE":
+        shown.sort()
+    elif gaf_props.LightSortOrder == "NAME_REVERSE":
+        shown.reverse()  # The light list is already sorted by name
+    view["lights"] = [name for light_type, name in shown]
+
+    _light_views[view_key] = (key, view)
+    return view
+
+
+def _update_light_filter(self, context):
+    self.LightPage = 0
+
+
+@contextmanager
+def scene_context(scene):
+    """Make this the context scene, the HDRI handler's update functions all work on the context scene"""
+    if bpy.context.scene == scene:
+        yield
+    else:
+        with bpy.context.temp_override(scene=scene):
+            yield
+
+
 def force_update(context, obj=None):
     if not obj:
         context.space_data.node_tree.update_tag()
@@ -381,6 +1063,23 @@ def force_update(context, obj=None):
         obj.data.node_tree.update_tag()
 
 
+def finish_edit(context):
+    """Return the result of an operator that edited lights, counting the edit if a batch edit is running"""
+    gaf_props = context.scene.gaf_props
+    if gaf_props.BatchEditActive:
+        gaf_props.BatchEditCount += 1
+    return {"FINISHED"}
+
+
+def end_batch_edit(scene):
+    """Leave batch edit mode, see GAFFER_OT_batch_edit_begin"""
+    gaf_props = scene.gaf_props
+    gaf_props.BatchEditActive = False
+    gaf_props.BatchEditSnapshot = ""
+    gaf_props.BatchEditSolo = ""
+    gaf_props.BatchEditCount = 0
+
+
 def stringToList(str="", stripquotes=False):
     raw = str.split(", ")
     raw[0] = (raw[0])[1:]
@@ -417,6 +1116,593 @@ def castBool(str):
         return False
 
 
+# Exposure functions
+
+
+def get_exposure_targets(scene):
+    """
+    Return what apply_exposure adjusts for this scene: the pointers of its light data, its emission sockets (pointer
+    -> socket), the members of its light groups (light data or material pointer -> member), whose base strength is
+    adjusted instead, and a list of (light name, problem) for the lights it can't adjust
+    """
+    ensure_light_list(scene)
+    light_data = set()
+    sockets = {}
+    members = {}
+    problems = []
+    group_members = get_group_members(scene)
+    for item in get_lights(scene):
+        obj = bpy.data.objects.get(item.name)
+        if obj is None:
+            continue
+        member = get_record_member(group_members, item)
+        if member is not None:
+            data = obj.data if obj.type == "LIGHT" else bpy.data.materials[item.material]
+            members[data.as_pointer()] = member
+        elif obj.type == "LIGHT":
+            light_data.add(obj.data.as_pointer())
+            continue
+        material = bpy.data.materials.get(item.material)
+        if material is None or not material.use_nodes:
+            problems.append((item.name, "NO_NODES"))
+            continue
+        skt = get_value_strength_socket(item)
+        if skt is not None:
+            sockets[skt.as_pointer()] = skt
+        else:
+            problems.append((item.name, "INVALID_NODE"))
+    return light_data, sockets, members, problems
+
+
+def apply_exposure(scenes):
+    """
+    Bake the exposure of each scene into the strength of its lights and world, and set the exposure back to 0.
+    Light data, emission sockets and worlds shared between lights or scenes are only adjusted once, and plain light
+    energies are written in one foreach_set. A scene that shares lights or its world with another of the scenes that
+    has a different exposure is skipped, as adjusting them would change the other scene too.
+    Returns a list of (light or scene name, problem) for the lights and scenes that were skipped
+    """
+    problems = []
+    targets = {}  # Scene -> (exposure in EVs, light data pointers, sockets, group members, world pointer)
+    exposures = {}  # Light data, socket, material or world pointer -> set of the exposures of the scenes that use it
+    if not any(scene.view_settings.exposure for scene in scenes):
+        return problems
+    for scene in scenes:
+        evs = scene.view_settings.exposure  # CM exposure is set in EVs/stops
+        light_data, sockets, members, scene_problems = get_exposure_targets(scene)
+        world = scene.world.as_pointer() if scene.world else None
+        targets[scene] = (evs, light_data, sockets, members, world)
+        for ptr in list(light_data) + list(sockets) + list(members) + [world]:
+            exposures.setdefault(ptr, set()).add(evs)
+        if evs != 0:
+            problems += scene_problems
+
+    light_exposures = {}  # Light data pointer -> exposure
+    socket_exposures = {}  # Socket pointer -> (socket, exposure)
+    member_exposures = {}  # Light data or material pointer -> (light group member, exposure)
+    worlds = set()
+    for scene, (evs, light_data, sockets, members, world) in targets.items():
+        if evs == 0:
+            continue
+        ptrs = list(light_data) + list(sockets) + list(members) + [world]
+        if any(len(exposures[ptr]) > 1 for ptr in ptrs if ptr is not None):
+            problems.append((scene.name, "SHARED_DATA"))
+            continue
+        exposure = pow(2, evs)  # Linear exposure adjustment
+        scene.view_settings.exposure = 0
+        for ptr in light_data:
+            light_exposures[ptr] = exposure
+        for ptr, skt in sockets.items():
+            socket_exposures[ptr] = (skt, exposure)
+        for ptr, member in members.items():
+            member_exposures[ptr] = (member, exposure)
+        if world is not None and world not in worlds:
+            worlds.add(world)
+            with scene_context(scene):  # The HDRI handler's update functions work on the context scene
+                apply_exposure_to_world(scene, evs, exposure)
+
+    scale_light_energies({ptr: (exposure, 0) for ptr, exposure in light_exposures.items()})
+    for skt, exposure in socket_exposures.values():
+        skt.default_value *= exposure
+    for member, exposure in member_exposures.values():
+        member.base_strength *= exposure
+
+    return problems
+
+
+def scale_light_energies(scales):
+    """
+    Multiply and offset the energy of light data in one foreach_get/foreach_set round trip.
+    scales maps light data pointers to (factor, offset), energies don't go below 0
+    """
+    if not scales:
+        return
+    lights = bpy.data.lights
+    energies = [0.0] * len(lights)
+    lights.foreach_get("energy", energies)
+    changed = []
+    for i, light in enumerate(lights):
+        scale = scales.get(light.as_pointer())
+        if scale is not None:
+            energies[i] = max(0, energies[i] * scale[0] + scale[1])
+            changed.append(light)
+    lights.foreach_set("energy", energies)
+    for light in changed:
+        light.update_tag()  # foreach_set doesn't tag the lights for the depsgraph
+
+
+def apply_exposure_to_world(scene, evs, exposure):
+    gaf_hdri_props = scene.world.gaf_hdri_props
+    if gaf_hdri_props.hdri_handler_enabled:
+        gaf_hdri_props.hdri_brightness = gaf_hdri_props.hdri_brightness + evs
+        if gaf_hdri_props.hdri_use_separate_brightness:
+            gaf_hdri_props.hdri_background_brightness = gaf_hdri_props.hdri_background_brightness + evs
+    else:
+        world = scene.world
+        if world.use_nodes:
+            backgrounds = []  # make a list of all linked Background shaders, use the right-most one
+            background = None
+            for node in world.node_tree.nodes:
+                if node.type == "BACKGROUND":
+                    if not node.name.startswith("HDRIHandler_"):
+                        if node.outputs[0].is_linked:
+                            backgrounds.append(node)
+            if backgrounds:
+                background = sorted(backgrounds, key=lambda x: x.location.x, reverse=True)[0]
+                # Strength
+                if background.inputs[1].is_linked:
+                    strength_node = None
+                    current_node = background.inputs[1].links[0].from_node
+                    temp_current_node = None
+                    # Failsafe in case of infinite loop (which can happen from accidental cyclic links)
+                    i = 0
+                    while strength_node is None and i < 1000:  # limitted to 100 chained nodes
+                        i += 1
+                        if temp_current_node:
+                            current_node = temp_current_node
+                        for socket in current_node.inputs:
+                            # stop at first node with an unconnected Value socket
+                            if socket.type == "VALUE" and not socket.is_linked:
+                                strength_node = current_node
+                            else:
+                                if socket.is_linked:
+                                    temp_current_node = socket.links[0].from_node
+
+                    if strength_node:
+                        for socket in strength_node.inputs:
+                            if socket.type == "VALUE" and not socket.is_linked:  # use first color socket
+                                socket.default_value = socket.default_value * exposure
+                                break
+                else:
+                    background.inputs[1].default_value = background.inputs[1].default_value * exposure
+
+
+# Bulk edit functions
+
+
+def get_bulk_targets(context, scope):
+    """
+    Return the registry records of the lights a bulk edit acts on: the selected lights, or every light in the
+    Gaffer list with its current filters, including the lights that share their data with a listed one
+    """
+    scene = context.scene
+    ensure_light_list(scene)
+    if scope == "SELECTED":
+        names = {obj.name for obj in context.selected_objects}
+        return [rec for rec in get_lights(scene) if rec.name in names]
+    view_data = get_light_view(scene, context.view_layer)["users"]
+    records = []
+    for rec in get_lights(scene):
+        obj = bpy.data.objects.get(rec.name)
+        if obj is None:
+            continue
+        data = obj.data if obj.type == "LIGHT" else bpy.data.materials.get(rec.material) if rec.material else None
+        if (data.as_pointer() if data else obj.as_pointer()) in view_data:
+            records.append(rec)
+    return records
+
+
+def bulk_set_strength(records, factor=1.0, offset=0.0):
+    """
+    Multiply and offset the strength of these lights. Light energies are written in one foreach_set, emission
+    sockets once each even when materials are shared. Lights in a light group get their base strength in the group
+    changed instead, as the group's drivers set the actual value. Returns the names of the lights that were skipped
+    """
+    skipped = []
+    scales = {}
+    sockets = {}
+    members = get_group_members(records[0].id_data) if records else {}
+    grouped = {}
+    for rec in records:
+        obj = bpy.data.objects.get(rec.name)
+        if obj is None:
+            continue
+        member = get_record_member(members, rec)
+        if member is not None:
+            grouped[member.as_pointer()] = member
+            continue
+        if obj.type == "LIGHT":
+            scales[obj.data.as_pointer()] = (factor, offset)
+            continue
+        skt = get_value_strength_socket(rec)
+        if skt is None:
+            skipped.append(rec.name)
+        else:
+            sockets[skt.as_pointer()] = skt
+    scale_light_energies(scales)
+    for skt in sockets.values():
+        skt.default_value = max(0, skt.default_value * factor + offset)
+    for member in grouped.values():
+        member.base_strength = max(0, member.base_strength * factor + offset)
+    return skipped
+
+
+def bulk_set_color(records, rgb, temperature=None):
+    """
+    Set the color of these lights, plain light colors in one foreach_set. Lights whose color comes from a
+    Blackbody node can only be given a temperature, which is set on the node when one is passed. Lights in a light
+    group get their base color in the group set instead. Returns the names of the lights whose color couldn't be set
+    """
+    skipped = []
+    light_data = set()
+    members = get_group_members(records[0].id_data) if records else {}
+    for rec in records:
+        obj = bpy.data.objects.get(rec.name)
+        if obj is None:
+            continue
+        node_tree = get_light_node_tree(rec)
+        color = get_light_color(node_tree) if node_tree else None
+        member = get_record_member(members, rec)
+        if isinstance(color, list) and color[0] == "BLACKBODY" and temperature is not None:
+            color[1].inputs[0].default_value = temperature
+        elif member is not None and (obj.type == "LIGHT" or get_emission_color_socket(rec) is not None):
+            member.base_color = rgb
+        elif obj.type == "LIGHT":
+            light_data.add(obj.data.as_pointer())
+        elif color is not None and not isinstance(color, list):
+            color[:3] = rgb
+        else:
+            skipped.append(rec.name)
+
+    if light_data:
+        lights = bpy.data.lights
+        colors = [0.0] * len(lights) * 3
+        lights.foreach_get("color", colors)
+        changed = []
+        for i, light in enumerate(lights):
+            if light.as_pointer() in light_data:
+                colors[i * 3 : i * 3 + 3] = rgb
+                changed.append(light)
+        lights.foreach_set("color", colors)
+        for light in changed:
+            light.update_tag()  # foreach_set doesn't tag the lights for the depsgraph
+    return skipped
+
+
+def bulk_set_temperature(records, temperature):
+    """Set the color temperature of these lights, see bulk_set_color"""
+    return bulk_set_color(records, convert_temp_to_RGB(temperature), temperature)
+
+
+def bulk_scale_radius(records, factor):
+    """Scale the size of these lights (radius, area size or sun angle), each light data once. Mesh lights are skipped"""
+    done = set()
+    for rec in records:
+        obj = bpy.data.objects.get(rec.name)
+        if obj is None or obj.type != "LIGHT" or obj.data.as_pointer() in done:
+            continue
+        light = obj.data
+        done.add(light.as_pointer())
+        prop = const.light_size_props.get(light.type)
+        if prop:
+            setattr(light, prop, getattr(light, prop) * factor)
+        if light.type == "AREA":
+            light.size_y *= factor
+
+
+def bulk_set_falloff(records, falloff):
+    """Set the Gaffer falloff of these lights, only lights that use nodes have one. Returns the names of the others"""
+    register_falloff_property()
+    skipped = []
+    for rec in records:
+        obj = bpy.data.objects.get(rec.name)
+        if obj is None:
+            continue
+        if not rec.node:
+            skipped.append(rec.name)
+        elif obj.GafferFalloff != falloff:
+            obj.GafferFalloff = falloff  # Inserts or relinks the Light Falloff node, see do_update_falloff
+    return skipped
+
+
+# Light group functions
+
+
+def get_light_group_path(group):
+    """Return the data path of this light group from the scene, which its drivers read the master values from"""
+    return 'gaf_props.LightGroups["{}"]'.format(bpy.utils.escape_identifier(group.name))
+
+
+def get_member_data(member):
+    """Return the light data or material of this light group member, or None if it doesn't exist anymore"""
+    return (bpy.data.lights if member.data_type == "LIGHT" else bpy.data.materials).get(member.data_name)
+
+
+def get_grouped_data(scene):
+    """Return {light data or material pointer: light group name} for the members of the scene's light groups"""
+    grouped = {}
+    for group in scene.gaf_props.LightGroups:
+        for member in group.members:
+            data = get_member_data(member)
+            if data is not None:
+                grouped[data.as_pointer()] = group.name
+    return grouped
+
+
+def get_group_members(scene):
+    """Return {light data or material pointer: light group member} for the members of the scene's light groups"""
+    members = {}
+    for group in scene.gaf_props.LightGroups:
+        for member in group.members:
+            data = get_member_data(member)
+            if data is not None:
+                members[data.as_pointer()] = member
+    return members
+
+
+def get_record_member(members, record):
+    """Return the member of get_group_members whose drivers control this light's strength and color, or None"""
+    obj = bpy.data.objects.get(record.name)
+    if obj is None:
+        return None
+    data = obj.data if obj.type == "LIGHT" else bpy.data.materials.get(record.material) if record.material else None
+    return members.get(data.as_pointer()) if data else None
+
+
+def set_member_values(scene, member, strength=None, color=None):
+    """
+    Set the base values of a light group member so that its driven strength and color become these values.
+    Returns False if a value couldn't be reached because the group's master value is 0
+    """
+    group = scene.path_resolve(member.path_from_id().rpartition(".")[0])
+    reached = True
+    if strength is not None:
+        if group.strength:
+            member.base_strength = strength / group.strength
+        else:
+            reached = strength == 0
+    if color is not None:
+        for i in range(3):
+            if group.color[i]:
+                member.base_color[i] = color[i] / group.color[i]
+            else:
+                reached = reached and color[i] == 0
+    return reached
+
+
+def get_group_targets(record):
+    """
+    Return the data type, the light data or material, and the (ID, data path, array index, group property) of
+    each value a light group drives for this light. Returns None if the light's strength can't be driven
+    """
+    obj = bpy.data.objects.get(record.name)
+    if obj is None:
+        return None
+    if obj.type == "LIGHT":
+        light = obj.data
+        return "LIGHT", light, [(light, "energy", -1, "strength")] + [(light, "color", i, "color") for i in range(3)]
+
+    material = bpy.data.materials.get(record.material)
+    skt = get_value_strength_socket(record)
+    if material is None or skt is None:
+        return None
+    tree = material.node_tree
+    targets = [(tree, skt.path_from_id("default_value"), -1, "strength")]
+    color_socket = get_emission_color_socket(record)
+    if color_socket is not None:
+        targets += [(tree, color_socket.path_from_id("default_value"), i, "color") for i in range(3)]
+    return "MATERIAL", material, targets
+
+
+def add_to_light_group(scene, group, records):
+    """
+    Drive the strength and color of these lights with drivers that multiply their current values by the master
+    strength and color of the light group. Light data and materials shared by several lights are added once.
+    Returns the names of the lights that couldn't be added
+    """
+    path = get_light_group_path(group)
+    grouped = get_grouped_data(scene)
+    skipped = []
+    for rec in records:
+        info = get_group_targets(rec)
+        if info is None:
+            skipped.append(rec.name)
+            continue
+        data_type, data, targets = info
+        if grouped.get(data.as_pointer()) == group.name:
+            continue  # Shares its data with a light that was already added
+        anim = targets[0][0].animation_data
+        if data.as_pointer() in grouped or (
+            anim and any(anim.drivers.find(data_path, index=max(i, 0)) for _, data_path, i, _ in targets)
+        ):
+            skipped.append(rec.name)  # In another group or driven by something else
+            continue
+
+        member = group.members.add()
+        member.name = rec.name
+        member.data_type = data_type
+        member.data_name = data.name
+        member_path = '{}.members["{}"]'.format(path, bpy.utils.escape_identifier(member.name))
+        for id_data, data_path, index, prop in targets:
+            value = id_data.path_resolve(data_path)
+            base = value[index] if index >= 0 else value
+            if prop == "strength":
+                member.base_strength = base
+            else:
+                member.base_color[index] = base
+            driver = id_data.driver_add(data_path, index).driver
+            driver.type = "SCRIPTED"
+            var = driver.variables.new()
+            var.name = "master"
+            var.targets[0].id_type = "SCENE"
+            var.targets[0].id = scene
+            var.targets[0].data_path = path + (".strength" if prop == "strength" else ".color[{}]".format(index))
+            # The base value is read from the member, so that edits of grouped lights can go through it
+            var = driver.variables.new()
+            var.name = "base"
+            var.targets[0].id_type = "SCENE"
+            var.targets[0].id = scene
+            var.targets[0].data_path = member_path + (
+                ".base_strength" if prop == "strength" else ".base_color[{}]".format(index)
+            )
+            driver.expression = "master * base"  # A simple expression, evaluated without Python
+        grouped[data.as_pointer()] = group.name
+    invalidate_light_view(scene)
+    return skipped
+
+
+def remove_light_group(scene, group):
+    """
+    Remove the drivers of this light group, leaving each light at the strength and color it had in the group.
+    Returns the names of the lights whose light data or material no longer exists
+    """
+    path = get_light_group_path(group) + "."
+    skipped = []
+    for member in group.members:
+        data = get_member_data(member)
+        id_data = data if member.data_type == "LIGHT" or data is None else data.node_tree
+        if id_data is None:
+            skipped.append(member.name)
+            continue
+        anim = id_data.animation_data
+        if anim is None:
+            continue
+        for fcurve in list(anim.drivers):
+            driver = fcurve.driver
+            if not driver.variables or not driver.variables[0].targets[0].data_path.startswith(path):
+                continue
+            master_path = driver.variables[0].targets[0].data_path
+            master = scene.path_resolve(master_path)
+            if master_path.endswith(".strength"):
+                value = master * member.base_strength
+            else:
+                value = master * member.base_color[fcurve.array_index]
+            data_path, index = fcurve.data_path, fcurve.array_index
+            id_data.driver_remove(data_path, index)
+            owner_path, _, prop = data_path.rpartition(".")
+            owner = id_data.path_resolve(owner_path) if owner_path else id_data
+            if isinstance(getattr(owner, prop), float):
+                setattr(owner, prop, value)
+            else:
+                getattr(owner, prop)[index] = value
+    groups = scene.gaf_props.LightGroups
+    groups.remove(groups.find(group.name))
+    invalidate_light_view(scene)
+    return skipped
+
+
+# Aim functions
+
+
+def aim_object(obj, target):
+    # Thanks to @kilbee for cleaning my crap up here :) See: https://github.com/gregzaal/Gaffer/commit/b920092
+    obj_loc = obj.matrix_world.to_translation()
+    direction = Vector(target) - obj_loc
+    # point obj '-Z' and use its 'Y' as up
+    rot_quat = direction.to_track_quat("-Z", "Y")
+    if obj.rotation_mode == "QUATERNION":
+        obj.rotation_quaternion = rot_quat
+    else:
+        obj.rotation_euler = rot_quat.to_euler(obj.rotation_mode if len(obj.rotation_mode) == 3 else "XYZ")
+
+
+def get_scene_object_rows(scene, objects):
+    """Return the index of each of these objects in scene.objects, for reading and writing them with foreach_get/set"""
+    pointers = {}
+    for j, obj in enumerate(objects):
+        pointers.setdefault(obj.as_pointer(), []).append(j)
+    rows = [0] * len(objects)
+    for i, obj in enumerate(scene.objects):
+        for j in pointers.get(obj.as_pointer(), ()):
+            rows[j] = i
+    return rows
+
+
+def get_world_locations(scene, objects):
+    """Return the world space locations of these objects, as an (n, 3) NumPy array when NumPy is available"""
+    if np is None:
+        return [obj.matrix_world.to_translation() for obj in objects]
+    matrices = np.empty(len(scene.objects) * 16, dtype=np.float32)
+    scene.objects.foreach_get("matrix_world", matrices)
+    # Matrices are stored column by column, so the translation is the 4th group of 4
+    return matrices.reshape(-1, 4, 4)[get_scene_object_rows(scene, objects), 3, :3].astype(float)
+
+
+def aim_objects(scene, objects, targets):
+    """
+    Point the -Z axis of these objects at the targets with their Y axis up, like Vector.to_track_quat("-Z", "Y").
+    targets is one location for all objects or a location for each object. The rotations are computed for all
+    objects at once with NumPy, falling back to aiming one at a time without NumPy. Only the aimed objects are written
+    """
+    if not objects:
+        return
+    if np is None:
+        per_object = len(targets) == len(objects) and not isinstance(targets[0], (int, float))
+        for i, obj in enumerate(objects):
+            aim_object(obj, targets[i] if per_object else targets)
+        return
+
+    directions = np.asarray(targets, dtype=float) - get_world_locations(scene, objects)
+    lengths = np.linalg.norm(directions, axis=1)
+    valid = lengths > 1e-6  # Objects that are at their target keep their rotation
+    z = -directions[valid] / lengths[valid, None]
+    # Y is the world Z axis made perpendicular to the aim direction, or world Y when aiming straight up or down
+    y = np.array([0, 0, 1.0]) - z[:, 2:3] * z
+    y_lengths = np.linalg.norm(y, axis=1)
+    vertical = y_lengths < 1e-6
+    y[vertical] = (0, 1, 0)
+    y_lengths[vertical] = 1
+    y /= y_lengths[:, None]
+    x = np.cross(y, z)
+    rotations = np.stack([x, y, z], axis=2)  # Rotation matrices with x, y and z as columns
+
+    objects = [obj for obj, v in zip(objects, valid) if v]
+    euler_rows, euler_values = [], []
+    quat_rows, quat_values = [], []
+    for j, obj in enumerate(objects):
+        mode = obj.rotation_mode
+        if mode == "XYZ":
+            euler_rows.append(j)
+        elif mode == "QUATERNION":
+            quat_rows.append(j)
+        else:  # Other rotation orders are rare, convert those one by one
+            obj.rotation_euler = Matrix(rotations[j].tolist()).to_euler(mode if len(mode) == 3 else "XYZ")
+
+    if euler_rows:
+        m = rotations[euler_rows]
+        # x is always horizontal, so the Y rotation is 0 and there's no gimbal lock
+        eulers = np.stack([np.arctan2(m[:, 2, 1], m[:, 2, 2]), np.zeros(len(m)), np.arctan2(m[:, 1, 0], m[:, 0, 0])], 1)
+        for j, euler in zip(euler_rows, eulers.tolist()):
+            objects[j].rotation_euler = euler
+    if quat_rows:
+        m = rotations[quat_rows]
+        w = 0.5 * np.sqrt(np.maximum(0, 1 + m[:, 0, 0] + m[:, 1, 1] + m[:, 2, 2]))
+        qx = 0.5 * np.sqrt(np.maximum(0, 1 + m[:, 0, 0] - m[:, 1, 1] - m[:, 2, 2]))
+        qy = 0.5 * np.sqrt(np.maximum(0, 1 - m[:, 0, 0] + m[:, 1, 1] - m[:, 2, 2]))
+        qz = 0.5 * np.sqrt(np.maximum(0, 1 - m[:, 0, 0] - m[:, 1, 1] + m[:, 2, 2]))
+        quats = np.stack(
+            [
+                w,
+                np.copysign(qx, m[:, 2, 1] - m[:, 1, 2]),
+                np.copysign(qy, m[:, 0, 2] - m[:, 2, 0]),
+                np.copysign(qz, m[:, 1, 0] - m[:, 0, 1]),
+            ],
+            1,
+        )
+        for j, quat in zip(quat_rows, quats.tolist()):
+            objects[j].rotation_quaternion = quat
+
+
 # Color functions
 
 
@@ -424,7 +1710,7 @@ def setColTemp(node, temp):
     node.inputs[0].default_value = temp
 
 
-def convert_temp_to_RGB(colour_temperature):
+def calculate_temp_to_RGB(colour_temperature):
     """
     Converts from K to RGB, algorithm courtesy of
     http://www.tannerhelland.com/4435/convert-temperature-rgb-algorithm-code/
@@ -486,9 +1772,77 @@ def convert_temp_to_RGB(colour_temperature):
     return [red / 255, green / 255, blue / 255]  # return RGB in a 0-1 range
 
 
+_blackbody_lut = []  # RGB colors of the temperatures 0, step, 2 * step ... blackbody_max K, see get_blackbody_lut
+_blackbody_lut_np = None  # The same table as a NumPy array, for convert_temps_to_RGB
+
+
+def get_blackbody_lut():
+    if not _blackbody_lut:
+        num_entries = const.blackbody_max // const.blackbody_lut_step + 1
+        _blackbody_lut.extend(calculate_temp_to_RGB(i * const.blackbody_lut_step) for i in range(num_entries))
+    return _blackbody_lut
+
+
+@functools.lru_cache(maxsize=1024)
+def convert_temp_to_RGB(colour_temperature):
+    """
+    Return the RGB color (0-1 range) of a color temperature in K, interpolated from a precomputed table.
+    Cached per value, so Blackbody nodes that don't change cost nothing when the overlays redraw
+    """
+    lut = get_blackbody_lut()
+    x = min(max(colour_temperature, 0), const.blackbody_max) / const.blackbody_lut_step
+    i = min(int(x), len(lut) - 2)
+    f = x - i
+    a, b = lut[i], lut[i + 1]
+    return (a[0] + (b[0] - a[0]) * f, a[1] + (b[1] - a[1]) * f, a[2] + (b[2] - a[2]) * f)
+
+
+def convert_temps_to_RGB(temperatures):
+    """
+    Convert many color temperatures at once. Returns an (n, 3) NumPy array, or a list of RGB tuples if NumPy
+    isn't available
+    """
+    global _blackbody_lut_np
+    if np is None:
+        return [convert_temp_to_RGB(t) for t in temperatures]
+    if _blackbody_lut_np is None:
+        _blackbody_lut_np = np.array(get_blackbody_lut())
+    lut = _blackbody_lut_np
+    lut_temps = np.arange(len(lut)) * const.blackbody_lut_step
+    temps = np.clip(np.asarray(temperatures, dtype=float), 0, const.blackbody_max)
+    return np.column_stack([np.interp(temps, lut_temps, lut[:, c]) for c in range(3)])
+
+
+def get_overlay_colors(items):
+    """
+    Return the color to draw each [object, color, ...] item of the radius and label overlays with. The temperatures
+    of all Blackbody nodes are converted at once
+    """
+    colors = []
+    blackbody = []
+    for i, item in enumerate(items):
+        color = item[1]
+        if color[0] == "BLACKBODY":
+            blackbody.append(i)
+        elif color[0] == "WAVELENGTH":
+            color = convert_wavelength_to_RGB(color[1].inputs[0].default_value)
+        colors.append(color)
+    if blackbody:
+        temps = convert_temps_to_RGB([items[i][1][1].inputs[0].default_value for i in blackbody])
+        for i, rgb in zip(blackbody, temps):
+            colors[i] = rgb
+    return colors
+
+
+@functools.lru_cache(maxsize=1024)
 def convert_wavelength_to_RGB(wavelength):
-    # normalize wavelength into a number between 0 and 80 and use it as the index for the list
-    return const.wavelength_list[min(80, max(0, int((wavelength - 380) * 0.2)))]
+    """Return the RGB color of a wavelength in nm, interpolated between the 5 nm steps of the Cycles table"""
+    wavelengths = const.wavelength_list
+    x = min(max((wavelength - 380) * 0.2, 0), len(wavelengths) - 1)
+    i = min(int(x), len(wavelengths) - 2)
+    f = x - i
+    a, b = wavelengths[i], wavelengths[i + 1]
+    return (a[0] + (b[0] - a[0]) * f, a[1] + (b[1] - a[1]) * f, a[2] + (b[2] - a[2]) * f)
 
 
 # Visibility functions
@@ -498,11 +1852,12 @@ def getHiddenStatus(scene, lights):
     statelist = []
     temparr = []
     for light in lights:
-        if light[0]:
+        obj = bpy.data.objects.get(light.name)
+        if obj:
             temparr = [
-                light[0],
-                bpy.data.objects[light[0]].hide_viewport,
-                bpy.data.objects[light[0]].hide_render,
+                light.name,
+                obj.hide_viewport,
+                obj.hide_render,
             ]
             statelist.append(temparr)
 
@@ -516,96 +1871,645 @@ def getHiddenStatus(scene, lights):
     scene.gaf_props.LightsHiddenRecord = str(statelist)
 
 
-def visibleCollections():
+def light_linking_solo_supported(scene):
+    """Whether lights can be soloed with light linking in this scene's render engine"""
+    if not hasattr(bpy.types.Object, "light_linking"):  # Blender 4.0+
+        return False
+    engine = scene.render.engine
+    return engine == "CYCLES" or (engine in ["BLENDER_EEVEE", "BLENDER_EEVEE_NEXT"] and bpy.app.version >= (4, 2, 0))
+
+
+def get_solo_receivers():
+    """
+    Return the collection that lights are linked to while they're soloed out. It only includes an empty,
+    so a light that uses it as its receiver collection doesn't light anything
+    """
+    col = bpy.data.collections.get(const.solo_receivers_name)
+    if col is None:
+        col = bpy.data.collections.new(const.solo_receivers_name)
+    if not col.objects:
+        col.objects.link(bpy.data.objects.new(const.solo_receivers_name, None))
+    return col
+
+
+def remove_solo_receivers():
+    """
+    Remove the collection of get_solo_receivers and its empty. Blender clears the receiver collection of every light
+    that still uses it, so all soloed out lights light the scene again in one step
+    """
+    col = bpy.data.collections.get(const.solo_receivers_name)
+    if col is None:
+        return
+    bpy.data.batch_remove(list(col.objects) + [col])
+
+
+def solo_light_linking(scene, keep):
+    """
+    Stop all lights except those named in keep from lighting anything, without changing their hide flags.
+    The receiver collections of the lights that had one and the world visibility are stored in SoloRecord
+    """
+    gaf_props = scene.gaf_props
+    receivers = get_solo_receivers()
+    blacklist = get_visibility_filter(scene)["blacklist"]
+    previous = {}
+    for light in get_lights(scene):
+        obj = bpy.data.objects.get(light.name)
+        if obj is None or obj.name in keep or obj.name in blacklist:
+            continue
+        receiver_collection = obj.light_linking.receiver_collection
+        if receiver_collection == receivers:
+            continue
+        if receiver_collection is not None:
+            previous[obj.name] = receiver_collection.name
+        obj.light_linking.receiver_collection = receivers
+    gaf_props.SoloRecord = json.dumps({"lights": previous, "world": [gaf_props.WorldVis, gaf_props.WorldReflOnly]})
+
+
+def unsolo_light_linking(scene):
+    """
+    Restore the receiver collections and world visibility stored by solo_light_linking. Unless another scene is
+    still soloed, the solo receivers collection is removed, which resets the other lights without touching each one
+    """
+    gaf_props = scene.gaf_props
+    record = json.loads(gaf_props.SoloRecord)
+    gaf_props.SoloRecord = ""
+    receivers = bpy.data.collections.get(const.solo_receivers_name)
+    for name, previous in record["lights"].items():
+        obj = bpy.data.objects.get(name)
+        if obj and receivers and obj.light_linking.receiver_collection == receivers:
+            obj.light_linking.receiver_collection = bpy.data.collections.get(previous)
+    if receivers and any(s.gaf_props.SoloRecord for s in bpy.data.scenes):
+        for light in get_lights(scene):  # Keep the collection for the other scene, only reset this one's lights
+            obj = bpy.data.objects.get(light.name)
+            if obj and obj.light_linking.receiver_collection == receivers:
+                obj.light_linking.receiver_collection = None
+    else:
+        remove_solo_receivers()
+    if scene.render.engine == "CYCLES":
+        gaf_props.WorldVis, gaf_props.WorldReflOnly = record["world"]
+
+
+def set_solo(scene, light="", showhide=False, worldsolo=False, linked_lights=(), use_light_linking=False):
+    """
+    Enter solo mode for the named light (and any linked_lights sharing its data) when showhide is True,
+    otherwise exit it and restore the previous visibility
+    """
+    gaf_props = scene.gaf_props
+    blacklist = get_visibility_filter(scene)["blacklist"]
+
+    if showhide and use_light_linking and light_linking_solo_supported(scene):
+        refresh_light_list(scene)
+        gaf_props.SoloActive = light
+        solo_light_linking(scene, {light, *linked_lights})
+        if scene.render.engine == "CYCLES" and gaf_props.WorldVis != worldsolo:
+            gaf_props.WorldVis = worldsolo
+        return
+    elif not showhide and gaf_props.SoloRecord:  # Solo was entered with light linking
+        gaf_props.SoloActive = ""
+        unsolo_light_linking(scene)
+        return
+
+    statelist = stringToNestedList(gaf_props.LightsHiddenRecord, True)
+
+    if showhide:  # Enter Solo mode
+        refresh_light_list(scene)
+        gaf_props.SoloActive = light
+        getHiddenStatus(scene, get_lights(scene))
+        for l in statelist:  # first check if lights still exist
+            if l[0] != "WorldEnviroLight":
+                try:
+                    obj = bpy.data.objects[l[0]]
+                except KeyError:
+                    # TODO not sure if this ever happens, if it does, doesn't it break?
+                    getHiddenStatus(scene, get_lights(scene))
+                    set_solo(scene)
+                    # If one of the lights has been deleted/changed, update the list and dont restore visibility
+                    return
+
+        for l in statelist:  # then restore visibility
+            if l[0] != "WorldEnviroLight":
+                obj = bpy.data.objects[l[0]]
+                if obj.name not in blacklist:
+                    if obj.name == light or obj.name in linked_lights:
+                        obj.hide_viewport = False
+                        obj.hide_render = False
+                    else:
+                        obj.hide_viewport = True
+                        obj.hide_render = True
+
+        if scene.render.engine == "CYCLES":
+            if worldsolo:
+                if not gaf_props.WorldVis:
+                    gaf_props.WorldVis = True
+            else:
+                if gaf_props.WorldVis:
+                    gaf_props.WorldVis = False
+
+    else:  # Exit solo
+        oldlight = gaf_props.SoloActive
+        gaf_props.SoloActive = ""
+        for l in statelist:
+            if l[0] != "WorldEnviroLight":
+                try:
+                    obj = bpy.data.objects[l[0]]
+                except KeyError:
+                    # TODO not sure if this ever happens, if it does, doesn't it break?
+                    refresh_light_list(scene)
+                    getHiddenStatus(scene, get_lights(scene))
+                    gaf_props.SoloActive = oldlight
+                    set_solo(scene)
+                    return
+                if obj.name not in blacklist:
+                    obj.hide_viewport = castBool(l[1])
+                    obj.hide_render = castBool(l[2])
+            elif scene.render.engine == "CYCLES":
+                gaf_props.WorldVis = castBool(l[1])
+                gaf_props.WorldReflOnly = castBool(l[2])
+
+
+def get_view_layer(scene):
+    """Return the view layer that's being shown for this scene"""
+    context = bpy.context
+    if context.scene == scene and context.view_layer:
+        return context.view_layer
+    return scene.view_layers[0]
+
+
+def visibleCollections(scene=None, view_layer=None):
+    """Return the set of pointers of the collections that are visible in the view layer"""
+
     def check_child(c, vis_cols):
         if c.is_visible:
-            vis_cols.append(c.collection)
+            vis_cols.add(c.collection.as_pointer())
             for sc in c.children:
-                vis_cols = check_child(sc, vis_cols)
-        return vis_cols
+                check_child(sc, vis_cols)
 
-    vis_cols = [bpy.context.scene.collection]
+    scene = scene or bpy.context.scene
+    view_layer = view_layer or get_view_layer(scene)
+    vis_cols = {scene.collection.as_pointer()}
 
-    for c in bpy.context.window.view_layer.layer_collection.children:
+    for c in view_layer.layer_collection.children:
         check_child(c, vis_cols)
 
     return vis_cols
 
 
 def isInVisibleCollection(obj, vis_cols):
-    for oc in obj.users_collection:
-        if oc in vis_cols:
-            return True
-    return False
+    return any(oc.as_pointer() in vis_cols for oc in obj.users_collection)
+
+
+def invalidate_visibility_filter():
+    _visibility_filters.clear()
+    invalidate_light_view()
+
+
+def _update_blacklist(self, context):
+    invalidate_visibility_filter()
+
+
+def get_visibility_filter(scene, view_layer=None):
+    """
+    Return the sets that the panel and overlays use to decide which lights to show, as a dict with:
+        collections: Pointers of the collections that are visible in the view layer
+        blacklist: Names of the objects that Gaffer ignores
+    Cached until the collection visibility or the blacklist changes
+    """
+    view_layer = view_layer or get_view_layer(scene)
+    key = (scene.as_pointer(), view_layer.as_pointer())
+    vis_filter = _visibility_filters.get(key)
+    if vis_filter is None:
+        vis_filter = {
+            "collections": visibleCollections(scene, view_layer),
+            "blacklist": {o.name for o in scene.gaf_props.Blacklist},
+        }
+        _visibility_filters[key] = vis_filter
+    return vis_filter
+
+
+# Snapshot functions
+
+
+def pack_floats(values):
+    return base64.b64encode(array.array("f", values).tobytes()).decode()
+
+
+def unpack_floats(data):
+    values = array.array("f")
+    values.frombytes(base64.b64decode(data))
+    return values
+
+
+def snapshot_value(value):
+    """Convert a property value to something that can be stored as JSON and compared with a stored value"""
+    return value if isinstance(value, (bool, int, float, str)) else list(value)
+
+
+def get_light_size(light):
+    """Return the size (radius, area size or sun angle) and, for area lights, the Y size of this light data"""
+    prop = const.light_size_props.get(light.type)
+    return [getattr(light, prop) if prop else 0.0, light.size_y if light.type == "AREA" else 0.0]
+
+
+def get_emission_color_socket(record):
+    """Return the unlinked color input of the node that controls this light's color, or None"""
+    nodes = get_light_nodes(record)
+    if nodes is None or record.color_node not in nodes:
+        return None
+    node = nodes[record.color_node]
+    if not node.inputs or node.inputs[0].type != "RGBA" or node.inputs[0].is_linked:
+        return None
+    return node.inputs[0]
+
+
+def capture_snapshot(scene):
+    """
+    Capture the energy, color, size and visibility of the scene's lights, the strength and color sockets of node
+    based lights, and the HDRI handler settings of the world. Light data and object visibility are read in bulk with
+    foreach_get and packed into float arrays. Returns a string to store and later pass to restore_snapshot
+    """
+    ensure_light_list(scene)
+    registry = get_lights(scene)
+    names = {rec.name for rec in registry}
+
+    objects = scene.objects
+    hide_viewport = [False] * len(objects)
+    hide_render = [False] * len(objects)
+    objects.foreach_get("hide_viewport", hide_viewport)
+    objects.foreach_get("hide_render", hide_render)
+    object_names = []
+    hidden = []
+    light_data = set()
+    for i, obj in enumerate(objects):
+        if obj.name in names:
+            object_names.append(obj.name)
+            hidden += [hide_viewport[i], hide_render[i]]
+            if obj.type == "LIGHT":
+                light_data.add(obj.data.name)
+
+    lights = bpy.data.lights
+    energies = [0.0] * len(lights)
+    colors = [0.0] * len(lights) * 3
+    lights.foreach_get("energy", energies)
+    lights.foreach_get("color", colors)
+    light_names, energy, color, size = [], [], [], []
+    for i, light in enumerate(lights):
+        if light.name in light_data:
+            light_names.append(light.name)
+            energy.append(energies[i])
+            color += colors[i * 3 : i * 3 + 3]
+            size += get_light_size(light)
+
+    socket_names, strength, socket_color = [], [], []
+    for rec in registry:
+        skt = get_value_strength_socket(rec)
+        if skt is None:
+            continue
+        color_socket = get_emission_color_socket(rec)
+        socket_names.append(rec.name)
+        strength.append(skt.default_value)
+        socket_color += color_socket.default_value[:] if color_socket else [-1.0] * 4  # -1: no color socket
+
+    return json.dumps(
+        {
+            "objects": object_names,
+            "hidden": base64.b64encode(bytes(hidden)).decode(),
+            "lights": light_names,
+            "energy": pack_floats(energy),
+            "color": pack_floats(color),
+            "size": pack_floats(size),
+            "sockets": socket_names,
+            "strength": pack_floats(strength),
+            "socket_color": pack_floats(socket_color),
+            "world": capture_world_settings(scene),
+        }
+    )
+
+
+def restore_snapshot(scene, data):
+    """
+    Apply a snapshot made by capture_snapshot. Light energies and colors are written in one foreach_set, everything
+    else is only set where it differs, so switching between two snapshots only touches what they disagree on.
+    Returns the names of the lights and world settings that couldn't be restored
+    """
+    snapshot = json.loads(data)
+    missing = []
+
+    objects = scene.objects
+    hide_viewport = [False] * len(objects)
+    hide_render = [False] * len(objects)
+    objects.foreach_get("hide_viewport", hide_viewport)
+    objects.foreach_get("hide_render", hide_render)
+    hidden = base64.b64decode(snapshot["hidden"])
+    wanted = {name: j for j, name in enumerate(snapshot["objects"])}
+    found = set()
+    for i, obj in enumerate(objects):
+        j = wanted.get(obj.name)
+        if j is None:
+            continue
+        found.add(obj.name)
+        # Set one by one so that Blender updates the depsgraph relations, only a few differ between snapshots
+        if hide_viewport[i] != bool(hidden[j * 2]):
+            obj.hide_viewport = bool(hidden[j * 2])
+        if hide_render[i] != bool(hidden[j * 2 + 1]):
+            obj.hide_render = bool(hidden[j * 2 + 1])
+    missing += [name for name in wanted if name not in found]
+
+    lights = bpy.data.lights
+    energies = [0.0] * len(lights)
+    colors = [0.0] * len(lights) * 3
+    lights.foreach_get("energy", energies)
+    lights.foreach_get("color", colors)
+    index = {light.name: (i, light) for i, light in enumerate(lights)}
+    energy = unpack_floats(snapshot["energy"])
+    color = unpack_floats(snapshot["color"])
+    size = unpack_floats(snapshot["size"])
+    members = get_group_members(scene)  # Their drivers set the values, so they're restored through the group
+    changed = []
+    for j, name in enumerate(snapshot["lights"]):
+        if name not in index:
+            missing.append(name)
+            continue
+        i, light = index[name]
+        new_color = color[j * 3 : j * 3 + 3].tolist()
+        member = members.get(light.as_pointer())
+        if member is not None:
+            if not set_member_values(scene, member, energy[j], new_color):
+                missing.append(name)
+        elif energies[i] != energy[j] or colors[i * 3 : i * 3 + 3] != new_color:
+            energies[i] = energy[j]
+            colors[i * 3 : i * 3 + 3] = new_color
+            changed.append(light)
+        prop = const.light_size_props.get(light.type)
+        if prop and getattr(light, prop) != size[j * 2]:
+            setattr(light, prop, size[j * 2])
+        if light.type == "AREA" and light.size_y != size[j * 2 + 1]:
+            light.size_y = size[j * 2 + 1]
+    if changed:
+        lights.foreach_set("energy", energies)
+        lights.foreach_set("color", colors)
+        for light in changed:
+            light.update_tag()  # foreach_set doesn't tag the lights for the depsgraph
+
+    strength = unpack_floats(snapshot["strength"])
+    socket_color = unpack_floats(snapshot["socket_color"])
+    for j, name in enumerate(snapshot["sockets"]):
+        rec = get_light_record(scene, name)
+        skt = get_value_strength_socket(rec) if rec else None
+        if skt is None:
+            missing.append(name)
+            continue
+        rgba = tuple(socket_color[j * 4 : j * 4 + 4])
+        color_socket = get_emission_color_socket(rec)
+        member = get_record_member(members, rec)
+        if member is not None:
+            if not set_member_values(scene, member, strength[j], rgba[:3] if color_socket and rgba[0] >= 0 else None):
+                missing.append(name)
+            continue
+        if skt.default_value != strength[j]:
+            skt.default_value = strength[j]
+        if color_socket and rgba[0] >= 0 and color_socket.default_value[:] != rgba:
+            color_socket.default_value = rgba
+
+    missing += restore_world_settings(scene, snapshot["world"])
+    return missing
+
+
+def capture_world_settings(scene):
+    """Return the HDRI handler settings of the scene's world as a dict, or None if it has no world"""
+    if not scene.world:
+        return None
+    gaf_hdri_props = scene.world.gaf_hdri_props
+    return {prop: snapshot_value(getattr(gaf_hdri_props, prop)) for prop in const.snapshot_hdri_props}
+
+
+def restore_world_settings(scene, settings):
+    """Apply settings from capture_world_settings, only where they differ. Returns the settings that couldn't be set"""
+    missing = []
+    if not settings or not scene.world:
+        return missing
+    gaf_hdri_props = scene.world.gaf_hdri_props
+    for prop, value in settings.items():
+        if snapshot_value(getattr(gaf_hdri_props, prop)) == value:
+            continue
+        try:
+            setattr(gaf_hdri_props, prop, value)
+        except TypeError:  # e.g. the HDRI isn't in the HDRI folders anymore
+            missing.append(prop)
+    return missing
+
+
+# Rig preset functions
+
+
+def get_rig_path(name):
+    """Return the file path of the rig preset with this name in the rig library"""
+    return os.path.join(const.rig_library_dir, bpy.path.clean_name(name) + ".json")
+
+
+def list_rigs():
+    """Return the names of the rig presets in the rig library, sorted"""
+    if not os.path.exists(const.rig_library_dir):
+        return []
+    names = []
+    for f in os.listdir(const.rig_library_dir):
+        if f.endswith(".json"):
+            names.append(os.path.splitext(f)[0])
+    return sorted(names, key=str.lower)
+
+
+def save_rig(rig, filepath=""):
+    """Write a rig made by capture_rig to the rig library, or to filepath. Returns the file path"""
+    filepath = filepath or get_rig_path(rig["name"])
+    if not os.path.exists(os.path.dirname(filepath)):
+        os.makedirs(os.path.dirname(filepath))
+    with open(filepath, "w") as f:
+        json.dump(rig, f, indent=1)
+    return filepath
+
+
+def load_rig(name):
+    """Read a rig preset, given either its name in the rig library or the path of a .json file"""
+    filepath = name if name.endswith(".json") else get_rig_path(name)
+    with open(filepath) as f:
+        return json.load(f)
+
+
+def rig_enum_items(self, context):
+    """Items of the rig preset enums, kept in a module variable since Blender doesn't keep its own reference"""
+    _rig_items[:] = [(name, name, "Apply the rig preset '{}'".format(name)) for name in list_rigs()]
+    return _rig_items
+
+
+def get_rig_node_values(record):
+    """Return the unlinked input values of this light's strength and color nodes, keyed by node name and index"""
+    nodes = get_light_nodes(record)
+    if nodes is None:
+        return {}
+    values = {}
+    for node_name in {record.node, record.color_node}:
+        node = nodes.get(node_name) if node_name else None
+        if node is None:
+            continue
+        node_values = {}
+        for i, skt in enumerate(node.inputs):
+            if not skt.is_linked and skt.type in {"VALUE", "INT", "RGBA", "VECTOR"}:
+                node_values[str(i)] = snapshot_value(skt.default_value)
+        values[node.name] = node_values
+    return values
+
+
+def capture_rig(scene, name, objects, target=None, include_world=True):
+    """
+    Make a rig preset from these light objects: their light data settings, their transforms relative to the target
+    object (or to the world origin), the values of their Gaffer strength and color nodes, and optionally the world's
+    HDRI handler settings. Returns a dict to pass to save_rig or apply_rig. Mesh lights are left out
+    """
+    ensure_light_list(scene)
+    target_inverse = target.matrix_world.inverted() if target else Matrix()
+    lights = []
+    for obj in sorted(objects, key=lambda o: o.name):
+        if obj.type != "LIGHT":
+            continue
+        light = obj.data
+        data = {prop: snapshot_value(getattr(light, prop)) for prop in const.rig_light_props if hasattr(light, prop)}
+        rec = get_light_record(scene, obj.name)
+        lights.append(
+            {
+                "name": obj.name,
+                "type": light.type,
+                "matrix": [v for row in target_inverse @ obj.matrix_world for v in row],
+                "data": data,
+                "nodes": get_rig_node_values(rec) if rec else {},
+            }
+        )
+    return {
+        "name": name,
+        "target": target.name if target else "",
+        "lights": lights,
+        "world": capture_world_settings(scene) if include_world else None,
+    }
+
+
+def get_rig_matrix(scene, rig, target="SAVED"):
+    """
+    Return the matrix to place a rig relative to: the object it was saved relative to (SAVED), the world origin
+    (WORLD), the 3D cursor (CURSOR) or the object with this name. None if that object isn't in the scene
+    """
+    if target == "WORLD":
+        return Matrix()
+    if target == "CURSOR":
+        return scene.cursor.matrix.copy()
+    name = rig["target"] if target == "SAVED" else target
+    if not name:
+        return Matrix()
+    obj = scene.objects.get(name)
+    return obj.matrix_world.copy() if obj else None
+
+
+def apply_rig(scene, rig, matrix=None):
+    """
+    Create the lights of a rig preset in the scene, in a collection named after the rig, placed relative to matrix
+    (see get_rig_matrix). Lights of the rig that already exist are updated instead, so applying a rig again is safe.
+    Returns the lights and world settings that couldn't be fully set up
+    """
+    missing = []
+    collection_name = const.rig_collection_prefix + rig["name"]
+    collection = bpy.data.collections.get(collection_name)
+    if collection is None:
+        collection = bpy.data.collections.new(collection_name)
+    if collection.name not in scene.collection.children:
+        scene.collection.children.link(collection)
+
+    matrix = matrix if matrix is not None else Matrix()
+    for item in rig["lights"]:
+        obj = bpy.data.objects.get(item["name"])
+        if obj is None or obj.type != "LIGHT":
+            light = bpy.data.lights.new(item["name"], item["type"])
+            obj = bpy.data.objects.new(item["name"], light)
+            collection.objects.link(obj)
+        elif obj.data.type != item["type"]:
+            obj.data.type = item["type"]
+        if obj.name not in scene.objects:
+            collection.objects.link(obj)
+
+        light = obj.data
+        for prop, value in item["data"].items():
+            if hasattr(light, prop):
+                setattr(light, prop, value)
+        values = item["nodes"]
+        if values and light.node_tree:
+            nodes = light.node_tree.nodes
+            for node_name, node_values in values.items():
+                node = nodes.get(node_name)
+                if node is None:
+                    missing.append(obj.name + ": " + node_name)
+                    continue
+                for i, value in node_values.items():
+                    skt = node.inputs[int(i)] if int(i) < len(node.inputs) else None
+                    if skt is not None and not skt.is_linked:
+                        skt.default_value = value
+        m = item["matrix"]
+        obj.matrix_world = matrix @ Matrix([m[0:4], m[4:8], m[8:12], m[12:16]])
+
+    missing += restore_world_settings(scene, rig["world"])
+    untrust_light_list(scene)
+    forget_light_fingerprint(scene)  # The rig's lights may have been patched in before the refresh
+    return missing
 
 
 # Misc functions
 
 
-def dictOfLights():
-    # Create dict of light name as key with node name as value
-    lights = stringToNestedList(bpy.context.scene.gaf_props.Lights, stripquotes=True)
-    lights_with_nodes = []
-    light_dict = {}
-    if lights:
-        for light in lights:  # TODO check if node still exists
-            if len(light) > 1:
-                lights_with_nodes.append(light[0])
-                lights_with_nodes.append(light[2])
-        light_dict = dict(lights_with_nodes[i : i + 2] for i in range(0, len(lights_with_nodes), 2))
-    return light_dict
+def get_missing_images():
+    """Return the file paths of the images that aren't packed and whose files don't exist"""
+    missing = []
+    for img in bpy.data.images:
+        if img.source not in {"FILE", "SEQUENCE", "TILED"} or img.packed_file:
+            continue
+        path = bpy.path.abspath(img.filepath, library=img.library)
+        if "<UDIM>" not in path and not os.path.exists(path):
+            missing.append(img.filepath)
+    return missing
 
 
 def setGafferNode(context, nodetype, tree=None, obj=None):
-    if nodetype == "STRENGTH":
-        list_nodeindex = 2
-        list_socketindex = 3
-    elif nodetype == "COLOR":
-        list_nodeindex = 4
-        list_socketindex = 5
-
     if tree:
         nodetree = tree
     else:
         nodetree = context.space_data.node_tree
     node = nodetree.nodes.active
-    lights = stringToNestedList(context.scene.gaf_props.Lights, stripquotes=True)
 
     if obj is None:
         obj = context.object
-    for light in lights:
-        # TODO poll for pinned nodetree (active object is not necessarily the one that this tree belongs to)
-        if light[0] == obj.name:
-            light[list_nodeindex] = node.name
-            socket_index = 0
-
-            if node.inputs:
-                for socket in node.inputs:
-                    if socket.type == "VALUE" and not socket.is_linked:  # use first Value socket as strength
-                        light[list_socketindex] = "i" + str(socket_index)
-                        break
-                    socket_index += 1
+    # TODO poll for pinned nodetree (active object is not necessarily the one that this tree belongs to)
+    light = get_light_record(context.scene, obj.name)
+    if light is None:
+        return
+
+    if nodetype == "COLOR":
+        light.color_node = node.name
+        return
+
+    light.node = node.name
+    if node.inputs:
+        for socket_index, socket in enumerate(node.inputs):
+            if socket.type == "VALUE" and not socket.is_linked:  # use first Value socket as strength
+                light.socket_type = "i"
+                light.socket_index = socket_index
                 break
-            elif node.outputs:
-                for socket in node.outputs:
-                    if socket.type == "VALUE":  # use first Value socket as strength
-                        light[list_socketindex] = "o" + str(socket_index)
-                        break
-                    socket_index += 1
+    elif node.outputs:
+        for socket_index, socket in enumerate(node.outputs):
+            if socket.type == "VALUE":  # use first Value socket as strength
+                light.socket_type = "o"
+                light.socket_index = socket_index
                 break
     # TODO catch if there is no available socket to use
-    context.scene.gaf_props.Lights = str(lights)
 
 
 def do_update_falloff(self):
     light = self
     scene = bpy.context.scene
-    lights = stringToNestedList(scene.gaf_props.Lights, stripquotes=True)
-    lightitems = []
-    for l in lights:
-        if l[0] == light.name:
-            lightitems = l
-            break
+    record = get_light_record(scene, light.name)
 
     socket_no = 2
     falloff = light.GafferFalloff
@@ -615,13 +2519,13 @@ def do_update_falloff(self):
         socket_no = 0
 
     connections = []
-    if light.type == "LIGHT":
-        tree = light.data.node_tree
-    else:
-        tree = bpy.data.materials[lightitems[1]].node_tree
-
     try:
-        node = tree.nodes[lightitems[2]]
+        if light.type == "LIGHT":
+            tree = light.data.node_tree
+        else:
+            tree = bpy.data.materials[record.material].node_tree
+
+        node = tree.nodes[record.node]
         if node.type == "LIGHT_FALLOFF":
             for outpt in node.outputs:
                 if outpt.is_linked:
@@ -632,10 +2536,10 @@ def do_update_falloff(self):
         else:
             if light.GafferFalloff != "quadratic":
                 fnode = tree.nodes.new("ShaderNodeLightFalloff")
-                fnode.inputs[0].default_value = node.inputs[int(str(lightitems[3])[-1])].default_value
+                fnode.inputs[0].default_value = node.inputs[record.socket_index].default_value
                 fnode.location.x = node.location.x - 250
                 fnode.location.y = node.location.y
-                tree.links.new(fnode.outputs[socket_no], node.inputs[int(str(lightitems[3])[-1])])
+                tree.links.new(fnode.outputs[socket_no], node.inputs[record.socket_index])
                 tree.nodes.active = fnode
                 setGafferNode(bpy.context, "STRENGTH", tree, light)
         force_update(bpy.context, light)
@@ -647,9 +2551,39 @@ def _update_falloff(self, context):
     do_update_falloff(self)
 
 
-def tag_refresh_light_list():
-    global TAG_REFRESH_LIGHT_LIST
-    TAG_REFRESH_LIGHT_LIST = True
+def tag_refresh_light_list(scene=None, reason="a UI draw", postpone=False):
+    """
+    Queue a full refresh of the light list. Requests are coalesced and run together from a timer after the refresh
+    delay set in the preferences. With postpone, for changes to the scene, a pending refresh waits for another delay,
+    so bulk edits only cause a single refresh. Other requests, like those of draw functions which run again and again
+    while the panel redraws, never delay a pending refresh.
+    This is also safe to call from draw functions, which can't write to ID properties themselves
+    """
+    global _refresh_deadline
+    scene = scene or bpy.context.scene
+    pending = bool(_refresh_queue)
+    _refresh_queue.setdefault(scene.name, reason)
+    delay = bpy.context.preferences.addons[__package__].preferences.refresh_delay
+    if not pending or postpone:
+        _refresh_deadline = time.monotonic() + delay
+    if not bpy.app.timers.is_registered(flush_light_list_refreshes):
+        bpy.app.timers.register(flush_light_list_refreshes, first_interval=delay)
+
+
+def flush_light_list_refreshes():
+    """Timer callback that runs the queued light list refreshes"""
+    remaining = _refresh_deadline - time.monotonic()
+    if remaining > 0:
+        return remaining  # More requests came in since the timer was started, wait until they stop
+    scenes = []
+    for name, reason in list(_refresh_queue.items()):
+        scene = bpy.data.scenes.get(name)
+        if scene is not None:
+            log("Gaffer light list auto-refresh of {} triggered by {}".format(name, reason), also_print=True)
+            scenes.append(scene)
+    _refresh_queue.clear()
+    refresh_all_light_lists(scenes)
+    return None
 
 
 def depsgraph_update_includes_all(depsgraph, types):
@@ -660,6 +2594,7 @@ def depsgraph_update_includes_all(depsgraph, types):
 
 
 @persistent
+@profile("depsgraph_update_post_handler")
 def depsgraph_update_post_handler(scene, depsgraph):
 
     # Debug mode to see what depsgraph updates are happening
@@ -675,35 +2610,48 @@ def depsgraph_update_post_handler(scene, depsgraph):
                 update.is_updated_shading,
             )
 
+    # Skip the work while playing back or rendering, and catch up once that stops
+    if _rendering or is_animation_playing():
+        suspend_depsgraph_handler(scene, depsgraph)
+        return
+    if _suspended_scenes:
+        resume_depsgraph_handler()  # In case the timer hasn't run yet, or can't run in background mode
+
+    # Forget the resolved emission nodes of node trees that were changed
+    if _emission_cache and any(depsgraph.id_type_updated(t) for t in ["NODETREE", "MATERIAL", "LIGHT"]):
+        for update in depsgraph.updates:
+            id_data = update.id.original
+            node_tree = id_data if isinstance(id_data, bpy.types.NodeTree) else getattr(id_data, "node_tree", None)
+            if node_tree:
+                invalidate_emission_cache(node_tree)
+
+    if depsgraph.id_type_updated("OBJECT"):
+        update_data_users(depsgraph)
+
+    # Hiding, renaming, relinking or deleting objects changes which lights the panel shows
+    if depsgraph.id_type_updated("COLLECTION") or depsgraph.id_type_updated("SCENE"):
+        invalidate_visibility_filter()
+    elif depsgraph.id_type_updated("OBJECT") and _light_views:
+        for update in depsgraph.updates:
+            obj = update.id.original
+            if isinstance(obj, bpy.types.Object) and not update.is_updated_transform and light_view_changed(scene, obj):
+                invalidate_light_view(scene)
+                break
+
+    # Other scenes may link the same objects, they're checked again when they're shown, see ensure_light_list
+    if any(depsgraph.id_type_updated(t) for t in ["OBJECT", "LIGHT", "MATERIAL", "COLLECTION"]):
+        _trusted_scenes.intersection_update({scene.as_pointer()})
+
     prefs = bpy.context.preferences.addons[__package__].preferences
-    if prefs.auto_refresh_light_list:
-        # A light has been added
-        if depsgraph_update_includes_all(depsgraph, ["COLLECTION", "LIGHT", "OBJECT", "SCENE"]):
-            log("Gaffer light list auto-refresh triggered by depsgraph update", also_print=True)
-            refresh_light_list(scene)
-            return
-
-        # A UI draw function has requested a refresh, usually when a light is deleted
-        global TAG_REFRESH_LIGHT_LIST
-        if TAG_REFRESH_LIGHT_LIST:
-            TAG_REFRESH_LIGHT_LIST = False
-            log("Gaffer light list auto-refresh triggered by TAG_REFRESH_LIGHT_LIST", also_print=True)
-            refresh_light_list(scene)
-
-        # Light has been renamed
-        if (
-            depsgraph.id_type_updated("OBJECT")
-            and len(depsgraph.updates) == 1
-            and not depsgraph.updates[0].is_updated_transform
-            and not depsgraph.id_type_updated("SCENE")
-        ):
-            lights_str = scene.gaf_props.Lights
-            lights = stringToNestedList(lights_str)
-            all_objects = {obj.name for obj in bpy.data.objects}
-            if any(light[0][1:-1] not in all_objects for light in lights):
-                log("Gaffer light list auto-refresh triggered by light rename", also_print=True)
-                refresh_light_list(scene)
+    if any(depsgraph.id_type_updated(t) for t in ["OBJECT", "LIGHT", "MATERIAL", "COLLECTION"]):
+        if prefs.auto_refresh_light_list:
+            # A light has been added or changed, only look at the objects that were updated
+            if not update_light_list(scene, depsgraph):
+                tag_refresh_light_list(scene, "depsgraph update", postpone=True)
                 return
+        else:
+            # The registry wasn't patched, so the next ensure_light_list (e.g. from apply_exposure) rescans the scene
+            _trusted_scenes.discard(scene.as_pointer())
 
     # Keep background mix node blend mode in sync when it should be.
     if depsgraph_update_includes_all(depsgraph, ["WORLD", "NODETREE"]):
@@ -727,6 +2675,66 @@ def depsgraph_update_post_handler(scene, depsgraph):
                 bn.blend_type = n.blend_type
 
 
+def is_animation_playing():
+    windows = bpy.context.window_manager.windows if bpy.context.window_manager else []
+    return any(window.screen.is_animation_playing for window in windows if window.screen)
+
+
+def suspend_depsgraph_handler(scene, depsgraph):
+    """Remember which scene and which kinds of IDs changed, so resume_depsgraph_handler can catch up later"""
+    _suspended_scenes.add(scene.name)
+    for id_type in ["LIGHT", "MATERIAL", "NODETREE", "COLLECTION"]:
+        if depsgraph.id_type_updated(id_type):
+            _suspended_types.add(id_type)
+    if not bpy.app.timers.is_registered(resume_depsgraph_handler):
+        bpy.app.timers.register(resume_depsgraph_handler, first_interval=0.5)
+
+
+def resume_depsgraph_handler():
+    """Timer callback that flushes the work skipped during playback or rendering, once both have stopped"""
+    if _rendering or is_animation_playing():
+        return 0.5
+
+    invalidate_visibility_filter()
+    if _suspended_types & {"LIGHT", "MATERIAL", "NODETREE"}:
+        invalidate_emission_cache()
+    prefs = bpy.context.preferences.addons[__package__].preferences
+    for name in _suspended_scenes:
+        scene = bpy.data.scenes.get(name)
+        if scene is None:
+            continue
+        # Animated transforms don't affect the light list, only rescan if lights may have been added or changed
+        if _suspended_types or len(scene.objects) != _object_counts.get(scene.as_pointer()):
+            invalidate_data_users()
+            untrust_light_list(scene)
+            if prefs.auto_refresh_light_list:
+                tag_refresh_light_list(scene, "changes during playback or rendering", postpone=True)
+    _suspended_scenes.clear()
+    _suspended_types.clear()
+    return None
+
+
+@persistent
+def render_init_handler(*args):
+    global _rendering
+    _rendering = True
+
+
+@persistent
+def render_done_handler(*args):
+    global _rendering
+    _rendering = False
+
+
+@persistent
+def undo_redo_post_handler(*args):
+    # Undo restores an older light registry that may not match what we've been tracking
+    untrust_light_list()
+    invalidate_emission_cache()
+    invalidate_data_users()
+    invalidate_visibility_filter()
+
+
 # World vis functions
 
 
@@ -904,6 +2912,7 @@ def path_contains(parent, child):
     return os.path.normcase(os.path.normpath(child)).startswith(os.path.normcase(os.path.normpath(parent)))
 
 
+@profile("detect_hdris")
 def detect_hdris(self, context):
 
     log("FN: Detect HDRIs")
@@ -1048,6 +3057,23 @@ def get_variation(hdri, mode=None, var=None):
         return "ERROR: Unsupported mode!"
 
 
+def get_world_hdri(world):
+    """
+    Return the name and file path of the HDRI that the world's HDRI handler uses, read from its nodes so that it
+    works before the HDRI enums have any items. The name is empty if the file isn't one of the detected HDRIs
+    """
+    if not (world and world.gaf_hdri_props.hdri_handler_enabled and world.use_nodes and world.node_tree):
+        return "", ""
+    node = world.node_tree.nodes.get("HDRIHandler_ShaderNodeTexEnvironment")
+    if node is None or node.image is None:
+        return "", ""
+    path = node.image.filepath
+    for name, variations in const.hdri_list.items():
+        if any(paths_are_equal(path, v) for v in variations):
+            return name, path
+    return "", path
+
+
 def handler_node(context, t, background=False, fetch_only=False):
     def warmth_node(context):
         group_name = "Warmth (Gaffer)"
@@ -1263,6 +3289,7 @@ def new_link(links, from_socket, to_socket, force=False):
         links.new(from_socket, to_socket)
 
 
+@profile("switch_hdri")
 def switch_hdri(self, context):
     gaf_hdri_props = context.scene.world.gaf_hdri_props
     if gaf_hdri_props.hdri != "":
@@ -1279,6 +3306,7 @@ def switch_hdri(self, context):
     show_hdrihaven()
 
 
+@profile("setup_hdri")
 def setup_hdri(self, context):
     gaf_props = context.scene.gaf_props
     gaf_hdri_props = context.scene.world.gaf_hdri_props
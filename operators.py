@@ -19,18 +19,23 @@
 import bpy
 import blf
 import gpu
+import json
 import os
 from gpu_extras.batch import batch_for_shader
 from math import pi, cos, sin, ceil
 from mathutils import Vector, Matrix
 from bpy_extras.view3d_utils import location_3d_to_region_2d
 from bpy.app.handlers import persistent
-from bpy_extras.io_utils import ImportHelper
-from time import sleep
+from bpy_extras.io_utils import ImportHelper, ExportHelper
+from time import sleep, perf_counter
 from subprocess import run
+from threading import Thread
+import shutil
+import tempfile
 
 from . import constants as const
 from . import functions as fn
+from . import batch
 
 
 @persistent
@@ -52,6 +57,15 @@ def load_handler(dummy):
     bpy.context.scene.gaf_props.IsShowingRadius = False
     bpy.context.scene.gaf_props.IsShowingLabel = False
 
+    # Files saved with older versions of Gaffer store the light list as a string
+    fn.untrust_light_list()
+    fn.invalidate_emission_cache()
+    fn.invalidate_data_users()
+    fn.invalidate_visibility_filter()
+    for scene in bpy.data.scenes:
+        fn.migrate_legacy_light_list(scene)
+        fn.end_batch_edit(scene)  # The file may have been saved during a batch edit
+
 
 class GAFFER_OT_rename(bpy.types.Operator):
     "Rename this light"
@@ -132,7 +146,7 @@ class GAFFER_OT_set_strength(bpy.types.Operator):
             socket.default_value = socket.default_value * self.mult
         else:
             light.data.energy = light.data.energy * self.mult
-        return {"FINISHED"}
+        return fn.finish_edit(context)
 
 
 class GAFFER_OT_set_temp(bpy.types.Operator):
@@ -154,7 +168,7 @@ class GAFFER_OT_set_temp(bpy.types.Operator):
         else:
             node = bpy.data.materials[self.material].node_tree.nodes[self.node]
         node.inputs[0].links[0].from_node.inputs[0].default_value = const.col_temp[self.temperature]
-        return {"FINISHED"}
+        return fn.finish_edit(context)
 
 
 class GAFFER_OT_show_temp_list(bpy.types.Operator):
@@ -229,23 +243,11 @@ class GAFFER_OT_hide_show_light(bpy.types.Operator):
             light.hide_viewport = self.hide
             light.hide_render = self.hide
         else:
-            if dataname.startswith("LIGHT"):
-                # actual data name (minus the prepended 'LIGHT')
-                data = bpy.data.lights[(dataname[5:])]
-                for obj in bpy.data.objects:
-                    if obj.data == data:
-                        obj.hide_viewport = self.hide
-                        obj.hide_render = self.hide
-            else:
-                # actual data name (minus the prepended 'MAT')
-                mat = bpy.data.materials[(dataname[3:])]
-                for obj in bpy.data.objects:
-                    if obj.type == "MESH":
-                        for slot in obj.material_slots:
-                            if slot.material == mat:
-                                obj.hide_viewport = self.hide
-                                obj.hide_render = self.hide
-        return {"FINISHED"}
+            for obj in fn.get_dataname_users(dataname):
+                if obj.type in {"LIGHT", "MESH"}:
+                    obj.hide_viewport = self.hide
+                    obj.hide_render = self.hide
+        return fn.finish_edit(context)
 
 
 class GAFFER_OT_select_light(bpy.types.Operator):
@@ -271,23 +273,12 @@ class GAFFER_OT_select_light(bpy.types.Operator):
             obj.select_set(True)
             context.view_layer.objects.active = obj
         else:
-            if dataname.startswith("LIGHT"):
-                # actual data name (minus the prepended 'LIGHT')
-                data = bpy.data.lights[(dataname[5:])]
-                for obj in bpy.data.objects:
-                    if obj.data == data:
-                        obj.select_set(True)
-            else:
-                # actual data name (minus the prepended 'MAT')
-                mat = bpy.data.materials[(dataname[3:])]
-                for obj in bpy.data.objects:
-                    if obj.type == "MESH":
-                        for slot in obj.material_slots:
-                            if slot.material == mat:
-                                obj.select_set(True)
+            for obj in fn.get_dataname_users(dataname):
+                if obj.type in {"LIGHT", "MESH"}:
+                    obj.select_set(True)
             context.view_layer.objects.active = bpy.data.objects[self.light]
 
-        return {"FINISHED"}
+        return fn.finish_edit(context)
 
 
 class GAFFER_OT_solo(bpy.types.Operator):
@@ -303,90 +294,128 @@ class GAFFER_OT_solo(bpy.types.Operator):
     dataname: bpy.props.StringProperty(default="__EXIT_SOLO__")
 
     def execute(self, context):
-        light = self.light
-        showhide = self.showhide
-        worldsolo = self.worldsolo
-        scene = context.scene
-        blacklist = context.scene.gaf_props.Blacklist
-
         # Get object names that share data with the solo'd object:
         dataname = self.dataname
         linked_lights = []
 
         # Only make list if going into Solo and obj has multiple users
-        if dataname not in ["__SINGLE_USER__", "__EXIT_SOLO__"] and showhide:
-            if dataname.startswith("LIGHT"):
-                # actual data name (minus the prepended 'LIGHT')
-                data = bpy.data.lights[(dataname[5:])]
-                for obj in bpy.data.objects:
-                    if obj.data == data:
-                        linked_lights.append(obj.name)
-            else:
-                # actual data name (minus the prepended 'MAT')
-                mat = bpy.data.materials[(dataname[3:])]
-                for obj in bpy.data.objects:
-                    if obj.type == "MESH":
-                        for slot in obj.material_slots:
-                            if slot.material == mat:
-                                linked_lights.append(obj.name)
-
-        statelist = fn.stringToNestedList(scene.gaf_props.LightsHiddenRecord, True)
-
-        if showhide:  # Enter Solo mode
-            fn.refresh_light_list(scene)
-            scene.gaf_props.SoloActive = light
-            fn.getHiddenStatus(scene, fn.stringToNestedList(scene.gaf_props.Lights, True))
-            for l in statelist:  # first check if lights still exist
-                if l[0] != "WorldEnviroLight":
-                    try:
-                        obj = bpy.data.objects[l[0]]
-                    except KeyError:
-                        # TODO not sure if this ever happens, if it does, doesn't it break?
-                        fn.getHiddenStatus(scene, fn.stringToNestedList(scene.gaf_props.Lights, True))
-                        bpy.ops.gaffer.solo()
-                        # If one of the lights has been deleted/changed, update the list and dont restore visibility
-                        return {"FINISHED"}
-
-            for l in statelist:  # then restore visibility
-                if l[0] != "WorldEnviroLight":
-                    obj = bpy.data.objects[l[0]]
-                    if obj.name not in blacklist:
-                        if obj.name == light or obj.name in linked_lights:
-                            obj.hide_viewport = False
-                            obj.hide_render = False
-                        else:
-                            obj.hide_viewport = True
-                            obj.hide_render = True
+        if dataname not in ["__SINGLE_USER__", "__EXIT_SOLO__"] and self.showhide:
+            linked_lights = [obj.name for obj in fn.get_dataname_users(dataname) if obj.type in {"LIGHT", "MESH"}]
+
+        prefs = context.preferences.addons[__package__].preferences
+        fn.set_solo(
+            context.scene,
+            self.light,
+            self.showhide,
+            self.worldsolo,
+            linked_lights,
+            use_light_linking=prefs.solo_method == "LIGHT_LINKING",
+        )
+        return fn.finish_edit(context)
+
+
+def batch_edit_variant(cls):
+    """
+    Return a copy of this light editing operator for the panels to use during a batch edit. Its undo steps are in the
+    batch edit undo group, which Blender merges into the previous step when that is in the same group
+    """
+    namespace = {k: v for k, v in cls.__dict__.items() if k not in {"__dict__", "__weakref__"}}
+    namespace["__annotations__"] = dict(cls.__annotations__)
+    namespace["bl_idname"] = cls.bl_idname + "_batch"
+    namespace["bl_options"] = {"REGISTER", "UNDO_GROUPED"}  # UNDO would push a step of its own
+    namespace["bl_undo_group"] = const.batch_edit_undo_group
+    return type(cls.__name__ + "_batch", cls.__bases__, namespace)
+
+
+GAFFER_OT_set_strength_batch = batch_edit_variant(GAFFER_OT_set_strength)
+GAFFER_OT_set_temp_batch = batch_edit_variant(GAFFER_OT_set_temp)
+GAFFER_OT_hide_show_light_batch = batch_edit_variant(GAFFER_OT_hide_show_light)
+GAFFER_OT_select_light_batch = batch_edit_variant(GAFFER_OT_select_light)
+GAFFER_OT_solo_batch = batch_edit_variant(GAFFER_OT_solo)
 
-            if context.scene.render.engine == "CYCLES":
-                if worldsolo:
-                    if not scene.gaf_props.WorldVis:
-                        scene.gaf_props.WorldVis = True
-                else:
-                    if scene.gaf_props.WorldVis:
-                        scene.gaf_props.WorldVis = False
-
-        else:  # Exit solo
-            oldlight = scene.gaf_props.SoloActive
-            scene.gaf_props.SoloActive = ""
-            for l in statelist:
-                if l[0] != "WorldEnviroLight":
-                    try:
-                        obj = bpy.data.objects[l[0]]
-                    except KeyError:
-                        # TODO not sure if this ever happens, if it does, doesn't it break?
-                        fn.refresh_light_list(scene)
-                        fn.getHiddenStatus(scene, fn.stringToNestedList(scene.gaf_props.Lights, True))
-                        scene.gaf_props.SoloActive = oldlight
-                        bpy.ops.gaffer.solo()
-                        return {"FINISHED"}
-                    if obj.name not in blacklist:
-                        obj.hide_viewport = fn.castBool(l[1])
-                        obj.hide_render = fn.castBool(l[2])
-                elif context.scene.render.engine == "CYCLES":
-                    scene.gaf_props.WorldVis = fn.castBool(l[1])
-                    scene.gaf_props.WorldReflOnly = fn.castBool(l[2])
 
+class GAFFER_OT_batch_edit_begin(bpy.types.Operator):
+    (
+        "Start a batch edit: hiding, soloing, selecting and changing the strength or temperature of lights with the "
+        "Gaffer buttons adds a single undo step for all of them, until the batch edit is committed or discarded.\n"
+        "Any other undo step (e.g. dragging a value in the panel or moving a light) starts a new one"
+    )
+
+    bl_idname = "gaffer.batch_edit_begin"
+    bl_label = "Batch Edit"
+    bl_options = {"REGISTER", "UNDO"}  # Keeps the edits from merging with those of the previous batch edit
+
+    @classmethod
+    def poll(cls, context):
+        return not context.scene.gaf_props.BatchEditActive
+
+    def execute(self, context):
+        gaf_props = context.scene.gaf_props
+        gaf_props.BatchEditSnapshot = fn.capture_snapshot(context.scene)
+        gaf_props.BatchEditSolo = gaf_props.SoloActive
+        gaf_props.BatchEditCount = 0
+        gaf_props.BatchEditActive = True
+        return {"FINISHED"}
+
+
+class GAFFER_OT_batch_edit_commit(bpy.types.Operator):
+    (
+        "Finish the batch edit, keeping its edits. They're one undo step, unless something else added an undo step "
+        "in between (e.g. dragging a value in the panel or moving a light), which splits them at that point"
+    )
+
+    bl_idname = "gaffer.batch_edit_commit"
+    bl_label = "Commit Batch Edit"
+    bl_options = {"REGISTER", "UNDO_GROUPED"}
+    bl_undo_group = const.batch_edit_undo_group
+
+    @classmethod
+    def poll(cls, context):
+        return context.scene.gaf_props.BatchEditActive
+
+    def execute(self, context):
+        fn.end_batch_edit(context.scene)
+        return {"FINISHED"}
+
+
+class GAFFER_OT_batch_edit_discard(bpy.types.Operator):
+    "Finish the batch edit, setting the lights back to how they were before it started"
+
+    bl_idname = "gaffer.batch_edit_discard"
+    bl_label = "Discard"
+    bl_options = {"REGISTER", "UNDO"}
+
+    @classmethod
+    def poll(cls, context):
+        return context.scene.gaf_props.BatchEditActive
+
+    def execute(self, context):
+        scene = context.scene
+        gaf_props = scene.gaf_props
+        if gaf_props.SoloActive and gaf_props.SoloActive != gaf_props.BatchEditSolo:
+            fn.set_solo(scene)  # Exit the solo started in the batch edit first, it has its own record of the visibility
+        missing = fn.restore_snapshot(scene, gaf_props.BatchEditSnapshot)
+        fn.end_batch_edit(scene)
+        if missing:
+            self.report({"WARNING"}, "Couldn't restore " + ", ".join(missing))
+        return {"FINISHED"}
+
+
+class GAFFER_OT_lights_page(bpy.types.Operator):
+    "Show the next/previous page of lights"
+
+    bl_idname = "gaffer.lights_page"
+    bl_label = "Next/Previous Page"
+    bl_options = {"INTERNAL"}
+    do_next: bpy.props.BoolProperty()
+
+    def execute(self, context):
+        gaf_props = context.scene.gaf_props
+        prefs = context.preferences.addons[__package__].preferences
+        num_lights = len(fn.get_light_view(context.scene)["lights"])
+        num_pages = max(1, ceil(num_lights / prefs.lights_per_page)) if prefs.lights_per_page else 1
+        page = min(gaf_props.LightPage, num_pages - 1)
+        gaf_props.LightPage = (page + (1 if self.do_next else -1)) % num_pages
         return {"FINISHED"}
 
 
@@ -432,12 +461,22 @@ class GAFFER_OT_refresh_light_list(bpy.types.Operator):
     bl_idname = "gaffer.refresh_lights"
     bl_label = "Refresh Light List"
 
-    def execute(self, context):
-        scene = context.scene
-
-        fn.refresh_light_list(scene)
+    all_scenes: bpy.props.BoolProperty(
+        name="All Scenes",
+        default=False,
+        description="Refresh the light lists of all scenes in the file instead of only the current one",
+    )
 
-        self.report({"INFO"}, "Light list refreshed")
+    def execute(self, context):
+        fn.invalidate_emission_cache()  # In case of changes that weren't picked up by the depsgraph handler
+        for scene in bpy.data.scenes if self.all_scenes else [context.scene]:
+            scene.gaf_props.LightFingerprint = ""  # Force a full rescan
+        if self.all_scenes:
+            scenes = fn.refresh_all_light_lists()
+            self.report({"INFO"}, "Light lists of {} scenes refreshed".format(len(scenes)))
+        else:
+            fn.refresh_light_list(context.scene)
+            self.report({"INFO"}, "Light list refreshed")
         return {"FINISHED"}
 
 
@@ -460,20 +499,14 @@ class GAFFER_OT_set_light_data_user_names(bpy.types.Operator):
 
     def execute(self, context):
         data = getattr(bpy.data, self.data_type)[self.data_name]
+        users = fn.get_data_users(data)
 
         if self.set_object_names:
             i = 0
             to_rename = {}  # To avoid modifying object list while we're iterating over it
-            for obj in bpy.data.objects:
-                if self.data_type == "lights":
-                    if obj.data == data:
-                        i += 1
-                        to_rename[obj.name] = self.data_name + "." + str(i).zfill(3)
-                else:
-                    for slot in obj.material_slots:
-                        if slot.material == data:
-                            i += 1
-                            to_rename[obj.name] = self.data_name + "." + str(i).zfill(3)
+            for obj in users:
+                i += 1
+                to_rename[obj.name] = self.data_name + "." + str(i).zfill(3)
             for obj in to_rename:
                 if bpy.data.objects[obj].name != to_rename[obj]:
                     bpy.data.objects[obj].name = to_rename[obj]
@@ -484,15 +517,7 @@ class GAFFER_OT_set_light_data_user_names(bpy.types.Operator):
                 self.report({"ERROR"}, "No objects use this data")
                 return {"CANCELLED"}
         else:
-            objects = []
-            for obj in bpy.data.objects:
-                if self.data_type == "lights":
-                    if obj.data == data:
-                        objects.append(obj.name)
-                else:
-                    for slot in obj.material_slots:
-                        if slot.material == data:
-                            objects.append(obj.name)
+            objects = [obj.name for obj in users]
             if not objects:
                 self.report({"ERROR"}, "No objects use this data")
                 return {"CANCELLED"}
@@ -521,132 +546,208 @@ class GAFFER_OT_apply_exposure(bpy.types.Operator):
     bl_label = "Apply Exposure"
     bl_options = {"REGISTER", "UNDO"}
 
+    all_scenes: bpy.props.BoolProperty(
+        name="All Scenes",
+        default=False,
+        description="Apply the exposure of every scene in the file to its lights and world, instead of only this scene",
+    )
+
     @classmethod
     def poll(cls, context):
         return context.scene.render.engine in const.supported_renderers
 
     def execute(self, context):
-        scene = context.scene
-        fn.refresh_light_list(scene)
-        gaf_props = scene.gaf_props
-        lights_str = gaf_props.Lights
-        lights = fn.stringToNestedList(lights_str)
-
-        evs = scene.view_settings.exposure  # CM exposure is set in EVs/stops
-        exposure = pow(2, evs)  # Linear exposure adjustment
-
-        scene.view_settings.exposure = 0
-
-        # Almost all of this is copy pasted from ui.draw_cycles_eevee_UI.
-        # TODO make a function for finding the strength property.
-        # Store list of completed sockets to avoid duplicate work on multi-user data
-        completed_lights = []
-        for item in lights:
-            if item[0] != "":
-                light = scene.objects[item[0][1:-1]]  # drop the apostrophes
-                if light.type == "LIGHT":
-                    if light in completed_lights:
-                        continue
-                    light.data.energy *= exposure
-                    completed_lights.append(light)
-                else:
-                    use_nodes = True
-                    material = bpy.data.materials[item[1][1:-1]]
-                    if material.use_nodes:
-                        node_strength = material.node_tree.nodes[item[2][1:-1]]
-                    else:
-                        use_nodes = False
+        if self.all_scenes:
+            scenes = [s for s in bpy.data.scenes if s.render.engine in const.supported_renderers]
+        else:
+            scenes = [context.scene]
 
-                    if use_nodes:
-                        if item[3].startswith("'"):
-                            socket_strength_str = str(item[3][1:-1])
-                        else:
-                            socket_strength_str = str(item[3])
-
-                        if socket_strength_str.startswith("o"):
-                            socket_strength_type = "o"
-                            socket_strength = int(socket_strength_str[1:])
-                        elif socket_strength_str.startswith("i"):
-                            socket_strength_type = "i"
-                            socket_strength = int(socket_strength_str[1:])
-                        else:
-                            socket_strength_type = "i"
-                            socket_strength = int(socket_strength_str)
-
-                        strength_sockets = node_strength.inputs
-                        if socket_strength_type == "o":
-                            strength_sockets = node_strength.outputs
-                        try:
-                            skt = strength_sockets[socket_strength]
-                            if skt in completed_lights:
-                                continue
-                            if (
-                                (socket_strength_type == "i" and not skt.is_linked)
-                                or (socket_strength_type == "o" and skt.is_linked)
-                            ) and hasattr(skt, "default_value"):
-                                strength_sockets[socket_strength].default_value *= exposure
-                                completed_lights.append(skt)
-                            else:
-                                self.report(
-                                    {"ERROR"},
-                                    item[0] + " does not have a valid node. Try refreshing the light list.",
-                                )
-                        except (KeyError, IndexError, AttributeError):
-                            self.report(
-                                {"ERROR"},
-                                item[0] + " does not have a valid node. Try refreshing the light list.",
-                            )
-                    else:
-                        self.report(
-                            {"WARNING"},
-                            item[0] + " does not use nodes and can't be adjusted.",
-                        )
+        for name, problem in fn.apply_exposure(scenes):
+            if problem == "SHARED_DATA":
+                self.report({"WARNING"}, name + " shares lights with a scene with a different exposure, skipped it.")
+            elif problem == "NO_NODES":
+                self.report({"WARNING"}, name + " does not use nodes and can't be adjusted.")
+            else:
+                self.report({"ERROR"}, name + " does not have a valid node. Try refreshing the light list.")
+        return {"FINISHED"}
+
+
+class GAFFER_OT_bulk_strength(bpy.types.Operator):
+    "Change the strength of many lights at once"
+
+    bl_idname = "gaffer.bulk_strength"
+    bl_label = "Bulk Strength"
+    bl_options = {"REGISTER", "UNDO"}
+
+    scope: bpy.props.EnumProperty(name="Lights", items=const.bulk_scopes, default="SELECTED")
+    mode: bpy.props.EnumProperty(
+        name="Mode",
+        items=(
+            ("STOPS", "Stops", "Multiply the strength by 2 to the power of the value, like exposure"),
+            ("MULTIPLY", "Multiply", "Multiply the strength by the value"),
+            ("OFFSET", "Offset", "Add the value to the strength"),
+        ),
+        default="STOPS",
+    )
+    value: bpy.props.FloatProperty(name="Value", default=1)
+
+    def execute(self, context):
+        records = fn.get_bulk_targets(context, self.scope)
+        if not records:
+            self.report({"WARNING"}, "No lights to change")
+            return {"CANCELLED"}
 
-        # World
-        gaf_hdri_props = scene.world.gaf_hdri_props
-        if gaf_hdri_props.hdri_handler_enabled:
-            gaf_hdri_props.hdri_brightness = gaf_hdri_props.hdri_brightness + evs
-            if gaf_hdri_props.hdri_use_separate_brightness:
-                gaf_hdri_props.hdri_background_brightness = gaf_hdri_props.hdri_background_brightness + evs
+        if self.mode == "STOPS":
+            skipped = fn.bulk_set_strength(records, factor=pow(2, self.value))
+        elif self.mode == "MULTIPLY":
+            skipped = fn.bulk_set_strength(records, factor=self.value)
         else:
-            world = scene.world
-            if world.use_nodes:
-                backgrounds = []  # make a list of all linked Background shaders, use the right-most one
-                background = None
-                for node in world.node_tree.nodes:
-                    if node.type == "BACKGROUND":
-                        if not node.name.startswith("HDRIHandler_"):
-                            if node.outputs[0].is_linked:
-                                backgrounds.append(node)
-                if backgrounds:
-                    background = sorted(backgrounds, key=lambda x: x.location.x, reverse=True)[0]
-                    # Strength
-                    if background.inputs[1].is_linked:
-                        strength_node = None
-                        current_node = background.inputs[1].links[0].from_node
-                        temp_current_node = None
-                        # Failsafe in case of infinite loop (which can happen from accidental cyclic links)
-                        i = 0
-                        while strength_node is None and i < 1000:  # limitted to 100 chained nodes
-                            i += 1
-                            if temp_current_node:
-                                current_node = temp_current_node
-                            for socket in current_node.inputs:
-                                # stop at first node with an unconnected Value socket
-                                if socket.type == "VALUE" and not socket.is_linked:
-                                    strength_node = current_node
-                                else:
-                                    if socket.is_linked:
-                                        temp_current_node = socket.links[0].from_node
-
-                        if strength_node:
-                            for socket in strength_node.inputs:
-                                if socket.type == "VALUE" and not socket.is_linked:  # use first color socket
-                                    socket.default_value = socket.default_value * exposure
-                                    break
-                    else:
-                        background.inputs[1].default_value = background.inputs[1].default_value * exposure
+            skipped = fn.bulk_set_strength(records, offset=self.value)
+        if skipped:
+            self.report({"WARNING"}, "No valid strength node: " + ", ".join(skipped))
+        return {"FINISHED"}
+
+
+class GAFFER_OT_bulk_temperature(bpy.types.Operator):
+    "Set the color temperature of many lights at once"
+
+    bl_idname = "gaffer.bulk_temperature"
+    bl_label = "Bulk Color Temperature"
+    bl_options = {"REGISTER", "UNDO"}
+
+    scope: bpy.props.EnumProperty(name="Lights", items=const.bulk_scopes, default="SELECTED")
+    temperature: bpy.props.FloatProperty(name="Temperature", default=6500, min=800, max=12000, precision=0)
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def execute(self, context):
+        records = fn.get_bulk_targets(context, self.scope)
+        if not records:
+            self.report({"WARNING"}, "No lights to change")
+            return {"CANCELLED"}
+
+        skipped = fn.bulk_set_temperature(records, self.temperature)
+        if skipped:
+            self.report({"WARNING"}, "Couldn't find the color of " + ", ".join(skipped))
+        return {"FINISHED"}
+
+
+class GAFFER_OT_bulk_radius(bpy.types.Operator):
+    "Scale the size of many lights at once"
+
+    bl_idname = "gaffer.bulk_radius"
+    bl_label = "Bulk Scale Size"
+    bl_options = {"REGISTER", "UNDO"}
+
+    scope: bpy.props.EnumProperty(name="Lights", items=const.bulk_scopes, default="SELECTED")
+    factor: bpy.props.FloatProperty(name="Factor", default=1, min=0)
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def execute(self, context):
+        records = fn.get_bulk_targets(context, self.scope)
+        if not records:
+            self.report({"WARNING"}, "No lights to change")
+            return {"CANCELLED"}
+
+        fn.bulk_scale_radius(records, self.factor)
+        return {"FINISHED"}
+
+
+class GAFFER_OT_bulk_falloff(bpy.types.Operator):
+    "Set the falloff of many lights at once"
+
+    bl_idname = "gaffer.bulk_falloff"
+    bl_label = "Bulk Falloff"
+    bl_options = {"REGISTER", "UNDO"}
+
+    scope: bpy.props.EnumProperty(name="Lights", items=const.bulk_scopes, default="SELECTED")
+    falloff: bpy.props.EnumProperty(
+        name="Falloff",
+        items=(
+            ("constant", "Constant", "No light falloff"),
+            ("linear", "Linear", "Fade light strength linearly over the distance it travels"),
+            (
+                "quadratic",
+                "Quadratic",
+                "(Realisic) Light strength is inversely proportional to the square of the distance it travels",
+            ),
+        ),
+        default="quadratic",
+    )
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def execute(self, context):
+        records = fn.get_bulk_targets(context, self.scope)
+        if not records:
+            self.report({"WARNING"}, "No lights to change")
+            return {"CANCELLED"}
+
+        skipped = fn.bulk_set_falloff(records, self.falloff)
+        if skipped:
+            self.report({"WARNING"}, "Only lights that use nodes have a falloff, skipped " + ", ".join(skipped))
+        return {"FINISHED"}
+
+
+class GAFFER_OT_light_group_add(bpy.types.Operator):
+    "Make a light group with a master strength and color that drive all of its lights"
 
+    bl_idname = "gaffer.light_group_add"
+    bl_label = "New Light Group"
+    bl_options = {"REGISTER", "UNDO"}
+
+    scope: bpy.props.EnumProperty(name="Lights", items=const.bulk_scopes, default="SELECTED")
+    group_name: bpy.props.StringProperty(name="Name", default="Group")
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def execute(self, context):
+        scene = context.scene
+        records = fn.get_bulk_targets(context, self.scope)
+        if not records:
+            self.report({"WARNING"}, "No lights to group")
+            return {"CANCELLED"}
+
+        groups = scene.gaf_props.LightGroups
+        name = self.group_name or "Group"
+        i = 1
+        while name in groups:
+            i += 1
+            name = "{} {}".format(self.group_name or "Group", i)
+        group = groups.add()
+        group.name = name
+
+        skipped = fn.add_to_light_group(scene, group, records)
+        if not group.members:
+            groups.remove(len(groups) - 1)
+            self.report({"WARNING"}, "None of these lights can be driven by a group")
+            return {"CANCELLED"}
+        if skipped:
+            self.report({"WARNING"}, "Already in a group or driven, or no valid strength node: " + ", ".join(skipped))
+        return {"FINISHED"}
+
+
+class GAFFER_OT_light_group_remove(bpy.types.Operator):
+    "Remove this light group, its lights keep the strength and color they have now"
+
+    bl_idname = "gaffer.light_group_remove"
+    bl_label = "Remove Light Group"
+    bl_options = {"REGISTER", "UNDO"}
+
+    group: bpy.props.StringProperty()
+
+    def execute(self, context):
+        group = context.scene.gaf_props.LightGroups.get(self.group)
+        if group is None:
+            return {"CANCELLED"}
+        skipped = fn.remove_light_group(context.scene, group)
+        if skipped:
+            self.report({"WARNING"}, "Light data or material no longer exists: " + ", ".join(skipped))
         return {"FINISHED"}
 
 
@@ -720,26 +821,15 @@ class GAFFER_OT_aim_light(bpy.types.Operator):
 
     target_type: bpy.props.StringProperty()
 
-    def aim(self, context, obj, target=[0, 0, 0]):
-        # Thanks to @kilbee for cleaning my crap up here :) See: https://github.com/gregzaal/Gaffer/commit/b920092
-        obj_loc = obj.matrix_world.to_translation()
-        direction = target - obj_loc
-        # point obj '-Z' and use its 'Y' as up
-        rot_quat = direction.to_track_quat("-Z", "Y")
-        if obj.rotation_mode == "QUATERNION":
-            obj.rotation_quaternion = rot_quat
-        else:
-            obj.rotation_euler = rot_quat.to_euler()
-
     def execute(self, context):
+        scene = context.scene
         if self.target_type == "CURSOR":
             # Aim all selected objects at cursor
             objects = context.selected_editable_objects
             if not objects:
                 self.report({"ERROR"}, "No selected objects!")
                 return {"CANCELLED"}
-            for obj in context.selected_editable_objects:
-                self.aim(context, obj, context.scene.cursor.location)
+            fn.aim_objects(scene, objects, scene.cursor.location[:])
 
             return {"FINISHED"}
 
@@ -759,27 +849,15 @@ class GAFFER_OT_aim_light(bpy.types.Operator):
                     self.report({"ERROR"}, "No selected objects!")
                 return {"CANCELLED"}
 
-            total_x = 0
-            total_y = 0
-            total_z = 0
-
-            for obj in objects:
-                total_x += obj.location.x
-                total_y += obj.location.y
-                total_z += obj.location.z
-
-            avg_x = total_x / num_objects
-            avg_y = total_y / num_objects
-            avg_z = total_z / num_objects
-
-            self.aim(context, active, Vector((avg_x, avg_y, avg_z)))
+            locations = fn.get_world_locations(scene, objects)
+            fn.aim_objects(scene, [active], [sum(loc[i] for loc in locations) / num_objects for i in range(3)])
 
             return {"FINISHED"}
 
         elif self.target_type == "ACTIVE":
             # Aim the selected objects at the active object
             active = context.view_layer.objects.active
-            objects = [obj for obj in context.selected_objects if obj != active]
+            objects = [obj for obj in context.selected_editable_objects if obj != active]
             if not active:
                 self.report({"ERROR"}, "No active object!")
                 return {"CANCELLED"}
@@ -787,8 +865,23 @@ class GAFFER_OT_aim_light(bpy.types.Operator):
                 self.report({"ERROR"}, "No selected objects!")
                 return {"CANCELLED"}
 
-            for obj in objects:
-                self.aim(context, obj, active.location)
+            fn.aim_objects(scene, objects, active.matrix_world.to_translation()[:])
+
+            return {"FINISHED"}
+
+        elif self.target_type == "TARGETS":
+            # Aim each selected object at its own aim target
+            objects = [
+                obj
+                for obj in context.selected_editable_objects
+                if obj.GafferAimTarget and obj.GafferAimTarget.name in scene.objects
+            ]
+            if not objects:
+                self.report({"ERROR"}, "None of the selected objects have an aim target!")
+                return {"CANCELLED"}
+
+            targets = fn.get_world_locations(scene, [obj.GafferAimTarget for obj in objects])
+            fn.aim_objects(scene, objects, targets)
 
             return {"FINISHED"}
 
@@ -894,6 +987,7 @@ class GAFFER_OT_show_light_radius(bpy.types.Operator):
             bpy.types.SpaceView3D.draw_handler_remove(GAFFER_OT_show_light_radius._handle, "WINDOW")
         GAFFER_OT_show_light_radius._handle = None
 
+    @fn.profile("draw_callback_radius")
     def draw_callback_radius(self, context):
         scene = context.scene
         try:
@@ -904,7 +998,12 @@ class GAFFER_OT_show_light_radius(bpy.types.Operator):
         if not context.space_data.overlay.show_overlays:
             return
 
-        for item in self.objects:
+        blacklist = fn.get_visibility_filter(scene, context.view_layer)["blacklist"]
+        if scene.gaf_props.LightRadiusUseColor:
+            colors = fn.get_overlay_colors(self.objects)
+        else:
+            colors = [scene.gaf_props.DefaultRadiusColor] * len(self.objects)
+        for item, color in zip(self.objects, colors):
             gpu.state.blend_set("ALPHA")
             obj = item[0]
             if not scene.gaf_props.LightRadiusSelectedOnly or obj.select_get():
@@ -914,19 +1013,7 @@ class GAFFER_OT_show_light_radius(bpy.types.Operator):
                         if obj.data.type in ["POINT", "SUN", "SPOT"]:
                             # TODO check if this is still needed for Eevee
                             if scene.render.engine in const.supported_renderers:
-                                if obj in context.visible_objects and obj.name not in [
-                                    o.name for o in scene.gaf_props.Blacklist
-                                ]:
-                                    if scene.gaf_props.LightRadiusUseColor:
-                                        if item[1][0] == "BLACKBODY":
-                                            color = fn.convert_temp_to_RGB(item[1][1].inputs[0].default_value)
-                                        elif item[1][0] == "WAVELENGTH":
-                                            color = fn.convert_wavelength_to_RGB(item[1][1].inputs[0].default_value)
-                                        else:
-                                            color = item[1]
-                                    else:
-                                        color = scene.gaf_props.DefaultRadiusColor
-
+                                if obj.visible_get(viewport=context.space_data) and obj.name not in blacklist:
                                     if scene.gaf_props.LightRadiusXray:
                                         gpu.state.depth_test_set("ALWAYS")
 
@@ -1038,26 +1125,9 @@ class GAFFER_OT_show_light_radius(bpy.types.Operator):
                     if obj.data.type in ["POINT", "SUN", "SPOT"]:
                         color = scene.gaf_props.DefaultRadiusColor
                         if scene.render.engine == "CYCLES" and obj.data.use_nodes:
-                            nodes = obj.data.node_tree.nodes
-                            node_color = None
-                            emissions = []  # make a list of all linked Emission shaders, use the right-most one
-                            for node in nodes:
-                                if node.type == "EMISSION":
-                                    if node.outputs[0].is_linked:
-                                        emissions.append(node)
-                            if emissions:
-                                node_color = sorted(emissions, key=lambda x: x.location.x, reverse=True)[0]
-
-                                if not node_color.inputs[0].is_linked:
-                                    color = node_color.inputs[0].default_value
-                                else:
-                                    from_node = node_color.inputs[0].links[0].from_node
-                                    if from_node.type == "RGB":
-                                        color = from_node.outputs[0].default_value
-                                    elif from_node.type == "BLACKBODY":
-                                        color = ["BLACKBODY", from_node]
-                                    elif from_node.type == "WAVELENGTH":
-                                        color = ["WAVELENGTH", from_node]
+                            node_color = fn.get_light_color(obj.data.node_tree)
+                            if node_color is not None:
+                                color = node_color
                         else:
                             color = obj.data.color
 
@@ -1112,6 +1182,7 @@ class GAFFER_OT_show_light_label(bpy.types.Operator):
 
         return x, y + 3
 
+    @fn.profile("draw_callback_label")
     def draw_callback_label(self, context):
         scene = context.scene
 
@@ -1130,16 +1201,12 @@ class GAFFER_OT_show_light_label(bpy.types.Operator):
         except ValueError:
             shader = gpu.shader.from_builtin("UNIFORM_COLOR")  # Blender 4.0+
 
-        for item in self.objects:
+        blacklist = fn.get_visibility_filter(scene, context.view_layer)["blacklist"]
+        colors = fn.get_overlay_colors(self.objects)
+        for item, color in zip(self.objects, colors):
             gpu.state.blend_set("ALPHA")
             obj = item[0]
-            if obj in context.visible_objects and obj.name not in [o.name for o in scene.gaf_props.Blacklist]:
-                if item[1][0] == "BLACKBODY":
-                    color = fn.convert_temp_to_RGB(item[1][1].inputs[0].default_value)
-                elif item[1][0] == "WAVELENGTH":
-                    color = fn.convert_wavelength_to_RGB(item[1][1].inputs[0].default_value)
-                else:
-                    color = item[1]
+            if obj.visible_get(viewport=context.space_data) and obj.name not in blacklist:
 
                 region = context.region
                 rv3d = context.space_data.region_3d
@@ -1259,47 +1326,32 @@ class GAFFER_OT_show_light_label(bpy.types.Operator):
             self.objects = []
             for obj in scene.objects:
                 color = scene.gaf_props.DefaultLabelBGColor
-                nodes = None
+                node_tree = None
                 data = None
                 if obj.type == "LIGHT":
                     if obj.data.users > 1:
                         data = obj.data.name
                     if scene.render.engine == "CYCLES" and obj.data.use_nodes:
-                        nodes = obj.data.node_tree.nodes
+                        node_tree = obj.data.node_tree
                 elif scene.render.engine == "CYCLES" and obj.type == "MESH" and len(obj.material_slots) > 0:
                     for slot in obj.material_slots:
                         if slot.material:
                             if slot.material.use_nodes:
-                                if [node for node in slot.material.node_tree.nodes if node.type == "EMISSION"]:
-                                    nodes = slot.material.node_tree.nodes
+                                if fn.resolve_emission(slot.material.node_tree)["has_emission"]:
+                                    node_tree = slot.material.node_tree
                                     if slot.material.users > 1:
                                         data = slot.material.name
                                     break  # only use first emission material in slots
 
-                if nodes:
-                    node_color = None
-                    emissions = []  # make a list of all linked Emission shaders, use the right-most one
-                    for node in nodes:
-                        if node.type == "EMISSION" and node.name != "Emission Viewer":
-                            if node.outputs[0].is_linked:
-                                emissions.append(node)
-                    if emissions:
-                        node_color = sorted(emissions, key=lambda x: x.location.x, reverse=True)[0]
-
-                        if not node_color.inputs[0].is_linked:
-                            color = node_color.inputs[0].default_value
-                        else:
-                            from_node = node_color.inputs[0].links[0].from_node
-                            if from_node.type == "RGB":
-                                color = from_node.outputs[0].default_value
-                            elif from_node.type == "BLACKBODY":
-                                color = ["BLACKBODY", from_node]
-                            elif from_node.type == "WAVELENGTH":
-                                color = ["WAVELENGTH", from_node]
+                if node_tree:
+                    if fn.get_color_emission(node_tree):
+                        node_color = fn.get_light_color(node_tree)
+                        if node_color is not None:
+                            color = node_color
 
                         self.objects.append([obj, color, data])
 
-                if obj.type == "LIGHT" and not nodes:  # is a light but doesnt use_nodes
+                if obj.type == "LIGHT" and not node_tree:  # is a light but doesnt use_nodes
                     color = obj.data.color
                     self.objects.append([obj, color, data])
 
@@ -1343,6 +1395,7 @@ class GAFFER_OT_add_blacklisted(bpy.types.Operator):
             if obj.name not in existing:
                 item = blacklist.add()
                 item.name = obj.name
+        fn.invalidate_visibility_filter()
 
         context.scene.gaf_props.BlacklistIndex = len(context.scene.gaf_props.Blacklist) - 1
         return {"FINISHED"}
@@ -1364,6 +1417,7 @@ class GAFFER_OT_remove_blacklisted(bpy.types.Operator):
         index = context.scene.gaf_props.BlacklistIndex
 
         blist.remove(index)
+        fn.invalidate_visibility_filter()
 
         if index >= len(blist):
             context.scene.gaf_props.BlacklistIndex = len(blist) - 1
@@ -1371,6 +1425,180 @@ class GAFFER_OT_remove_blacklisted(bpy.types.Operator):
         return {"FINISHED"}
 
 
+class GAFFER_OT_snapshot_capture(bpy.types.Operator):
+    "Store the current strength, color, size and visibility of the lights and the world's HDRI settings as a snapshot"
+
+    bl_idname = "gaffer.snapshot_capture"
+    bl_label = "Capture"
+    bl_options = {"REGISTER", "UNDO"}
+
+    def execute(self, context):
+        gaf_props = context.scene.gaf_props
+        snapshots = gaf_props.Snapshots
+
+        i = len(snapshots) + 1
+        while "Snapshot " + str(i) in snapshots:
+            i += 1
+        snapshot = snapshots.add()
+        snapshot.name = "Snapshot " + str(i)
+        snapshot.data = fn.capture_snapshot(context.scene)
+
+        gaf_props.SnapshotIndex = len(snapshots) - 1
+        gaf_props.PreviousSnapshot = gaf_props.ActiveSnapshot
+        gaf_props.ActiveSnapshot = snapshot.name
+        return {"FINISHED"}
+
+
+class GAFFER_OT_snapshot_restore(bpy.types.Operator):
+    "Set the lights and the world's HDRI settings back to how they were in this snapshot"
+
+    bl_idname = "gaffer.snapshot_restore"
+    bl_label = "Restore"
+    bl_options = {"REGISTER", "UNDO"}
+
+    snapshot: bpy.props.StringProperty(default="", options={"HIDDEN"})  # The active list item if empty
+
+    @classmethod
+    def poll(cls, context):
+        return context.scene.gaf_props.Snapshots
+
+    def execute(self, context):
+        gaf_props = context.scene.gaf_props
+        snapshots = gaf_props.Snapshots
+        if self.snapshot:
+            snapshot = snapshots.get(self.snapshot)
+        else:
+            snapshot = snapshots[gaf_props.SnapshotIndex] if gaf_props.SnapshotIndex < len(snapshots) else None
+        if snapshot is None:
+            self.report({"ERROR"}, "Snapshot not found")
+            return {"CANCELLED"}
+
+        start = perf_counter()
+        missing = fn.restore_snapshot(context.scene, snapshot.data)
+        elapsed = (perf_counter() - start) * 1000
+
+        if snapshot.name != gaf_props.ActiveSnapshot:
+            gaf_props.PreviousSnapshot = gaf_props.ActiveSnapshot
+            gaf_props.ActiveSnapshot = snapshot.name
+        if missing:
+            self.report({"WARNING"}, "Couldn't restore " + ", ".join(missing))
+        else:
+            self.report({"INFO"}, "Restored {} in {:.1f} ms".format(snapshot.name, elapsed))
+        return {"FINISHED"}
+
+
+class GAFFER_OT_snapshot_swap(bpy.types.Operator):
+    "Switch back to the previous snapshot, to quickly compare two lighting variants"
+
+    bl_idname = "gaffer.snapshot_swap"
+    bl_label = "A/B"
+    bl_options = {"REGISTER", "UNDO"}
+
+    @classmethod
+    def poll(cls, context):
+        gaf_props = context.scene.gaf_props
+        return gaf_props.PreviousSnapshot in gaf_props.Snapshots
+
+    def execute(self, context):
+        return bpy.ops.gaffer.snapshot_restore(snapshot=context.scene.gaf_props.PreviousSnapshot)
+
+
+class GAFFER_OT_snapshot_remove(bpy.types.Operator):
+    "Remove the active snapshot"
+
+    bl_idname = "gaffer.snapshot_remove"
+    bl_label = "Remove"
+    bl_options = {"REGISTER", "UNDO"}
+
+    @classmethod
+    def poll(cls, context):
+        return context.scene.gaf_props.Snapshots
+
+    def execute(self, context):
+        gaf_props = context.scene.gaf_props
+        snapshots = gaf_props.Snapshots
+        index = gaf_props.SnapshotIndex
+
+        snapshots.remove(index)
+
+        if index >= len(snapshots):
+            gaf_props.SnapshotIndex = len(snapshots) - 1
+
+        return {"FINISHED"}
+
+
+class GAFFER_OT_rig_save(bpy.types.Operator):
+    "Save the selected lights as a rig preset, to add them to other shots later"
+
+    bl_idname = "gaffer.rig_save"
+    bl_label = "Save Rig"
+    bl_options = {"REGISTER"}
+
+    name: bpy.props.StringProperty(name="Name", default="Rig")
+    relative: bpy.props.BoolProperty(
+        name="Relative to Active Object",
+        description=(
+            "Store the light transforms relative to the active object, so that the rig follows it into other shots. "
+            "Otherwise they're stored in world space"
+        ),
+        default=True,
+    )
+    include_world: bpy.props.BoolProperty(
+        name="Include World",
+        description="Also store the HDRI settings of the world",
+        default=True,
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return any(obj.type == "LIGHT" for obj in context.selected_objects)
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def execute(self, context):
+        objects = [obj for obj in context.selected_objects if obj.type == "LIGHT"]
+        target = context.active_object if self.relative and context.active_object not in objects else None
+        rig = fn.capture_rig(context.scene, self.name, objects, target, self.include_world)
+        filepath = fn.save_rig(rig)
+        self.report({"INFO"}, "Saved {} lights to {}".format(len(rig["lights"]), filepath))
+        return {"FINISHED"}
+
+
+class GAFFER_OT_rig_apply(bpy.types.Operator):
+    "Add the lights of a rig preset to this scene, or update them if they're already here"
+
+    bl_idname = "gaffer.rig_apply"
+    bl_label = "Apply Rig"
+    bl_options = {"REGISTER", "UNDO"}
+
+    rig: bpy.props.EnumProperty(name="Rig", items=fn.rig_enum_items)
+    target: bpy.props.EnumProperty(name="Relative To", items=const.rig_targets, default="SAVED")
+
+    def execute(self, context):
+        scene = context.scene
+        if not self.rig:
+            self.report({"ERROR"}, "No rig presets saved yet")
+            return {"CANCELLED"}
+        rig = fn.load_rig(self.rig)
+
+        target = self.target
+        if target == "ACTIVE":
+            if context.active_object is None:
+                self.report({"ERROR"}, "No active object")
+                return {"CANCELLED"}
+            target = context.active_object.name
+        matrix = fn.get_rig_matrix(scene, rig, target)
+        if matrix is None:
+            self.report({"WARNING"}, "No '{}' in this scene, placed the rig at the world origin".format(rig["target"]))
+            matrix = fn.get_rig_matrix(scene, rig, "WORLD")
+
+        missing = fn.apply_rig(scene, rig, matrix)
+        if missing:
+            self.report({"WARNING"}, "Couldn't set up " + ", ".join(missing))
+        return {"FINISHED"}
+
+
 """HDRI Operators"""
 
 
@@ -1524,6 +1752,7 @@ class GAFFER_OT_hdri_thumb_gen(bpy.types.Operator):
             col.label(text="Large HDRI files were skipped last time.", icon="ERROR")
             col.label(text="You may wish to disable 'Skip big files', but first read its tooltip.")
 
+    @fn.profile("generate_thumb")
     def generate_thumb(self, name, files):
         chosen_file = ""
 
@@ -1829,6 +2058,120 @@ class GAFFER_OT_hdri_random(bpy.types.Operator):
         return {"FINISHED"}
 
 
+_contact_sheets = {}  # WorkerPool -> render directory, of the contact sheets that are being rendered
+
+
+def stop_contact_sheets():
+    """Kill the renders of the running contact sheets, e.g. before another file is loaded or Gaffer is disabled"""
+    for pool, render_dir in _contact_sheets.items():
+        pool.stop()
+        shutil.rmtree(render_dir, ignore_errors=True)
+    _contact_sheets.clear()
+
+
+@persistent
+def load_pre_handler(dummy):
+    stop_contact_sheets()
+
+
+class GAFFER_OT_lookdev_contact_sheet(bpy.types.Operator):
+    (
+        "Render the scene camera at low quality under each HDRI that matches the search and filters, or under each "
+        "snapshot, in background Blender processes, and tile the renders into one labelled image"
+    )
+
+    bl_idname = "gaffer.lookdev_contact_sheet"
+    bl_label = "Contact Sheet"
+
+    source: bpy.props.EnumProperty(name="Render Under", items=const.lookdev_sources, default="HDRIS")
+    width: bpy.props.IntProperty(name="Width", description="Width of each render in pixels", default=320, min=32)
+    samples: bpy.props.IntProperty(name="Samples", default=16, min=1)
+    workers: bpy.props.IntProperty(
+        name="Processes",
+        description="Number of Blender processes to render with, 0 for one per CPU core",
+        default=0,
+        min=0,
+    )
+
+    _timer = None
+
+    @classmethod
+    def poll(cls, context):
+        return context.scene.camera is not None
+
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def execute(self, context):
+        scene = context.scene
+        self.render_dir = tempfile.mkdtemp(prefix="gaffer_lookdev_")
+        filepath = os.path.join(self.render_dir, "scene.blend")
+        bpy.ops.wm.save_as_mainfile(filepath=filepath, copy=True)  # The workers render this copy, unsaved changes too
+        self.jobs = batch.lookdev_jobs(fn, filepath, scene, self.source, self.render_dir, self.width, self.samples)
+        if not self.jobs:
+            shutil.rmtree(self.render_dir, ignore_errors=True)
+            self.report({"WARNING"}, "Nothing to render, no {} found".format(self.source.lower()))
+            return {"CANCELLED"}
+
+        # The thread only uses these and not self, which becomes invalid if the operator is freed by loading a file
+        pool = self.pool = batch.WorkerPool(self.workers)
+        jobs = self.jobs
+        results = self.results = []
+        done = self.done = []
+        self.thread = Thread(target=lambda: results.extend(pool.run(jobs, on_result=done.append)))
+        self.thread.start()
+        _contact_sheets[pool] = self.render_dir
+        self.scene_pointer = scene.as_pointer()
+
+        fn.progress_begin(context)
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(0.5, window=context.window)
+        wm.modal_handler_add(self)
+        return {"RUNNING_MODAL"}
+
+    def modal(self, context, event):
+        if event.type == "ESC":
+            self.pool.cancel()  # Renders that already started finish first
+            return {"RUNNING_MODAL"}
+        if event.type != "TIMER":
+            return {"PASS_THROUGH"}
+
+        stopped = self.pool not in _contact_sheets  # See stop_contact_sheets
+        if not stopped:
+            fn.progress_update(context, len(self.done) / len(self.jobs), "Rendering contact sheet (Esc to stop)")
+            if self.thread.is_alive():
+                return {"PASS_THROUGH"}
+
+        context.window_manager.event_timer_remove(self._timer)
+        fn.progress_end(context)
+        _contact_sheets.pop(self.pool, None)
+        if stopped or not any(s.as_pointer() == self.scene_pointer for s in bpy.data.scenes):
+            shutil.rmtree(self.render_dir, ignore_errors=True)
+            self.report({"WARNING"}, "Contact sheet stopped, the scene it was rendering is gone")
+            return {"CANCELLED"}
+        rendered = [r for r in self.results if r and r["ok"]]
+        failed = [r for r in self.results if r and not r["ok"]]
+        name = bpy.path.display_name_from_filepath(bpy.data.filepath) or "untitled"
+        output = os.path.join(const.contact_sheet_dir, "{}_{}.png".format(name, self.source.lower()))
+        if not os.path.exists(const.contact_sheet_dir):
+            os.makedirs(const.contact_sheet_dir)
+        sheet = batch.assemble_contact_sheet([r["output"] for r in rendered], output)
+        shutil.rmtree(self.render_dir, ignore_errors=True)
+
+        if sheet is None:
+            self.report({"ERROR"}, "Nothing was rendered" + (": " + failed[0]["error"] if failed else ""))
+            return {"CANCELLED"}
+        for area in context.screen.areas:
+            if area.type == "IMAGE_EDITOR":
+                area.spaces.active.image = sheet
+                break
+        if failed:
+            self.report({"WARNING"}, "{} renders failed, first error: {}".format(len(failed), failed[0]["error"]))
+        else:
+            self.report({"INFO"}, "Saved contact sheet to " + output)
+        return {"FINISHED"}
+
+
 class GAFFER_OT_hdri_reset(bpy.types.Operator):
 
     (
@@ -2192,3 +2535,38 @@ class GAFFER_OT_debug_upload_logs(bpy.types.Operator):
 
     def invoke(self, context, event):
         return context.window_manager.invoke_props_dialog(self, width=round(300 * fn.dpifac()))
+
+
+class GAFFER_OT_debug_export_profile(bpy.types.Operator, ExportHelper):
+    "Save the recorded profiling timings as a JSON file"
+
+    bl_idname = "gaffer.dbg_export_profile"
+    bl_label = "Export Profile"
+    filename_ext = ".json"
+    filter_glob: bpy.props.StringProperty(default="*.json", options={"HIDDEN"})
+
+    def invoke(self, context, event):
+        self.filepath = const.profile_path
+        context.window_manager.fileselect_add(self)
+        return {"RUNNING_MODAL"}
+
+    def execute(self, context):
+        report = {
+            "blender_version": bpy.app.version_string,
+            "functions": fn.get_profile_report(),
+        }
+        with open(self.filepath, "w") as f:
+            f.write(json.dumps(report, indent=4))
+        self.report({"INFO"}, "Saved profile to " + self.filepath)
+        return {"FINISHED"}
+
+
+class GAFFER_OT_debug_reset_profile(bpy.types.Operator):
+    "Forget all recorded profiling timings"
+
+    bl_idname = "gaffer.dbg_reset_profile"
+    bl_label = "Reset Profile"
+
+    def execute(self, context):
+        fn.reset_profile()
+        return {"FINISHED"}
@@ -20,6 +20,7 @@ import bpy
 import os
 from . import addon_updater_ops
 from collections import OrderedDict
+from math import ceil
 
 from . import constants as const
 from . import functions as fn
@@ -39,6 +40,13 @@ def update_category(self, context):
 
 
 # UI stuff that's shown for all renderers
+def get_edit_op(op):
+    """Return the idname of this light editing operator, or of its copy for batch edits while a batch edit is running"""
+    if bpy.context.scene.gaf_props.BatchEditActive:
+        return op.bl_idname + "_batch"
+    return op.bl_idname
+
+
 def draw_renderer_independant(gaf_props, row, light, icons, users=[None, 1]):
 
     if bpy.context.scene.render.engine in const.supported_renderers:
@@ -90,7 +98,7 @@ def draw_renderer_independant(gaf_props, row, light, icons, users=[None, 1]):
         row.label(text=data_name)
 
     visop = row.operator(
-        ops.GAFFER_OT_hide_show_light.bl_idname,
+        get_edit_op(ops.GAFFER_OT_hide_show_light),
         text="",
         icon="%s" % "HIDE_ON" if light.hide_viewport else "HIDE_OFF",
         emboss=False,
@@ -102,7 +110,7 @@ def draw_renderer_independant(gaf_props, row, light, icons, users=[None, 1]):
     sub = row.column(align=True)
     sub.alert = light.select_get()
     selop = sub.operator(
-        ops.GAFFER_OT_select_light.bl_idname,
+        get_edit_op(ops.GAFFER_OT_select_light),
         text="",
         icon="%s" % "RESTRICT_SELECT_OFF" if light.select_get() else "RESTRICT_SELECT_ON",
         emboss=False,
@@ -112,7 +120,7 @@ def draw_renderer_independant(gaf_props, row, light, icons, users=[None, 1]):
 
     if gaf_props.SoloActive == "":
         sub = row.column(align=True)
-        solobtn = sub.operator(ops.GAFFER_OT_solo.bl_idname, icon="EVENT_S", text="", emboss=False)
+        solobtn = sub.operator(get_edit_op(ops.GAFFER_OT_solo), icon="EVENT_S", text="", emboss=False)
         solobtn.light = light.name
         solobtn.showhide = True
         solobtn.worldsolo = False
@@ -120,12 +128,65 @@ def draw_renderer_independant(gaf_props, row, light, icons, users=[None, 1]):
     elif gaf_props.SoloActive == light.name:
         sub = row.column(align=True)
         sub.alert = True
-        solobtn = sub.operator(ops.GAFFER_OT_solo.bl_idname, icon="EVENT_S", text="", emboss=False)
+        solobtn = sub.operator(get_edit_op(ops.GAFFER_OT_solo), icon="EVENT_S", text="", emboss=False)
         solobtn.light = light.name
         solobtn.showhide = False
         solobtn.worldsolo = False
 
 
+def draw_light_list_out_of_date(layout):
+    box = layout.box()
+    row = box.row(align=True)
+    row.label(text="Light list out of date")
+    if bpy.context.preferences.addons[__package__].preferences.auto_refresh_light_list:
+        fn.tag_refresh_light_list()  # We can't refresh the list here, so we queue it to run right after drawing
+    row.operator(ops.GAFFER_OT_refresh_light_list.bl_idname, icon="FILE_REFRESH", text="")
+
+
+def draw_light_filters(layout, gaf_props):
+    row = layout.row(align=True)
+    row.prop(gaf_props, "LightFilterName", text="", icon="VIEWZOOM")
+    sub = row.row(align=True)
+    sub.scale_x = 0.8
+    sub.prop(gaf_props, "LightFilterType", text="")
+    sub.prop(gaf_props, "LightSortOrder", text="", icon="SORTALPHA")
+
+
+def draw_light_groups(layout, gaf_props):
+    """Draw each light group as a single row with its master strength and color, and its lights when expanded"""
+    for group in gaf_props.LightGroups:
+        box = layout.box()
+        col = box.column(align=True)
+        row = col.row(align=True)
+        row.prop(group, "expanded", text="", icon="TRIA_DOWN" if group.expanded else "TRIA_RIGHT", emboss=False)
+        row.label(text="{} ({})".format(group.name, len(group.members)), icon="GROUP")
+        row.prop(group, "strength", text="")
+        row.prop(group, "color", text="")
+        row.operator(ops.GAFFER_OT_light_group_remove.bl_idname, text="", icon="X", emboss=False).group = group.name
+        if group.expanded:
+            for member in group.members:
+                row = col.row(align=True)
+                row.label(text="", icon="BLANK1")
+                op = row.operator(get_edit_op(ops.GAFFER_OT_select_light), text=member.name, emboss=False)
+                op.light = member.name
+                op.dataname = "__SINGLE_USER__"
+
+
+def draw_light_pages(layout, gaf_props, prefs, num_lights):
+    """Draw the page switcher if needed, and return the range of lights on the current page"""
+    per_page = prefs.lights_per_page
+    if not per_page or num_lights <= per_page:
+        return 0, num_lights
+    num_pages = ceil(num_lights / per_page)
+    page = min(gaf_props.LightPage, num_pages - 1)  # Can't write to LightPage here, the list may have shrunk
+
+    row = layout.row(align=True)
+    row.operator(ops.GAFFER_OT_lights_page.bl_idname, text="", icon="TRIA_LEFT").do_next = False
+    row.label(text="Page {} of {} ({} lights)".format(page + 1, num_pages, num_lights))
+    row.operator(ops.GAFFER_OT_lights_page.bl_idname, text="", icon="TRIA_RIGHT").do_next = True
+    return page * per_page, min((page + 1) * per_page, num_lights)
+
+
 def draw_cycles_eevee_UI(context, layout, lights):
     def draw_strength_cycles(col, light, material, node_strength, socket_strength_type, socket_strength):
         row = col.row(align=True)
@@ -148,7 +209,7 @@ def draw_cycles_eevee_UI(context, layout, lights):
                 (socket_strength_type == "i" and not strength_sockets[socket_strength].is_linked)
                 or (socket_strength_type == "o" and strength_sockets[socket_strength].is_linked)
             ) and hasattr(strength_sockets[socket_strength], "default_value"):
-                op = row.operator(ops.GAFFER_OT_set_strength.bl_idname, text="", icon="REMOVE")
+                op = row.operator(get_edit_op(ops.GAFFER_OT_set_strength), text="", icon="REMOVE")
                 op.light = light.name
                 op.node = node_strength.name
                 op.material = material.name if material else ""
@@ -156,7 +217,7 @@ def draw_cycles_eevee_UI(context, layout, lights):
                 op.socket_strength_type = socket_strength_type
                 op.increase = False
                 row.prop(strength_sockets[socket_strength], "default_value", text="Strength")
-                op = row.operator(ops.GAFFER_OT_set_strength.bl_idname, text="", icon="ADD")
+                op = row.operator(get_edit_op(ops.GAFFER_OT_set_strength), text="", icon="ADD")
                 op.light = light.name
                 op.node = node_strength.name
                 op.material = material.name if material else ""
@@ -177,7 +238,7 @@ def draw_cycles_eevee_UI(context, layout, lights):
             icon="LIGHT_%s" % light.data.type,
             icon_only=True,
         )
-        op = row.operator(ops.GAFFER_OT_set_strength.bl_idname, text="", icon="REMOVE")
+        op = row.operator(get_edit_op(ops.GAFFER_OT_set_strength), text="", icon="REMOVE")
         op.light = light.name
         op.node = ""
         op.material = ""
@@ -185,7 +246,7 @@ def draw_cycles_eevee_UI(context, layout, lights):
         op.socket_strength_type = ""
         op.increase = False
         row.prop(light.data, "energy", text="Strength")
-        op = row.operator(ops.GAFFER_OT_set_strength.bl_idname, text="", icon="ADD")
+        op = row.operator(get_edit_op(ops.GAFFER_OT_set_strength), text="", icon="ADD")
         op.light = light.name
         op.node = ""
         op.material = ""
@@ -193,21 +254,16 @@ def draw_cycles_eevee_UI(context, layout, lights):
         op.socket_strength_type = ""
         op.increase = True
 
-    def draw_color_cycles(gaf_props, i, icons, col, row, light, material):
+    def draw_color_cycles(gaf_props, i, icons, col, row, light, material, color_node_name):
         if light.type == "LIGHT":
-            nodes = light.data.node_tree.nodes
+            node_tree = light.data.node_tree
         else:
-            nodes = material.node_tree.nodes
+            node_tree = material.node_tree
         socket_color = 0
-        node_color = None
-        emissions = []  # make a list of all linked Emission shaders, use the right-most one
-        for node in nodes:
-            if node.type == "EMISSION":
-                if node.outputs[0].is_linked:
-                    emissions.append(node)
-        if emissions:
-            node_color = sorted(emissions, key=lambda x: x.location.x, reverse=True)[0]
-
+        node_color = node_tree.nodes.get(color_node_name) if color_node_name else None
+        if node_color is None or not node_color.inputs:
+            node_color = fn.get_color_emission(node_tree)
+        if node_color:
             if not node_color.inputs[socket_color].is_linked:
                 subcol = row.column(align=True)
                 subrow = subcol.row(align=True)
@@ -236,7 +292,7 @@ def draw_cycles_eevee_UI(context, layout, lights):
                         ordered_col_temps = OrderedDict(sorted(const.col_temp.items()))
                         for temp in ordered_col_temps:
                             op = col.operator(
-                                ops.GAFFER_OT_set_temp.bl_idname,
+                                get_edit_op(ops.GAFFER_OT_set_temp),
                                 text=temp[3:],
                                 icon_value=icons[str(const.col_temp[temp])].icon_id,
                             )
@@ -425,14 +481,14 @@ def draw_cycles_eevee_UI(context, layout, lights):
 
         if gaf_props.SoloActive == "":
             sub = row.column(align=True)
-            solobtn = sub.operator(ops.GAFFER_OT_solo.bl_idname, icon="EVENT_S", text="", emboss=False)
+            solobtn = sub.operator(get_edit_op(ops.GAFFER_OT_solo), icon="EVENT_S", text="", emboss=False)
             solobtn.light = "WorldEnviroLight"
             solobtn.showhide = True
             solobtn.worldsolo = True
         elif gaf_props.SoloActive == "WorldEnviroLight":
             sub = row.column(align=True)
             sub.alert = True
-            solobtn = sub.operator(ops.GAFFER_OT_solo.bl_idname, icon="EVENT_S", text="", emboss=False)
+            solobtn = sub.operator(get_edit_op(ops.GAFFER_OT_solo), icon="EVENT_S", text="", emboss=False)
             solobtn.light = "WorldEnviroLight"
             solobtn.showhide = False
             solobtn.worldsolo = True
@@ -618,66 +674,27 @@ def draw_cycles_eevee_UI(context, layout, lights):
     prefs = context.preferences.addons[__package__].preferences
     icons = fn.get_icons()
 
-    lights_to_show = []
-    # Check validity of list and make list of lights to display
-    vis_cols = fn.visibleCollections()
-    for light in lights:
-        try:
-            if light[0]:
-                # Will cause KeyError exception if obj no longer exists
-                a = bpy.data.objects[light[0][1:-1]]
-                if (gaf_props.VisibleLightsOnly and not a.hide_viewport) or (not gaf_props.VisibleLightsOnly):
-                    if a.type != "LIGHT":
-                        b = bpy.data.materials[light[1][1:-1]]
-                        if b.use_nodes:
-                            b.node_tree.nodes[light[2][1:-1]]
-                    if (gaf_props.VisibleCollectionsOnly and fn.isInVisibleCollection(a, vis_cols)) or (
-                        not gaf_props.VisibleCollectionsOnly
-                    ):
-                        if a.name not in [o.name for o in gaf_props.Blacklist]:
-                            lights_to_show.append(light)
-        except KeyError:
-            box = maincol.box()
-            row = box.row(align=True)
-            row.label(text="Light list out of date")
-            fn.tag_refresh_light_list()  # We can't refresh the list here, so we tag it for the next depsgraph update
-            row.operator(ops.GAFFER_OT_refresh_light_list.bl_idname, icon="FILE_REFRESH", text="")
-
-    # Don't show lights that share the same data
-    duplicates = {}
-    """
-    duplicates:
-        A dict with the key: object type + data name (cannot use only the name in case of conflicts).
-        The values are the number of duplicates for that key.
-    """
-    templist = []
-    for item in lights_to_show:
-        light = scene.objects[item[0][1:-1]]  # drop the apostrophes
-        if light.type == "LIGHT":
-            if ("LIGHT" + light.data.name) in duplicates:
-                duplicates["LIGHT" + light.data.name] += 1
-            else:
-                templist.append(item)
-                duplicates["LIGHT" + light.data.name] = 1
-        else:
-            mat = bpy.data.materials[item[1][1:-1]]
-            if ("MAT" + mat.name) in duplicates:
-                duplicates["MAT" + mat.name] += 1
-            else:
-                templist.append(item)
-                duplicates["MAT" + mat.name] = 1
-    lights_to_show = templist
-
-    i = 0
-    for item in lights_to_show:
-        light = scene.objects[item[0][1:-1]]  # drop the apostrophes
+    view = fn.get_light_view(scene)
+    if view["out_of_date"]:
+        draw_light_list_out_of_date(maincol)
+    draw_light_groups(maincol, gaf_props)
+    first, last = draw_light_pages(maincol, gaf_props, prefs, len(view["lights"]))
+
+    i = first  # Index in the whole view, so that the color temperature presets stay with their light between pages
+    for name in view["lights"][first:last]:
+        item = fn.get_light_record(scene, name)
+        light = scene.objects.get(name)
+        if item is None or light is None:
+            draw_light_list_out_of_date(maincol)
+            fn.invalidate_light_view(scene)
+            continue
         light_uses_nodes = True
         is_portal = False
         if light.type == "LIGHT":
             material = None
             if light.data.use_nodes:
                 try:
-                    node_strength = light.data.node_tree.nodes[item[2][1:-1]]
+                    node_strength = light.data.node_tree.nodes[item.node]
                 except KeyError:
                     light_uses_nodes = False
             else:
@@ -686,16 +703,16 @@ def draw_cycles_eevee_UI(context, layout, lights):
             if light.data.type == "AREA" and light.data.cycles.is_portal and scene.render.engine == "CYCLES":
                 is_portal = True
         else:
-            material = bpy.data.materials[item[1][1:-1]]
+            material = bpy.data.materials[item.material]
             if material.use_nodes:
-                node_strength = material.node_tree.nodes[item[2][1:-1]]
+                node_strength = material.node_tree.nodes[item.node]
             else:
                 light_uses_nodes = False
 
         if light.type == "LIGHT":
-            users = ["LIGHT" + light.data.name, duplicates["LIGHT" + light.data.name]]
+            users = ["LIGHT" + light.data.name, view["users"].get(light.data.as_pointer(), 1)]
         else:
-            users = ["MAT" + material.name, duplicates["MAT" + material.name]]
+            users = ["MAT" + material.name, view["users"].get(material.as_pointer(), 1)]
 
         if light_uses_nodes and scene.render.engine == "CYCLES":
             box = maincol.box()
@@ -704,27 +721,15 @@ def draw_cycles_eevee_UI(context, layout, lights):
             col = split.column()
             row = col.row(align=True)
 
-            if item[3].startswith("'"):
-                socket_strength_str = str(item[3][1:-1])
-            else:
-                socket_strength_str = str(item[3])
-
-            if socket_strength_str.startswith("o"):
-                socket_strength_type = "o"
-                socket_strength = int(socket_strength_str[1:])
-            elif socket_strength_str.startswith("i"):
-                socket_strength_type = "i"
-                socket_strength = int(socket_strength_str[1:])
-            else:
-                socket_strength_type = "i"
-                socket_strength = int(socket_strength_str)
+            socket_strength_type = item.socket_type or "i"
+            socket_strength = item.socket_index
 
             draw_renderer_independant(gaf_props, row, light, icons, users)
 
             if not is_portal:
                 draw_strength_cycles(col, light, material, node_strength, socket_strength_type, socket_strength)
 
-                draw_color_cycles(gaf_props, i, icons, col, row, light, material)
+                draw_color_cycles(gaf_props, i, icons, col, row, light, material, item.color_node)
 
             if "_Light:_(" + light.name + ")_" in gaf_props.MoreExpand or gaf_props.MoreExpandAll:
                 draw_more_options_cycles(box, scene, light, material, node_strength, is_portal)
@@ -750,7 +755,7 @@ def draw_cycles_eevee_UI(context, layout, lights):
                     draw_more_options_eevee(box, scene, light)
             i += 1
 
-    if len(lights_to_show) == 0:
+    if len(view["lights"]) == 0:
         row = maincol.row()
         row.alignment = "CENTER"
         row.label(text="No lights to show :)")
@@ -768,47 +773,18 @@ def draw_unsupported_renderer_UI(context, layout, lights):
     prefs = context.preferences.addons[__package__].preferences
     icons = fn.get_icons()
 
-    lights_to_show = []
-    # Check validity of list and make list of lights to display
-    vis_cols = fn.visibleCollections()
-    for light in lights:
-        try:
-            if light[0]:
-                # Will cause KeyError exception if obj no longer exists
-                a = bpy.data.objects[light[0][1:-1]]
-                if (gaf_props.VisibleLightsOnly and not a.hide_viewport) or (not gaf_props.VisibleLightsOnly):
-                    if (gaf_props.VisibleCollectionsOnly and fn.isInVisibleCollection(a, vis_cols)) or (
-                        not gaf_props.VisibleCollectionsOnly
-                    ):
-                        if a.name not in [o.name for o in gaf_props.Blacklist]:
-                            lights_to_show.append(light)
-        except KeyError:
-            box = maincol.box()
-            row = box.row(align=True)
-            row.label(text="Light list out of date")
-            row.operator(ops.GAFFER_OT_refresh_light_list.bl_idname, icon="FILE_REFRESH", text="")
-
-    # Don't show lights that share the same data
-    duplicates = {}
-    """
-    duplicates:
-        A dict with the key: object type + data name (cannot use only the name in case of conflicts).
-        The values are the number of duplicates for that key.
-    """
-    templist = []
-    for item in lights_to_show:
-        light = scene.objects[item[0][1:-1]]  # drop the apostrophes
-        if light.type == "LIGHT":
-            if ("LIGHT" + light.data.name) in duplicates:
-                duplicates["LIGHT" + light.data.name] += 1
-            else:
-                templist.append(item)
-                duplicates["LIGHT" + light.data.name] = 1
-    lights_to_show = templist
+    view = fn.get_light_view(scene)
+    if view["out_of_date"]:
+        draw_light_list_out_of_date(maincol)
+    draw_light_groups(maincol, gaf_props)
+    first, last = draw_light_pages(maincol, gaf_props, prefs, len(view["lights"]))
 
-    i = 0
-    for item in lights_to_show:
-        light = scene.objects[item[0][1:-1]]  # drop the apostrophes
+    for name in view["lights"][first:last]:
+        light = scene.objects.get(name)
+        if light is None:
+            draw_light_list_out_of_date(maincol)
+            fn.invalidate_light_view(scene)
+            continue
 
         box = maincol.box()
         rowmain = box.row()
@@ -817,13 +793,12 @@ def draw_unsupported_renderer_UI(context, layout, lights):
         row = col.row(align=True)
 
         if light.type == "LIGHT":
-            users = ["LIGHT" + light.data.name, duplicates["LIGHT" + light.data.name]]
+            users = ["LIGHT" + light.data.name, view["users"].get(light.data.as_pointer(), 1)]
         else:
-            users = ["MAT" + light.name, duplicates["MAT" + light.name]]
+            users = ["MAT" + light.name, 1]
         draw_renderer_independant(gaf_props, row, light, icons, users)
-        i += 1
 
-    if len(lights_to_show) == 0:
+    if len(view["lights"]) == 0:
         row = maincol.row()
         row.alignment = "CENTER"
         row.label(text="No lights to show :)")
@@ -869,13 +844,15 @@ class GAFFER_PT_lights(bpy.types.Panel):
     bl_region_type = "UI"
     bl_category = "Gaffer"
 
+    @fn.profile("panel_lights")
     def draw(self, context):
         addon_updater_ops.check_for_update_background()
 
         scene = context.scene
         gaf_props = scene.gaf_props
-        lights_str = gaf_props.Lights
-        lights = fn.stringToNestedList(lights_str)
+        if context.preferences.addons[__package__].preferences.auto_refresh_light_list:
+            fn.ensure_light_list(scene, deferred=True)  # e.g. after switching to a scene whose lights were changed
+        lights = fn.get_lights(scene)
         layout = self.layout
         col = layout.column(align=True)
 
@@ -883,7 +860,7 @@ class GAFFER_PT_lights(bpy.types.Panel):
         if gaf_props.SoloActive != "":  # if in solo mode
             sub = row.column(align=True)
             sub.alert = True
-            solobtn = sub.operator(ops.GAFFER_OT_solo.bl_idname, icon="EVENT_S", text="")
+            solobtn = sub.operator(get_edit_op(ops.GAFFER_OT_solo), icon="EVENT_S", text="")
             solobtn.light = "None"
             solobtn.showhide = False
             solobtn.worldsolo = False
@@ -898,6 +875,14 @@ class GAFFER_PT_lights(bpy.types.Panel):
         row.prop(gaf_props, "VisibleCollectionsOnly", text="", icon="LAYER_ACTIVE")
         row.prop(gaf_props, "VisibleLightsOnly", text="", icon="HIDE_OFF")
         row.prop(gaf_props, "MoreExpandAll", text="", icon="PREFERENCES")
+        if not gaf_props.BatchEditActive:
+            row.operator(ops.GAFFER_OT_batch_edit_begin.bl_idname, text="", icon="REC")
+        else:
+            row = col.row(align=True)
+            row.alert = True
+            row.label(text="Batch edit: {} changes".format(gaf_props.BatchEditCount), icon="REC")
+            row.operator(ops.GAFFER_OT_batch_edit_commit.bl_idname, text="Commit", icon="CHECKMARK")
+            row.operator(ops.GAFFER_OT_batch_edit_discard.bl_idname, text="", icon="X")
 
         if gaf_props.SoloActive != "":
             try:
@@ -910,7 +895,7 @@ class GAFFER_PT_lights(bpy.types.Panel):
                     row = col.row()
                     row.alert = True
                     solobtn = row.operator(
-                        ops.GAFFER_OT_solo.bl_idname,
+                        get_edit_op(ops.GAFFER_OT_solo),
                         icon="EVENT_S",
                         text="Light not found, reset Solo",
                     )
@@ -926,6 +911,8 @@ class GAFFER_PT_lights(bpy.types.Panel):
         if bpy.context.scene.render.engine in const.supported_renderers:
             row.operator(ops.GAFFER_OT_apply_exposure.bl_idname, text="", icon="CHECKBOX_HLT")
 
+        draw_light_filters(col, gaf_props)
+
         if scene.render.engine == "CYCLES":
             draw_cycles_eevee_UI(context, layout, lights)
         elif scene.render.engine in ["BLENDER_EEVEE", "BLENDER_EEVEE_NEXT"]:
@@ -958,6 +945,7 @@ class GAFFER_PT_tools(bpy.types.Panel):
     bl_region_type = "UI"
     bl_category = "Gaffer"
 
+    @fn.profile("panel_tools")
     def draw(self, context):
         scene = context.scene
         gaf_props = scene.gaf_props
@@ -985,6 +973,35 @@ class GAFFER_PT_tools(bpy.types.Panel):
             text="w/ 3D View",
             icon="VIEW_CAMERA",
         )
+        if context.object:
+            row = subcol.row(align=True)
+            row.prop(context.object, "GafferAimTarget", text="")
+            op = row.operator(ops.GAFFER_OT_aim_light.bl_idname, text="at own targets", icon="CON_TRACKTO")
+            op.target_type = "TARGETS"
+
+        maincol.separator()
+
+        # Bulk edit
+        box = maincol.box()
+        col = box.column(align=True)
+        row = col.row(align=True)
+        row.label(text="Bulk Edit:")
+        row.prop(gaf_props, "BulkScope", expand=True)
+        row = col.row(align=True)
+        op = row.operator(ops.GAFFER_OT_bulk_strength.bl_idname, text="-1 EV", icon="REMOVE")
+        op.scope = gaf_props.BulkScope
+        op.mode = "STOPS"
+        op.value = -1
+        op = row.operator(ops.GAFFER_OT_bulk_strength.bl_idname, text="+1 EV", icon="ADD")
+        op.scope = gaf_props.BulkScope
+        op.mode = "STOPS"
+        op.value = 1
+        row = col.row(align=True)
+        row.operator(ops.GAFFER_OT_bulk_temperature.bl_idname, text="Temperature").scope = gaf_props.BulkScope
+        row.operator(ops.GAFFER_OT_bulk_radius.bl_idname, text="Size").scope = gaf_props.BulkScope
+        if context.scene.render.engine == "CYCLES":
+            row.operator(ops.GAFFER_OT_bulk_falloff.bl_idname, text="Falloff").scope = gaf_props.BulkScope
+        col.operator(ops.GAFFER_OT_light_group_add.bl_idname, text="Group", icon="GROUP").scope = gaf_props.BulkScope
 
         maincol.separator()
 
@@ -1042,6 +1059,41 @@ class GAFFER_PT_tools(bpy.types.Panel):
 
         maincol.separator()
 
+        # Snapshots
+        box = maincol.box()
+        sub = box.column(align=True)
+        sub.label(text="Snapshots:")
+        if gaf_props.Snapshots:
+            sub.template_list(
+                "OBJECT_UL_object_list",
+                "snapshots",
+                gaf_props,
+                "Snapshots",
+                gaf_props,
+                "SnapshotIndex",
+                rows=2,
+            )
+        row = sub.row(align=True)
+        row.operator(ops.GAFFER_OT_snapshot_capture.bl_idname, icon="ADD")
+        row.operator(ops.GAFFER_OT_snapshot_restore.bl_idname, icon="RECOVER_LAST")
+        row.operator(ops.GAFFER_OT_snapshot_swap.bl_idname, icon="ARROW_LEFTRIGHT")
+        row.operator(ops.GAFFER_OT_snapshot_remove.bl_idname, icon="REMOVE", text="")
+        if gaf_props.Snapshots:
+            op = sub.operator(ops.GAFFER_OT_lookdev_contact_sheet.bl_idname, icon="IMGDISPLAY")
+            op.source = "SNAPSHOTS"
+
+        maincol.separator()
+
+        # Rig Library
+        box = maincol.box()
+        sub = box.column(align=True)
+        sub.label(text="Rig Library:")
+        row = sub.row(align=True)
+        row.operator(ops.GAFFER_OT_rig_save.bl_idname, icon="ADD")
+        row.operator_menu_enum(ops.GAFFER_OT_rig_apply.bl_idname, "rig", text="Apply Rig", icon="LIGHT")
+
+        maincol.separator()
+
         # Blacklist
         box = maincol.box()
         sub = box.column(align=True)
@@ -1194,6 +1246,11 @@ def draw_hdri_handler(context, layout, gaf_props, gaf_hdri_props, hdri_paths, pr
                 row.operator(ops.GAFFER_OT_hdri_thumb_gen.bl_idname, icon="IMAGE")
                 col.separator()
 
+            if not toolbar:
+                row = col.row(align=True)
+                row.alignment = "CENTER"
+                row.operator(ops.GAFFER_OT_lookdev_contact_sheet.bl_idname, icon="IMGDISPLAY").source = "HDRIS"
+
             row = col.row(align=True)
             vp_icon = "TRIA_LEFT" if gaf_hdri_props["hdri_variation"] != 0 else "TRIA_LEFT_BAR"
             row.operator(ops.GAFFER_OT_hdri_variation_paddles.bl_idname, text="", icon=vp_icon).do_next = False
@@ -1414,6 +1471,7 @@ class GAFFER_PT_hdris(bpy.types.Panel):
         else:
             row.label(text="HDRI")
 
+    @fn.profile("panel_hdris")
     def draw(self, context):
         gaf_props = context.scene.gaf_props
         gaf_hdri_props = context.scene.world.gaf_hdri_props
@@ -1494,7 +1552,6 @@ class GAFFER_MT_folder_filter(bpy.types.Menu):
 
 def gaffer_node_menu_func(self, context):
     if context.space_data.node_tree.type == "SHADER" and context.space_data.shader_type == "OBJECT":
-        light_dict = fn.dictOfLights()
-        if context.object.name in light_dict:
+        if fn.get_light_record(context.scene, context.object.name):
             layout = self.layout
             layout.operator(ops.GAFFER_OT_node_set_strength.bl_idname)